@@ -0,0 +1,315 @@
+"""
+Verificação em lote do status dos agentes do Cursor.
+
+Em vez de uma chamada GET /v0/agents/{id} por agente, cada ciclo busca no banco
+todos os agentes em aberto de uma vez, percorre a listagem paginada GET /v0/agents
+(limit=100 + cursor) até encontrar todos eles e grava as mudanças de status com um
+único UPDATE ... FROM (VALUES ...). Só os agentes que passaram para FINISHED têm o
+balancete.json baixado da branch e gravado.
+
+Um agente FINISHED continua em aberto enquanto o arquivo vinculado não estiver
+processado (status_id 3), então uma falha no download ou na gravação é tentada de
+novo no próximo ciclo. Cada ciclo em que um agente não pôde ser resolvido (falha
+ao processar o resultado ou agente ausente da listagem completa, ex: removido ou
+expirado no Cursor) soma uma tentativa; após AGENT_POLLER_MAX_TENTATIVAS o agente
+passa para ERROR ou NOT_FOUND e deixa de ser verificado.
+"""
+
+from baixar_parser_pdf import download_parser_pdf, remover_download
+from db import execute_query, execute_bulk, pinned_connection
+from threading import Event, Lock, Thread
+from initial import ensure_agent_columns
+from pipeline import gravar_balancete
+from cronjob import closed_agent
+from logging_setup import get_logger
+from datetime import datetime
+from dotenv import load_dotenv
+from http_client import get
+from json import load
+from os import getenv
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+API_URL = getenv("CURSOR_API_URL", None)
+API_KEY = getenv("API_KEY_CURSOR", None)
+POLLER_INTERVALO = float(getenv("AGENT_POLLER_INTERVALO", 60))
+POLLER_LIMITE = int(getenv("AGENT_POLLER_LIMITE", 100))
+POLLER_MAX_PAGINAS = int(getenv("AGENT_POLLER_MAX_PAGINAS", 50))
+POLLER_MAX_TENTATIVAS = int(getenv("AGENT_POLLER_MAX_TENTATIVAS", 5))
+
+querys = {
+    "lock": "SELECT pg_try_advisory_lock(hashtext('agent_poller')) AS adquirido",
+    "unlock": "SELECT pg_advisory_unlock(hashtext('agent_poller'))",
+    "open_agents": """
+        SELECT agentes.id_agente, agentes.status, agentes.branch, agentes.arquivo_id,
+            agentes.criado_em, agentes.tentativas
+        FROM agentes
+        LEFT JOIN conta_arquivos ON conta_arquivos.id = agentes.arquivo_id
+        WHERE agentes.id_agente IS NOT NULL AND (
+            agentes.status IN ('CREATING', 'RUNNING')
+            OR (
+                agentes.status = 'FINISHED'
+                AND agentes.arquivo_id IS NOT NULL
+                AND conta_arquivos.status_id IS DISTINCT FROM 3
+            )
+        )
+    """,
+    "update_status": """
+        UPDATE agentes SET
+            status = novos.status,
+            criado_em = COALESCE(agentes.criado_em, novos.criado_em)
+        FROM (VALUES %s) AS novos (id_agente, status, criado_em)
+        WHERE agentes.id_agente = novos.id_agente AND (
+            agentes.status IS DISTINCT FROM novos.status
+            OR (agentes.criado_em IS NULL AND novos.criado_em IS NOT NULL)
+        )
+    """,
+    "registrar_tentativa": """
+        UPDATE agentes SET
+            tentativas = tentativas + 1,
+            status = CASE WHEN tentativas + 1 >= %s THEN %s ELSE status END
+        WHERE id_agente = ANY(%s)
+        RETURNING id_agente, status
+    """,
+}
+
+_poller = None
+_poller_lock = Lock()
+
+
+def _data_criacao(valor):
+    """createdAt da API como datetime com fuso, ou None se ausente ou inválido."""
+    try:
+        return datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def listar_agentes(agentes):
+    """
+    Percorre GET /v0/agents até encontrar ou descartar todos os agentes informados.
+
+    A listagem vem paginada (no máximo POLLER_LIMITE por página), dos agentes mais
+    novos para os mais antigos. Um agente procurado é dado como ausente quando a
+    listagem termina sem ele ou já chegou a agentes criados antes dele; a
+    paginação para quando não resta agente procurado, quando não há próxima página
+    ou após POLLER_MAX_PAGINAS páginas (os que sobrarem não entram em nenhum dos
+    dois resultados).
+
+    Args:
+        agentes: dict id do agente -> data de criação (datetime com fuso ou None,
+            se desconhecida)
+
+    Returns:
+        tuple: (dict id -> objeto retornado pela API, set de IDs ausentes)
+    """
+    pendentes = dict(agentes)
+    encontrados = {}
+    ausentes = set()
+    cursor = None
+
+    for _ in range(POLLER_MAX_PAGINAS):
+        if not pendentes:
+            break
+
+        params = {"limit": POLLER_LIMITE}
+        if cursor:
+            params["cursor"] = cursor
+
+        response = get(API_URL, endpoint="cursor.agents.list", params=params, auth=(API_KEY, ''))
+        response.raise_for_status()
+        pagina = response.json()
+
+        mais_antigo = None
+        for agente in pagina.get("agents") or []:
+            if agente.get("id") in pendentes:
+                encontrados[agente["id"]] = agente
+                del pendentes[agente["id"]]
+            criado_em = _data_criacao(agente.get("createdAt"))
+            if criado_em and (mais_antigo is None or criado_em < mais_antigo):
+                mais_antigo = criado_em
+
+        cursor = pagina.get("nextCursor")
+        if not cursor:
+            ausentes.update(pendentes)
+            break
+
+        if mais_antigo:
+            for id_agente, criado_em in list(pendentes.items()):
+                if criado_em and criado_em > mais_antigo:
+                    ausentes.add(id_agente)
+                    del pendentes[id_agente]
+
+    return encontrados, ausentes
+
+
+def registrar_tentativa(ids, status_final):
+    """
+    Soma uma tentativa aos agentes; os que chegam a POLLER_MAX_TENTATIVAS passam
+    para `status_final` e saem da lista de agentes em aberto.
+
+    Returns:
+        list: Linhas atualizadas (id_agente, status)
+    """
+    if not ids:
+        return []
+    return execute_query(query=querys["registrar_tentativa"], params=(POLLER_MAX_TENTATIVAS, status_final, list(ids)))
+
+
+def processar_agente_finalizado(agente, branch):
+    """
+    Baixa o balancete.json gerado pelo agente e grava os dados do arquivo vinculado.
+
+    Args:
+        agente: Linha da tabela agentes (id_agente, arquivo_id, ...)
+        branch: Branch em que o agente gravou o resultado
+
+    Returns:
+        dict | None: Resumo da gravação (ver pipeline.gravar_balancete)
+
+    Raises:
+        ValueError: Se o resultado não estiver disponível na branch
+    """
+    resultado_agente = download_parser_pdf(branch)
+    if not resultado_agente:
+        raise ValueError(f"balancete.json não encontrado na branch {branch}")
+
+    with resultado_agente.open("r", encoding="utf-8") as arquivo:
+        parser_response = load(arquivo)
+
+    resumo = gravar_balancete(parser_response, agente['arquivo_id'])
+    if resumo:
+        # Sem resumo o arquivo continua em aberto e a cópia local serve ao próximo ciclo
+        remover_download(branch)
+
+    try:
+        closed_agent(agente)
+    except Exception as e:
+        logger.warning("Erro ao fechar agente %s: %s", agente['id_agente'], e)
+
+    return resumo
+
+
+def verificar_agentes():
+    """
+    Executa um ciclo de verificação dos agentes em aberto.
+
+    Um advisory lock garante que só um processo verifica por vez; se outro ciclo
+    estiver em andamento, este retorna sem fazer nada.
+
+    Returns:
+        list: Um item por agente com status alterado, finalizado ou descartado
+        (ERROR / NOT_FOUND), com 'id_agente', 'arquivo_id', 'status_anterior',
+        'status' e, para os finalizados, 'resumo' ou 'erro'
+    """
+    with pinned_connection():
+        if not execute_query(query=querys["lock"])[0]['adquirido']:
+            logger.info("Verificação de agentes já em andamento em outro processo")
+            return []
+
+        try:
+            return _verificar_agentes()
+        finally:
+            execute_query(query=querys["unlock"])
+
+
+def _verificar_agentes():
+    ensure_agent_columns()
+    abertos = execute_query(query=querys["open_agents"])
+    if not abertos:
+        return []
+
+    agentes_api, ausentes = listar_agentes({agente['id_agente']: agente['criado_em'] for agente in abertos})
+
+    mudancas = []
+    finalizados = []
+    resultados = []
+    for agente in abertos:
+        agente_api = agentes_api.get(agente['id_agente'])
+        status = agente_api.get("status") if agente_api else None
+        if not status:
+            continue
+
+        criado_em = _data_criacao(agente_api.get("createdAt"))
+        if status != agente['status'] or (agente['criado_em'] is None and criado_em):
+            mudancas.append((agente['id_agente'], status, criado_em))
+        if status == "FINISHED":
+            finalizados.append((agente, agente_api))
+        elif status != agente['status']:
+            resultados.append({
+                'id_agente': agente['id_agente'],
+                'arquivo_id': agente['arquivo_id'],
+                'status_anterior': agente['status'],
+                'status': status,
+            })
+
+    execute_bulk(querys["update_status"], mudancas, template="(%s, %s, %s::timestamptz)")
+
+    por_id = {agente['id_agente']: agente for agente in abertos}
+    for linha in registrar_tentativa(ausentes, "NOT_FOUND"):
+        logger.warning("Agente %s não encontrado na listagem do Cursor", linha['id_agente'])
+        if linha['status'] == "NOT_FOUND":
+            resultados.append({
+                'id_agente': linha['id_agente'],
+                'arquivo_id': por_id[linha['id_agente']]['arquivo_id'],
+                'status_anterior': por_id[linha['id_agente']]['status'],
+                'status': "NOT_FOUND",
+            })
+
+    for agente, agente_api in finalizados:
+        resultado = {
+            'id_agente': agente['id_agente'],
+            'arquivo_id': agente['arquivo_id'],
+            'status_anterior': agente['status'],
+            'status': "FINISHED",
+        }
+        branch = (agente_api.get("target") or {}).get("branchName") or agente['branch']
+        try:
+            resultado['resumo'] = processar_agente_finalizado(agente, branch)
+        except Exception as e:
+            logger.exception("Erro ao processar agente %s: %s", agente['id_agente'], e)
+            resultado['erro'] = str(e)
+            for linha in registrar_tentativa([agente['id_agente']], "ERROR"):
+                resultado['status'] = linha['status']
+        resultados.append(resultado)
+
+    return resultados
+
+
+def _poller_loop(intervalo, stop_event):
+    while not stop_event.is_set():
+        try:
+            verificar_agentes()
+        except Exception as e:
+            logger.exception("Erro ao verificar agentes: %s", e)
+        stop_event.wait(intervalo)
+
+
+def start_agent_poller(intervalo=None, stop_event=None):
+    """
+    Inicia a thread que verifica os agentes a cada `intervalo` segundos.
+
+    Args:
+        intervalo: Segundos entre ciclos (padrão: AGENT_POLLER_INTERVALO)
+        stop_event: threading.Event que encerra a thread quando sinalizado
+
+    Returns:
+        Thread: Thread do verificador
+    """
+    global _poller
+    intervalo = POLLER_INTERVALO if intervalo is None else intervalo
+    stop_event = stop_event or Event()
+
+    with _poller_lock:
+        if _poller is None or not _poller.is_alive():
+            _poller = Thread(
+                target=_poller_loop,
+                args=(intervalo, stop_event),
+                name="agent-poller",
+                daemon=True,
+            )
+            _poller.start()
+    return _poller
@@ -1,33 +1,176 @@
+"""
+Download do balancete.json gerado pelo agente, com cache condicional em disco.
+
+Cada (repositório, branch, caminho) vira um arquivo próprio em
+GITHUB_DOWNLOAD_DIR/<owner>/<repo>/<branch>/<caminho>, acompanhado de um .meta.json
+com o ETag e o SHA do blob. Downloads seguintes enviam If-None-Match e, com 304, o
+arquivo local é reaproveitado sem transferir o conteúdo.
+
+O conteúdo vem no media type raw (sem o JSON com base64 da API de conteúdos) e é
+gravado em blocos em um arquivo temporário, trocado pelo definitivo com os.replace;
+agentes concorrentes em branches diferentes não disputam o mesmo arquivo.
+
+A cópia local só serve para novas tentativas do mesmo agente: depois que o
+resultado é gravado, remover_download apaga o arquivo e o .meta.json da branch.
+"""
+
+from tempfile import NamedTemporaryFile
+from json import dump, load, JSONDecodeError
+from logging_setup import get_logger
+from urllib.parse import quote
 from dotenv import load_dotenv
-from base64 import b64decode
-from requests import get
+from http_client import get
+from hashlib import sha1
+from pathlib import Path
 from os import getenv
+import os
 
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
+DOWNLOAD_DIR = Path(getenv("GITHUB_DOWNLOAD_DIR", "temp/github")).expanduser()
+CHUNK_SIZE = 64 * 1024
+
+
+def caminho_local(owner, repo, branch, file_path):
+    """Retorna o caminho local do arquivo baixado de (repositório, branch, caminho)."""
+    return DOWNLOAD_DIR / quote(owner, safe="") / quote(repo, safe="") / quote(branch, safe="") / quote(file_path, safe="")
+
+
+def _meta_path(destino):
+    return destino.with_name(f"{destino.name}.meta.json")
+
+
+def _ler_meta(destino):
+    try:
+        with _meta_path(destino).open("r", encoding="utf-8") as arquivo:
+            return load(arquivo)
+    except (OSError, JSONDecodeError):
+        return None
+
+
+def _gravar_atomico(destino, escrever, modo="wb"):
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    encoding = None if "b" in modo else "utf-8"
+    with NamedTemporaryFile(modo, encoding=encoding, dir=destino.parent, suffix=".tmp", delete=False) as temp_file:
+        try:
+            escrever(temp_file)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    os.replace(temp_file.name, destino)
+
+
+def _configuracao():
+    config = {
+        "owner": getenv("OWNER", None),
+        "repo": getenv("REPO", None),
+        "file_path": getenv("FILE_PATH", None),
+    }
+    faltando = [nome for nome, valor in config.items() if not valor]
+    if faltando:
+        logger.error("Download do arquivo do agente sem configuração: %s", ", ".join(faltando))
+        return None
+    return config
+
+
+def _git_blob_sha_arquivo(caminho):
+    digest = sha1(b"blob %d\0" % caminho.stat().st_size)
+    with caminho.open("rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(CHUNK_SIZE), b""):
+            digest.update(bloco)
+    return digest.hexdigest()
+
 
 def download_parser_pdf(branch):
-    OWNER = getenv("OWNER", None)
-    REPO = getenv("REPO", None)
+    """
+    Baixa o arquivo FILE_PATH da branch do agente.
+
+    Args:
+        branch: Branch em que o agente gravou o resultado
+
+    Returns:
+        Path | None: Caminho local do arquivo (atualizado ou reaproveitado do cache)
+        ou None se o arquivo não estiver disponível ou OWNER/REPO/FILE_PATH não
+        estiverem configurados
+    """
+    config = _configuracao()
+    if config is None:
+        return None
+
+    OWNER = config["owner"]
+    REPO = config["repo"]
+    FILE_PATH = config["file_path"]
     TOKEN = getenv("TOKEN_GITHUB", None)
-    FILE_PATH = getenv("FILE_PATH", None)
     API_GITHUB_ROOT = getenv("API_GITHUB_ROOT", None)
 
     url = f"{API_GITHUB_ROOT}/{OWNER}/{REPO}/contents/{FILE_PATH}"
-    headers = {"Authorization": f"token {TOKEN}"}
+    headers = {
+        "Authorization": f"token {TOKEN}",
+        "Accept": "application/vnd.github.raw",
+    }
     params = {"ref": branch}
 
-    response = get(url, headers=headers, params=params)
+    destino = caminho_local(OWNER, REPO, branch, FILE_PATH)
+    meta = _ler_meta(destino) if destino.exists() else None
+    if meta and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+
+    response = get(url, endpoint="github.contents.raw", headers=headers, params=params, stream=True)
+    try:
+        if response.status_code == 304:
+            logger.info("Arquivo do agente sem alterações na branch %s, usando cópia local", branch)
+            return destino
+
+        if response.status_code != 200:
+            return None
+
+        def escrever_conteudo(temp_file):
+            for bloco in response.iter_content(CHUNK_SIZE):
+                temp_file.write(bloco)
+
+        _gravar_atomico(destino, escrever_conteudo)
+    finally:
+        response.close()
+
+    meta = {
+        "repositorio": f"{OWNER}/{REPO}",
+        "branch": branch,
+        "caminho": FILE_PATH,
+        "etag": response.headers.get("ETag"),
+        "sha": _git_blob_sha_arquivo(destino),
+    }
+    _gravar_atomico(_meta_path(destino), lambda temp_file: dump(meta, temp_file), modo="w")
+
+    logger.info("Arquivo do agente baixado da branch %s", branch)
+    return destino
+
+
+def remover_download(branch):
+    """
+    Apaga a cópia local do arquivo da branch e o seu .meta.json.
 
-    if response.status_code == 200:
-        data = response.json()
-        file_content = b64decode(data["content"])
+    Args:
+        branch: Branch do agente cujo resultado já foi gravado
+    """
+    config = _configuracao()
+    if config is None:
+        return
 
-        with open("temp/balancete.json", "wb") as f:
-            f.write(file_content)
+    destino = caminho_local(config["owner"], config["repo"], branch, config["file_path"])
+    for caminho in (destino, _meta_path(destino)):
+        try:
+            caminho.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Erro ao remover %s: %s", caminho, e)
 
-        print("PDF baixado com sucesso!")
-        return True
-    
-    return False
+    try:
+        # O diretório da branch só fica se ainda tiver outros arquivos
+        destino.parent.rmdir()
+    except OSError:
+        pass
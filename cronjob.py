@@ -1,17 +1,50 @@
-from db import test_connection, execute_query, execute_update, execute_many
+from db import test_connection, execute_query, execute_update, copy_rows, listen_notifications
+from re import search as re_search, compile as re_compile
 from requests.exceptions import RequestException
-from re import search as re_search
+from threading import Lock, Thread
+from logging_setup import get_logger
+from metrics import timed, timer
 from dotenv import load_dotenv
-from requests import delete
-from copy import deepcopy
+from http_client import delete
+from time import monotonic
 from os import getenv
+import numpy as np
 
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 API_URL = getenv("CURSOR_API_URL", None)
 API_KEY = getenv("API_KEY_CURSOR", None)
 CAMPOS_MONETARIOS = {'saldo_anterior', 'debito', 'credito', 'saldo_atual'}
+NATUREZAS_SUFIXO = {'D': 1, 'd': 1, 'C': -1, 'c': -1}
+PADRAO_VALOR = re_compile(r"(\()?\s*(-)?\s*(\d[\d.]*)?(?:,(\d+))?\s*(\))?\s*([DdCc])?")
+LIMITE_CENTAVOS = np.iinfo(np.int64).max
+CATALOGO_TTL = int(getenv("CATALOGO_TTL", 300))
+CATALOGO_CANAL = getenv("CATALOGO_CANAL", "conta_analiticas_changed")
+
+COLUNAS_CONTA_CLIENTES = (
+    'ordem',
+    'grau_detalhamento',
+    'descricao',
+    'natureza_conta',
+    'receita_despesa',
+    'data_inicial',
+    'data_final',
+    'saldo_anterior',
+    'total_debito',
+    'total_credito',
+    'saldo_atual',
+    'ano_base',
+    'id_conta_cenario_base_rumo',
+    'arquivo_id',
+    'tipo',
+)
+
+_catalogo = None
+_catalogo_lock = Lock()
+_catalogo_listener = None
 
 headers = {
     "Content-Type": "application/json",
@@ -21,9 +54,11 @@ querys = {
     "verify_agents": "SELECT id_agente, status, branch, arquivo_id FROM agentes WHERE status IN ('CREATING', 'RUNNING', 'FINISHED')",
     "update_agent_status": "UPDATE agentes SET status = %s WHERE id_agente = %s",
     "update_conta_arquivo_status": "UPDATE conta_arquivos SET status_id = %s WHERE id = %s",
+    "delete_contas_arquivo": "DELETE FROM conta_clientes WHERE arquivo_id = %s",
 }
 
 
+@timed("catalog_fetch")
 def fetch_analytical_accounts():
     query = (
         "SELECT conta_analiticas.*, classificacao_tributarias.tipo "
@@ -35,6 +70,85 @@ def fetch_analytical_accounts():
     return result
 
 
+def _montar_catalogo(contas_analiticas):
+    descricao_to_conta = {
+        conta.get('descricao'): conta
+        for conta in (contas_analiticas or [])
+        if conta.get('descricao')
+    }
+    return {
+        'contas': contas_analiticas or [],
+        'descricao_to_conta': descricao_to_conta,
+        'carregado_em': monotonic(),
+    }
+
+
+def get_analytical_catalog(force=False):
+    """
+    Retorna o catálogo de contas analíticas com os índices de busca já montados.
+
+    O catálogo fica em memória por CATALOGO_TTL segundos; depois disso, ou após
+    invalidate_analytical_catalog, a próxima chamada recarrega do banco.
+
+    Args:
+        force: Se True, ignora o cache e recarrega do banco
+
+    Returns:
+        dict: {'contas': lista do banco, 'descricao_to_conta': descrição -> conta, 'carregado_em'}
+    """
+    global _catalogo
+    catalogo = _catalogo
+    if not force and catalogo and monotonic() - catalogo['carregado_em'] < CATALOGO_TTL:
+        return catalogo
+
+    with _catalogo_lock:
+        catalogo = _catalogo
+        if force or not catalogo or monotonic() - catalogo['carregado_em'] >= CATALOGO_TTL:
+            catalogo = _montar_catalogo(fetch_analytical_accounts())
+            _catalogo = catalogo
+    return catalogo
+
+
+def invalidate_analytical_catalog(payload=None):
+    """Descarta o catálogo em memória; a próxima consulta recarrega do banco."""
+    global _catalogo
+    with _catalogo_lock:
+        _catalogo = None
+
+
+def start_catalog_listener():
+    """
+    Inicia uma thread que invalida o catálogo a cada NOTIFY no canal CATALOGO_CANAL.
+
+    O banco precisa de um gatilho que notifique o canal quando as tabelas mudam:
+
+        CREATE FUNCTION notifica_conta_analiticas() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('conta_analiticas_changed', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER conta_analiticas_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON conta_analiticas
+        FOR EACH STATEMENT EXECUTE FUNCTION notifica_conta_analiticas();
+
+    (e o mesmo gatilho em classificacao_tributarias).
+    """
+    global _catalogo_listener
+    if _catalogo_listener and _catalogo_listener.is_alive():
+        return _catalogo_listener
+
+    _catalogo_listener = Thread(
+        target=listen_notifications,
+        args=(CATALOGO_CANAL, invalidate_analytical_catalog),
+        name="catalogo-listener",
+        daemon=True,
+    )
+    _catalogo_listener.start()
+    return _catalogo_listener
+
+
 def converter_valores_para_centavos(data):
     """
     Função recursiva que converte valores monetários de reais para centavos.
@@ -66,24 +180,26 @@ def converter_valores_para_centavos(data):
 
 
 def closed_agent(agentes):
-    print(f"Enviando requisição para API do Cursor...")
+    logger.info("Enviando requisição para API do Cursor...")
     endpoint = f"{API_URL}/{agentes.get('id_agente', None)}"
-    headers['Authorization'] = f"Bearer {API_KEY}"
 
     try:
-        response = delete(endpoint, headers=headers, timeout=300)
+        response = delete(
+            endpoint,
+            endpoint="cursor.agents.delete",
+            headers={**headers, "Authorization": f"Bearer {API_KEY}"},
+        )
         response.raise_for_status()
-        print(f"Agente {agentes.get('id_agente', None)} fechado com sucesso")
+        logger.info("Agente %s fechado com sucesso", agentes.get('id_agente', None))
         
     except RequestException as e:
-        print(f"Erro na requisição: {e}")
+        logger.error("Erro na requisição: %s", e)
         if hasattr(e, 'response') and e.response is not None:
-            print(f"Status code: {e.response.status_code}")
-            print(f"Resposta: {e.response.text}")
+            logger.error("Status code: %s | Resposta: %s", e.response.status_code, e.response.text)
         raise
 
     except Exception as e:
-        print(f"Erro ao processar: {e}")
+        logger.exception("Erro ao processar: %s", e)
         raise
 
 
@@ -104,7 +220,7 @@ def update_conta_arquivo_status(arquivo_id, status_id=3):
         status_id: Valor do status_id a ser atualizado (padrão: 3)
     """
     if not arquivo_id:
-        print("Erro: arquivo_id não encontrado no dicionário agentes")
+        logger.error("arquivo_id não encontrado no dicionário agentes")
         return None
     
     linhas_afetadas = execute_update(
@@ -115,46 +231,75 @@ def update_conta_arquivo_status(arquivo_id, status_id=3):
     return linhas_afetadas
 
 
-def get_data_complements(contas_analiticas, accounts_approved, accounts_rejected):
-    descricao_to_conta = {
-        conta.get('descricao'): conta
-        for conta in (contas_analiticas or [])
-        if conta.get('descricao')
-    }
+class ContaCruzada:
+    """
+    Conta do balancete após o cruzamento com o catálogo de contas analíticas.
 
-    enriched_approved = []
-    for account in accounts_approved:
-        descricao = account.get('account')
-        enriched_account = deepcopy(account)
-
-        conta_correspondente = descricao_to_conta.get(descricao)
-        if conta_correspondente:
-            enriched_account['aliquota_cbs'] = conta_correspondente.get('aliquota_cbs')
-            enriched_account['aliquota_ibs'] = conta_correspondente.get('aliquota_ibs')
-            enriched_account['classificacao_tributaria_id'] = conta_correspondente.get('classificacao_tributaria_id')
-            enriched_account['id_conta_cenario_base_rumo'] = conta_correspondente.get('id')
+    Mantém uma referência à linha do parser (sem cópia; a linha não é alterada)
+    e os campos de enriquecimento em slots. A mesma instância alimenta as tuplas
+    do insert e, via as_dict, a resposta JSON.
+    """
+
+    __slots__ = (
+        'linha',
+        'aliquota_cbs',
+        'aliquota_ibs',
+        'classificacao_tributaria_id',
+        'id_conta_cenario_base_rumo',
+        'tipo',
+        'ordem',
+    )
+
+    def __init__(self, linha, conta=None):
+        self.linha = linha
+        self.tipo = conta is not None
+        self.ordem = None
+        if conta is not None:
+            self.aliquota_cbs = conta.get('aliquota_cbs')
+            self.aliquota_ibs = conta.get('aliquota_ibs')
+            self.classificacao_tributaria_id = conta.get('classificacao_tributaria_id')
+            self.id_conta_cenario_base_rumo = conta.get('id')
         else:
-            enriched_account['aliquota_cbs'] = None
-            enriched_account['aliquota_ibs'] = None
-            enriched_account['classificacao_tributaria_id'] = None
-            enriched_account['id_conta_cenario_base_rumo'] = None
-
-        enriched_account['tipo'] = True
-        enriched_approved.append(enriched_account)
-
-    enriched_rejected = []
-    for account in accounts_rejected:
-        enriched_account = deepcopy(account)
-        enriched_account['aliquota_cbs'] = None
-        enriched_account['aliquota_ibs'] = None
-        enriched_account['classificacao_tributaria_id'] = None
-        enriched_account['id_conta_cenario_base_rumo'] = None
-        enriched_account['tipo'] = False
-        enriched_rejected.append(enriched_account)
+            self.aliquota_cbs = None
+            self.aliquota_ibs = None
+            self.classificacao_tributaria_id = None
+            self.id_conta_cenario_base_rumo = None
+
+    def as_dict(self, data_inicial=None, data_final=None, ano_base=None, arquivo_id=None):
+        """Monta o dicionário de saída: campos do parser, enriquecimento e período."""
+        return {
+            **self.linha,
+            'aliquota_cbs': self.aliquota_cbs,
+            'aliquota_ibs': self.aliquota_ibs,
+            'classificacao_tributaria_id': self.classificacao_tributaria_id,
+            'id_conta_cenario_base_rumo': self.id_conta_cenario_base_rumo,
+            'tipo': self.tipo,
+            'ordem': self.ordem,
+            'data_inicial': data_inicial,
+            'data_final': data_final,
+            'ano_base': ano_base,
+            'arquivo_id': arquivo_id,
+        }
+
+
+def get_data_complements(descricao_to_conta, accounts_approved, accounts_rejected):
+    """
+    Enriquece as contas aprovadas com os dados do catálogo e marca as rejeitadas.
+
+    Args:
+        descricao_to_conta: Índice descrição -> conta analítica do catálogo
+        accounts_approved: Linhas do parser encontradas no catálogo
+        accounts_rejected: Linhas do parser sem correspondência no catálogo
 
+    Returns:
+        dict: {'accounts_approved': [ContaCruzada], 'accounts_rejected': [ContaCruzada]}
+    """
     return {
-        'accounts_approved': enriched_approved,
-        'accounts_rejected': enriched_rejected,
+        'accounts_approved': [
+            ContaCruzada(account, descricao_to_conta.get(account.get('account')) or {})
+            for account in accounts_approved
+        ],
+        'accounts_rejected': [ContaCruzada(account) for account in accounts_rejected],
     }
 
 
@@ -216,6 +361,80 @@ def extrair_datas_periodo(period_str):
     return None, None, None
 
 
+def _centavos_variante(valor):
+    """
+    Converte os formatos menos comuns de valor: sinal, parênteses e sufixo D/C.
+
+    Returns:
+        tuple: (centavos, natureza) com natureza 1 para D, -1 para C e 0 sem sufixo;
+        (0, 0) se o valor for inválido ou não couber em int64 (registrado no log)
+    """
+    match = PADRAO_VALOR.fullmatch(valor.strip())
+    if match is None:
+        return 0, 0
+
+    abre, menos, inteiro, fracao, fecha, sufixo = match.groups()
+    if bool(abre) != bool(fecha):
+        return 0, 0
+
+    inteiro = (inteiro or '0').replace('.', '')
+    fracao = (fracao or '').ljust(3, '0')
+    # Casas além da segunda: arredonda meio centavo para cima pela terceira casa
+    centavos = int(inteiro) * 100 + int(fracao[:2]) + (fracao[2] >= '5')
+    if centavos > LIMITE_CENTAVOS:
+        logger.warning("Valor fora do limite de int64 em centavos, gravado como 0: %r", valor)
+        return 0, 0
+
+    if abre or menos:
+        centavos = -centavos
+    return centavos, NATUREZAS_SUFIXO.get(sufixo, 0)
+
+
+def valores_para_centavos(valores):
+    """
+    Converte uma coluna de valores no formato brasileiro para centavos, sem float.
+
+    A conversão é feita valor a valor (parse exato com str/int) e o resultado é
+    reunido em arrays NumPy; não há operação vetorizada. O caso comum ("1.234,56")
+    usa só operações de string e int; sinal, parênteses e sufixo D/C ("-1.234,56",
+    "(1.234,56)", "1.234,56D", "1.234,56 C") passam por PADRAO_VALOR. Valores
+    vazios, None ou inválidos viram 0.
+
+    Exemplos:
+        ["1.234,56", "(889,70)", "21.209.514,46D", "0,00C"]
+        -> centavos [123456, -88970, 2120951446, 0], natureza [0, 0, 1, -1]
+
+    Args:
+        valores: Sequência de strings (ou None)
+
+    Returns:
+        tuple: (centavos, natureza) - array int64 com os valores em centavos e
+        array int8 com 1 para sufixo D (devedor), -1 para C (credor) e 0 sem sufixo
+    """
+    centavos = []
+    naturezas = {}
+
+    for indice, valor in enumerate(valores):
+        if not valor:
+            centavos.append(0)
+            continue
+
+        inteiro, _, fracao = valor.replace('.', '').partition(',')
+        if len(fracao) == 2 and len(inteiro) <= 16 and inteiro.isdecimal() and fracao.isdecimal():
+            centavos.append(int(inteiro) * 100 + int(fracao))
+            continue
+
+        valor_centavos, natureza = _centavos_variante(valor)
+        centavos.append(valor_centavos)
+        if natureza:
+            naturezas[indice] = natureza
+
+    natureza = np.zeros(len(centavos), dtype=np.int8)
+    if naturezas:
+        natureza[list(naturezas)] = list(naturezas.values())
+    return np.array(centavos, dtype=np.int64), natureza
+
+
 def converter_valor_para_centavos(valor_str):
     """
     Converte valor monetário do formato brasileiro para centavos (inteiro).
@@ -225,6 +444,8 @@ def converter_valor_para_centavos(valor_str):
         "1.234,56" -> 123456
         "889,70" -> 88970
         "21.209.514,46" -> 2120951446
+        "(889,70)" -> -88970
+        "889,70D" -> 88970
     
     Args:
         valor_str: Valor no formato brasileiro (ex: "1.234,56")
@@ -234,12 +455,10 @@ def converter_valor_para_centavos(valor_str):
     """
     if not valor_str:
         return 0
-    
+
     try:
-        valor_limpo = valor_str.replace('.', '').replace(',', '.')
-        valor_float = float(valor_limpo)
-        return int(round(valor_float * 100))
-    except (ValueError, AttributeError):
+        return int(valores_para_centavos([valor_str])[0][0])
+    except AttributeError:
         return 0
 
 
@@ -275,13 +494,14 @@ def ordenar_contas_por_classification(contas):
     Ordena as contas pelo campo classification (grau_detalhamento) de forma hierárquica.
     
     Args:
-        contas: Lista de dicionários com contas
+        contas: Lista de contas (dicionários ou ContaCruzada)
     
     Returns:
         Lista de contas ordenadas
     """
     def chave_ordenacao(conta):
-        classification = conta.get('classification', '')
+        linha = conta.linha if isinstance(conta, ContaCruzada) else conta
+        classification = linha.get('classification', '')
         return converter_classification_para_tupla(classification)
     
     return sorted(contas, key=chave_ordenacao)
@@ -290,35 +510,49 @@ def ordenar_contas_por_classification(contas):
 def preparar_dados_para_insert(todas_contas, arquivo_id, data_inicial, data_final, ano_base):
     """
     Prepara os dados para inserção na tabela conta_clientes.
+
+    É um gerador: as tuplas são produzidas sob demanda, na ordem de
+    COLUNAS_CONTA_CLIENTES, para alimentar o COPY sem montar a lista inteira.
+    As colunas de saldo são convertidas coluna a coluna por valores_para_centavos;
+    natureza_conta continua NULL.
     
     Args:
-        todas_contas: Lista com todas as contas (approved + rejected)
+        todas_contas: Lista de ContaCruzada (approved + rejected), já ordenada
         arquivo_id: ID do arquivo
         data_inicial: Data inicial do período
         data_final: Data final do período
         ano_base: Ano base do período
     
-    Returns:
-        Lista de tuplas com os dados para insert
+    Yields:
+        Tupla com os dados de uma conta para insert
     """
-    dados_insert = []
-    
-    for ordem, conta in enumerate(todas_contas, start=1):
-        grau_detalhamento = conta.get('classification')
-        descricao = conta.get('account')
+    colunas = {
+        campo: valores_para_centavos([conta.linha.get(campo) for conta in todas_contas])
+        for campo in ('previous_balance', 'debit', 'credit', 'current_balance')
+    }
+    saldos_anteriores = colunas['previous_balance'][0].tolist()
+    totais_debito = colunas['debit'][0].tolist()
+    totais_credito = colunas['credit'][0].tolist()
+    saldos_atuais = colunas['current_balance'][0].tolist()
+
+    for indice, conta in enumerate(todas_contas):
+        ordem = indice + 1
+        linha = conta.linha
+        grau_detalhamento = linha.get('classification')
+        descricao = linha.get('account')
         
-        saldo_anterior = converter_valor_para_centavos(conta.get('previous_balance', '0,00'))
-        total_debito = converter_valor_para_centavos(conta.get('debit', '0,00'))
-        total_credito = converter_valor_para_centavos(conta.get('credit', '0,00'))
-        saldo_atual = converter_valor_para_centavos(conta.get('current_balance', '0,00'))
+        saldo_anterior = saldos_anteriores[indice]
+        total_debito = totais_debito[indice]
+        total_credito = totais_credito[indice]
+        saldo_atual = saldos_atuais[indice]
         
-        id_conta_cenario_base_rumo = conta.get('id_conta_cenario_base_rumo')
-        tipo = conta.get('tipo')
+        id_conta_cenario_base_rumo = conta.id_conta_cenario_base_rumo
+        tipo = conta.tipo
         
         natureza_conta = None
         receita_despesa = None
         
-        dados_insert.append((
+        yield (
             ordem,
             grau_detalhamento,
             descricao,
@@ -334,53 +568,35 @@ def preparar_dados_para_insert(todas_contas, arquivo_id, data_inicial, data_fina
             id_conta_cenario_base_rumo,
             arquivo_id,
             tipo
-        ))
-    
-    return dados_insert
+        )
 
 
+@timed("bulk_insert")
 def inserir_contas_arquivo(dados_insert):
     """
-    Insere as contas na tabela conta_clientes em lote.
+    Insere as contas na tabela conta_clientes em lote via COPY FROM STDIN.
     
     Args:
-        dados_insert: Lista de tuplas com os dados para insert
-    """
-    if not dados_insert:
-        print("Nenhum dado para inserir")
-        return
-    
-    query = """
-        INSERT INTO conta_clientes (
-            ordem,
-            grau_detalhamento,
-            descricao,
-            natureza_conta,
-            receita_despesa,
-            data_inicial,
-            data_final,
-            saldo_anterior,
-            total_debito,
-            total_credito,
-            saldo_atual,
-            ano_base,
-            id_conta_cenario_base_rumo,
-            arquivo_id,
-            tipo
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        dados_insert: Iterável (lista ou gerador) de tuplas com os dados para insert
+
+    Returns:
+        int: Número de linhas inseridas
     """
-    
     try:
-        execute_many(query, dados_insert)
-        # print(f"Inseridas {linhas_afetadas} contas na tabela conta_clientes")
+        linhas_inseridas = copy_rows('conta_clientes', COLUNAS_CONTA_CLIENTES, dados_insert)
     except Exception as e:
-        print(f"Erro ao inserir contas na tabela conta_clientes: {e}")
+        logger.error("Erro ao inserir contas na tabela conta_clientes: %s", e)
         raise
 
+    if not linhas_inseridas:
+        logger.info("Nenhum dado para inserir")
+    return linhas_inseridas
+
 
-def cross_references(analytical_accounts_parsed, arquivo_id=None):
+def cross_references(analytical_accounts_parsed, arquivo_id=None, catalogo=None):
 
-    contas_analiticas = fetch_analytical_accounts()
+    catalogo = catalogo or get_analytical_catalog()
+    descricao_to_conta = catalogo['descricao_to_conta']
 
     # print('iniciando cross references')
     accounts_approved = []
@@ -399,62 +615,53 @@ def cross_references(analytical_accounts_parsed, arquivo_id=None):
 
     accounts = analytical_accounts_parsed.get('data', [])
 
-    accounts_to_reference = []
-    for account in accounts:
-        classification = account.get('classification')
-        if not classification:
-            continue
-
-        if isinstance(classification, str):
-            first_char = classification[0]
-        elif isinstance(classification, (list, tuple)):
-            first_item = classification[0] if classification else ""
-            first_char = first_item[0] if isinstance(first_item, str) and first_item else ""
-        else:
-            first_char = ""
-
-        if first_char in {"3", "4"}:
-            accounts_to_reference.append(account)
+    with timer("match"):
+        accounts_to_reference = []
+        for account in accounts:
+            classification = account.get('classification')
+            if not classification:
+                continue
+
+            if isinstance(classification, str):
+                first_char = classification[0]
+            elif isinstance(classification, (list, tuple)):
+                first_item = classification[0] if classification else ""
+                first_char = first_item[0] if isinstance(first_item, str) and first_item else ""
+            else:
+                first_char = ""
 
-    descricoes_banco = {
-        conta.get('descricao')
-        for conta in (contas_analiticas or [])
-        if conta.get('descricao')
-    }
+            if first_char in {"3", "4"}:
+                accounts_to_reference.append(account)
 
-    for account in accounts_to_reference:
-        descricao = account.get('account')
+        for account in accounts_to_reference:
+            descricao = account.get('account')
 
-        if not descricao:
-            continue
+            if not descricao:
+                continue
 
-        if descricao in descricoes_banco:
-            if descricao not in approved_seen:
-                accounts_approved.append(deepcopy(account))
-                approved_seen.add(descricao)
-        else:
-            if descricao not in rejected_seen:
-                accounts_rejected.append(deepcopy(account))
-                rejected_seen.add(descricao)
-
-    data_complements = get_data_complements(
-        contas_analiticas, 
-        accounts_approved, 
-        accounts_rejected
-    )
+            if descricao in descricao_to_conta:
+                if descricao not in approved_seen:
+                    accounts_approved.append(account)
+                    approved_seen.add(descricao)
+            else:
+                if descricao not in rejected_seen:
+                    accounts_rejected.append(account)
+                    rejected_seen.add(descricao)
+
+        data_complements = get_data_complements(
+            descricao_to_conta, 
+            accounts_approved, 
+            accounts_rejected
+        )
 
     todas_contas = data_complements['accounts_approved'] + data_complements['accounts_rejected']
     
     todas_contas = ordenar_contas_por_classification(todas_contas)
     
-    for conta in todas_contas:
-        conta['ordem'] = None
-        conta['data_inicial'] = data_inicial
-        conta['data_final'] = data_final
-        conta['ano_base'] = ano_base
-        conta['arquivo_id'] = arquivo_id
-    
     if arquivo_id:
+        # Um reprocessamento do mesmo arquivo (ex: job reservado de novo) substitui as
+        # contas já gravadas em vez de duplicá-las
+        execute_update(query=querys["delete_contas_arquivo"], params=(arquivo_id,))
         dados_insert = preparar_dados_para_insert(
             todas_contas, arquivo_id, data_inicial, 
             data_final, ano_base
@@ -462,9 +669,13 @@ def cross_references(analytical_accounts_parsed, arquivo_id=None):
         inserir_contas_arquivo(dados_insert)
     
     for ordem, conta in enumerate(todas_contas, start=1):
-        conta['ordem'] = ordem
+        conta.ordem = ordem
 
-    return data_complements
+    periodo = (data_inicial, data_final, ano_base, arquivo_id)
+    return {
+        tipo: [conta.as_dict(*periodo) for conta in contas]
+        for tipo, contas in data_complements.items()
+    }
 
 
 # def parse_agent_result(agentes, response):
@@ -530,7 +741,7 @@ def cross_references(analytical_accounts_parsed, arquivo_id=None):
 #         raise
 
 #     except Exception as e:
-#         print(f"Erro ao processar: {e}")
+#         logger.exception("Erro ao processar: %s", e)
 #         raise
 
 
@@ -2,16 +2,25 @@
 Módulo para gerenciamento de conexão com banco de dados PostgreSQL.
 """
 
-from psycopg2.pool import ThreadedConnectionPool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, connection
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from psycopg2.extras import RealDictCursor, execute_values
+from threading import BoundedSemaphore, Lock, local
+from psycopg2 import connect, OperationalError
+from psycopg2.sql import SQL, Identifier
+from logging_setup import get_logger
 from contextlib import contextmanager
+from time import monotonic, sleep
+from collections import deque
 from dotenv import load_dotenv
-from psycopg2 import connect
-from os import getenv
+from select import select
+from os import getenv, getpid
 
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 connection_pool = None
 
 DB_CONFIG = {
@@ -22,40 +31,169 @@ DB_CONFIG = {
     'password': getenv('DB_PASS', ''),
 }
 
+DB_POOL_ENABLED = getenv('DB_POOL_ENABLED', 'True').lower() == 'true'
+DB_POOL_MIN = int(getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_MAX_LIFETIME = float(getenv('DB_POOL_MAX_LIFETIME', 1800))
+DB_POOL_PING_IDLE = float(getenv('DB_POOL_PING_IDLE', 30))
+
+_pool_lock = Lock()
+_pool_pid = None
+_pool_slots = None
+_pool_created_at = None
+_pool_max = None
+_checkout_times = deque(maxlen=10_000)
+_pool_counters = {}
+_pinned = local()
+
+
+class _PooledConnection(connection):
+    """
+    Conexão do pool com os instantes de criação e de devolução.
+
+    Os dados ficam no próprio objeto: conexões fechadas pelo psycopg2 no putconn
+    (acima de minconn) somem junto com eles.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = monotonic()
+        self.returned = None
+
+
+def _reset_pool_counters():
+    _pool_counters.update({
+        'checkouts': 0,
+        'waiting': 0,
+        'wait_total': 0.0,
+        'wait_max': 0.0,
+        'timeouts': 0,
+        'recycled': 0,
+        'invalidated': 0,
+    })
+    _checkout_times.clear()
+
 
-def create_connection_pool(min_conn = 1, max_conn = 10):
+def create_connection_pool(min_conn = None, max_conn = None):
     """
     Cria um pool de conexões com o banco de dados.
+
+    O psycopg2 mantém abertas no máximo `min_conn` conexões ociosas; as demais são
+    fechadas ao serem devolvidas, então DB_POOL_MIN deve acompanhar a concorrência
+    usual do processo.
     
     Args:
-        min_conn: Número mínimo de conexões no pool
-        max_conn: Número máximo de conexões no pool
+        min_conn: Número mínimo de conexões no pool (padrão: DB_POOL_MIN)
+        max_conn: Número máximo de conexões no pool (padrão: DB_POOL_MAX)
     """
-    global connection_pool
+    global connection_pool, _pool_pid, _pool_slots, _pool_created_at, _pool_max
+    min_conn = DB_POOL_MIN if min_conn is None else min_conn
+    max_conn = DB_POOL_MAX if max_conn is None else max_conn
     try:
         connection_pool = ThreadedConnectionPool(
             min_conn,
             max_conn,
+            connection_factory=_PooledConnection,
             **DB_CONFIG
         )
-        print(f"Pool de conexões criado com sucesso ({min_conn}-{max_conn} conexões)")
+        _pool_pid = getpid()
+        _pool_slots = BoundedSemaphore(max_conn)
+        _pool_created_at = monotonic()
+        _pool_max = max_conn
+        _reset_pool_counters()
+        logger.info("Pool de conexões criado com sucesso (%s-%s conexões)", min_conn, max_conn)
     except Exception as e:
-        print(f"Erro ao criar pool de conexões: {e}")
+        logger.error("Erro ao criar pool de conexões: %s", e)
         raise
 
 
+def _ensure_pool():
+    # Cria o pool na primeira conexão e recria após um fork (ex: workers do gunicorn),
+    # já que as conexões do processo pai não podem ser compartilhadas
+    if connection_pool is not None and _pool_pid == getpid():
+        return
+    with _pool_lock:
+        if connection_pool is None or _pool_pid != getpid():
+            create_connection_pool()
+
+
+def _discard_connection(conn, counter):
+    with _pool_lock:
+        _pool_counters[counter] += 1
+    connection_pool.putconn(conn, close=True)
+
+
+def _checkout_valid_connection():
+    for _ in range(_pool_max + 1):
+        conn = connection_pool.getconn()
+        now = monotonic()
+
+        if conn.closed:
+            _discard_connection(conn, 'invalidated')
+            continue
+
+        if now - conn.created > DB_POOL_MAX_LIFETIME:
+            _discard_connection(conn, 'recycled')
+            continue
+
+        if conn.returned is not None and now - conn.returned > DB_POOL_PING_IDLE:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                _discard_connection(conn, 'invalidated')
+                continue
+
+        return conn
+
+    raise PoolError("Não foi possível obter uma conexão válida do pool")
+
+
 def get_connection():
     """
     Obtém uma conexão do pool ou cria uma nova conexão.
+
+    Com o pool ativo (DB_POOL_ENABLED), a chamada aguarda até DB_POOL_TIMEOUT
+    segundos por uma conexão livre. Conexões fechadas, mais antigas que
+    DB_POOL_MAX_LIFETIME ou que falham no teste após DB_POOL_PING_IDLE segundos
+    ociosas são descartadas e substituídas.
     
     Returns:
         psycopg2.connection: Objeto de conexão com o banco de dados
     """
-    if connection_pool:
-        return connection_pool.getconn()
-    else:
+    if not DB_POOL_ENABLED:
         return connect(**DB_CONFIG)
 
+    _ensure_pool()
+
+    inicio = monotonic()
+    with _pool_lock:
+        _pool_counters['waiting'] += 1
+    acquired = _pool_slots.acquire(timeout=DB_POOL_TIMEOUT)
+    espera = monotonic() - inicio
+
+    with _pool_lock:
+        _pool_counters['waiting'] -= 1
+        if not acquired:
+            _pool_counters['timeouts'] += 1
+    if not acquired:
+        raise PoolError(f"Tempo esgotado aguardando conexão do pool ({DB_POOL_TIMEOUT}s)")
+
+    try:
+        conn = _checkout_valid_connection()
+    except Exception:
+        _pool_slots.release()
+        raise
+
+    with _pool_lock:
+        _pool_counters['checkouts'] += 1
+        _pool_counters['wait_total'] += espera
+        _pool_counters['wait_max'] = max(_pool_counters['wait_max'], espera)
+        _checkout_times.append(monotonic())
+    return conn
+
 
 def return_connection(conn):
     """
@@ -64,12 +202,49 @@ def return_connection(conn):
     Args:
         conn: Objeto de conexão a ser retornado ao pool
     """
-    if connection_pool:
-        connection_pool.putconn(conn)
+    if connection_pool and DB_POOL_ENABLED:
+        conn.returned = monotonic()
+        try:
+            connection_pool.putconn(conn, close=conn.closed != 0)
+        finally:
+            _pool_slots.release()
     else:
         conn.close()
 
 
+def pool_stats():
+    """
+    Retorna as métricas de uso do pool de conexões neste processo.
+
+    Returns:
+        dict: Conexões em uso/ociosas, esperas, checkouts por segundo (último minuto)
+        e contadores de conexões recicladas, invalidadas e timeouts
+    """
+    with _pool_lock:
+        if connection_pool is None:
+            return {'enabled': DB_POOL_ENABLED, 'initialized': False}
+
+        agora = monotonic()
+        recentes = sum(1 for instante in _checkout_times if agora - instante <= 60)
+        checkouts = _pool_counters['checkouts']
+        return {
+            'enabled': DB_POOL_ENABLED,
+            'initialized': True,
+            'min': connection_pool.minconn,
+            'max': connection_pool.maxconn,
+            'in_use': len(connection_pool._used),
+            'idle': len(connection_pool._pool),
+            'waiting': _pool_counters['waiting'],
+            'checkouts': checkouts,
+            'checkouts_per_second': recentes / min(60.0, max(agora - _pool_created_at, 1e-9)),
+            'wait_avg_ms': _pool_counters['wait_total'] / checkouts * 1000 if checkouts else 0.0,
+            'wait_max_ms': _pool_counters['wait_max'] * 1000,
+            'timeouts': _pool_counters['timeouts'],
+            'recycled': _pool_counters['recycled'],
+            'invalidated': _pool_counters['invalidated'],
+        }
+
+
 @contextmanager
 def get_db_connection():
     """
@@ -82,6 +257,22 @@ def get_db_connection():
             cursor.execute("SELECT * FROM tabela")
             result = cursor.fetchall()
     """
+    pinned = getattr(_pinned, 'conn', None)
+    if pinned is not None and getattr(_pinned, 'transacao', False):
+        # Dentro de transaction(): commit/rollback só no fim do bloco
+        yield pinned
+        return
+    if pinned is not None:
+        try:
+            yield pinned
+            pinned.commit()
+        except Exception as e:
+            if not pinned.closed:
+                pinned.rollback()
+            logger.error("Erro na operação do banco de dados: %s", e)
+            raise
+        return
+
     conn = None
     try:
         conn = get_connection()
@@ -90,13 +281,71 @@ def get_db_connection():
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"Erro na operação do banco de dados: {e}")
+        logger.error("Erro na operação do banco de dados: %s", e)
         raise
     finally:
         if conn:
             return_connection(conn)
 
 
+@contextmanager
+def pinned_connection():
+    """
+    Fixa uma conexão na thread atual durante o bloco.
+
+    Dentro do bloco, get_db_connection (e portanto execute_query, execute_update,
+    copy_rows, ...) reutiliza essa conexão em vez de ir ao pool a cada chamada.
+    Cada operação continua com seu próprio commit/rollback.
+
+    Usage:
+        with pinned_connection():
+            cross_references(dados, arquivo_id)
+            update_conta_arquivo_status(arquivo_id)
+    """
+    if getattr(_pinned, 'conn', None) is not None:
+        yield _pinned.conn
+        return
+
+    conn = get_connection()
+    _pinned.conn = conn
+    try:
+        yield conn
+    finally:
+        _pinned.conn = None
+        return_connection(conn)
+
+
+@contextmanager
+def transaction():
+    """
+    Executa o bloco em uma única transação.
+
+    Fixa uma conexão na thread (ver pinned_connection) e suspende o commit de cada
+    operação: tudo é confirmado no fim do bloco ou desfeito se ele falhar. Blocos
+    aninhados fazem parte da transação externa.
+
+    Usage:
+        with transaction():
+            cross_references(dados, arquivo_id)
+            update_conta_arquivo_status(arquivo_id)
+    """
+    with pinned_connection() as conn:
+        if getattr(_pinned, 'transacao', False):
+            yield conn
+            return
+
+        _pinned.transacao = True
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            _pinned.transacao = False
+
+
 def test_connection():
     """
     Testa a conexão com o banco de dados.
@@ -109,10 +358,10 @@ def test_connection():
             cursor = conn.cursor()
             cursor.execute("SELECT version();")
             version = cursor.fetchone()
-            print(f"Conexão bem-sucedida! Versão do PostgreSQL: {version[0]}")
+            logger.info("Conexão bem-sucedida! Versão do PostgreSQL: %s", version[0])
             return True
     except Exception as e:
-        print(f"Erro ao conectar ao banco de dados: {e}")
+        logger.error("Erro ao conectar ao banco de dados: %s", e)
         return False
 
 
@@ -171,6 +420,106 @@ def execute_many(query, params_list):
             return cursor.rowcount
 
 
+def execute_bulk(query, rows, template=None):
+    """
+    Executa uma query com VALUES %s expandido para todas as linhas em um único comando.
+
+    Útil para atualizações em lote no formato UPDATE ... FROM (VALUES %s).
+
+    Args:
+        query: Query SQL com um único placeholder %s no lugar da lista de VALUES
+        rows: Sequência de tuplas com os valores
+        template: Template de cada linha (ex: '(%s, %s::text)'), opcional
+
+    Returns:
+        int: Número de linhas afetadas
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            execute_values(cursor, query, rows, template=template, page_size=len(rows))
+            return cursor.rowcount
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class _CopyReader:
+    """
+    Objeto de arquivo somente leitura que serializa as tuplas no formato texto
+    do COPY à medida que o PostgreSQL lê, sem materializar todas as linhas.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.count = 0
+
+    def _fill(self, size):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += '\t'.join(_copy_value(value) for value in row) + '\n'
+            self.count += 1
+
+    def read(self, size=-1):
+        self._fill(size)
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        if '\n' not in self._buffer:
+            self._fill(len(self._buffer) + 1)
+        end = self._buffer.find('\n') + 1 or len(self._buffer)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+
+def copy_rows(table, columns, rows):
+    """
+    Insere linhas em lote com COPY FROM STDIN, em uma única ida ao banco.
+
+    As linhas podem vir de um gerador: são serializadas sob demanda enquanto o
+    PostgreSQL consome o fluxo.
+
+    Args:
+        table: Nome da tabela de destino
+        columns: Sequência com os nomes das colunas, na ordem das tuplas
+        rows: Iterável de tuplas com os valores
+
+    Returns:
+        int: Número de linhas enviadas
+    """
+    reader = _CopyReader(rows)
+    query = SQL("COPY {} ({}) FROM STDIN").format(
+        Identifier(table),
+        SQL(', ').join(Identifier(column) for column in columns),
+    )
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(query, reader)
+    return reader.count
+
+
 def close_pool():
     """
     Fecha o pool de conexões.
@@ -179,4 +528,44 @@ def close_pool():
     if connection_pool:
         connection_pool.closeall()
         connection_pool = None
-        print("Pool de conexões fechado")
+        logger.info("Pool de conexões fechado")
+
+
+def listen_notifications(channel, callback, stop_event=None, timeout=5.0, retry_delay=5.0):
+    """
+    Escuta um canal LISTEN/NOTIFY do PostgreSQL e chama `callback(payload)` a cada notificação.
+
+    Usa uma conexão dedicada em autocommit (fora do pool). Se a conexão cair, o
+    callback é chamado com None (as notificações perdidas são desconhecidas) e a
+    escuta é retomada após `retry_delay` segundos.
+
+    Args:
+        channel: Nome do canal (ex: 'conta_analiticas_changed')
+        callback: Função chamada com o payload da notificação
+        stop_event: threading.Event que encerra a escuta quando sinalizado
+        timeout: Intervalo máximo de espera entre verificações do stop_event
+        retry_delay: Espera antes de reconectar após uma falha
+    """
+    while not (stop_event and stop_event.is_set()):
+        conn = None
+        try:
+            conn = connect(**DB_CONFIG)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(SQL("LISTEN {}").format(Identifier(channel)))
+
+            while not (stop_event and stop_event.is_set()):
+                if select([conn], [], [], timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    callback(conn.notifies.pop(0).payload)
+
+        except OperationalError as e:
+            logger.warning("Conexão de LISTEN perdida no canal %s: %s", channel, e)
+            callback(None)
+            sleep(retry_delay)
+
+        finally:
+            if conn:
+                conn.close()
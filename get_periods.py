@@ -1,12 +1,13 @@
 from werkzeug.datastructures import FileStorage
-from PyPDF2 import PdfReader
+from speds import scan_sped, periodo_sped
+from parser import read_header
 from pathlib import Path
-from io import BytesIO
 
 
 def read_periods_from_pdf(origem_pdf):
     """
-    Lê a primeira página de um PDF e retorna o texto extraído.
+    Lê apenas a primeira página de um PDF e retorna o cabeçalho estruturado
+    (empresa, CNPJ, período, emissão, ...).
 
     A origem do PDF pode ser o caminho para um arquivo, um FileStorage
     recebido via requisição Flask ou qualquer objeto compatível com arquivo.
@@ -18,11 +19,10 @@ def read_periods_from_pdf(origem_pdf):
             if not caminho.exists():
                 raise FileNotFoundError(f"Arquivo '{origem_pdf}' não encontrado.")
 
-            with caminho.open("rb") as arquivo:
-                return _extrair_texto(arquivo)
+            return read_header(caminho)
 
         stream = _obter_stream(origem_pdf)
-        return _extrair_texto(stream)
+        return read_header(stream)
 
     except Exception as exc:
         raise ValueError(f"Erro ao ler o PDF: {str(exc)}") from exc
@@ -34,53 +34,19 @@ def _obter_stream(origem_pdf):
 
     if isinstance(origem_pdf, FileStorage):
         origem_pdf.stream.seek(0)
-        # Copia o conteúdo do stream para BytesIO para garantir compatibilidade
-        # entre Windows e Linux, especialmente com PyPDF2
-        conteudo = origem_pdf.stream.read()
-        return BytesIO(conteudo)
+        return origem_pdf.stream
 
     if hasattr(origem_pdf, "seek") and hasattr(origem_pdf, "read"):
         origem_pdf.seek(0)
-        # Se já for um BytesIO ou similar, retorna diretamente
-        if isinstance(origem_pdf, BytesIO):
-            return origem_pdf
-        # Caso contrário, copia para BytesIO para garantir compatibilidade
-        conteudo = origem_pdf.read()
-        return BytesIO(conteudo)
+        return origem_pdf
 
     raise TypeError("Origem do PDF inválida.")
 
 
-def _extrair_texto(stream):
-    leitor_pdf = PdfReader(stream)
-
-    if len(leitor_pdf.pages) == 0:
-        raise ValueError("PDF não contém páginas.")
-
-    primeira_pagina = leitor_pdf.pages[0]
-    texto = primeira_pagina.extract_text()
-
-    if not texto:
-        raise ValueError("Não foi possível extrair texto do PDF.")
-
-    return texto
-
-
 def periodos_speds(sped_file):
-    with open(sped_file, 'rb') as file:
-        speds = file.readlines()
+    for _, campos in scan_sped(sped_file, {'0000'}):
+        return {
+            'periodo': periodo_sped(campos)
+        }
 
-    for sped in speds:
-        if b'|0000|' in sped:
-            periodo = sped.decode('utf-8')
-            if periodo.startswith('|0000|'):
-                periodo_limpo = periodo.strip()
-                periodo_campos = periodo_limpo.split('|')
-                periodo_inicio = periodo_campos[6]
-                periodo_fim = periodo_campos[7]
-                periodo_inicio_formatado = f"{periodo_inicio[0:2]}/{periodo_inicio[2:4]}/{periodo_inicio[4:8]}"
-                periodo_fim_formatado = f"{periodo_fim[0:2]}/{periodo_fim[2:4]}/{periodo_fim[4:8]}"
-            
-    return {
-        'periodo': [periodo_inicio_formatado, periodo_fim_formatado]
-    }
+    raise ValueError("Registro 0000 não encontrado no arquivo SPED.")
@@ -0,0 +1,248 @@
+"""
+Cliente HTTP compartilhado pelas integrações com o Cursor e o GitHub.
+
+Cada host tem uma requests.Session própria, com pool de conexões keep-alive, então
+chamadas seguidas reaproveitam a conexão TCP/TLS. Toda chamada passa por:
+
+- timeouts padrão de conexão e leitura (HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT);
+- novas tentativas com backoff exponencial e jitter em 429, 5xx e erros de rede,
+  respeitando Retry-After. POST só é repetido quando a requisição comprovadamente
+  não foi processada (429 ou falha ao conectar), para não criar agentes em dobro;
+- um circuit breaker por host: após HTTP_CIRCUIT_FALHAS falhas seguidas o host fica
+  bloqueado por HTTP_CIRCUIT_RESET segundos e as chamadas falham na hora com
+  CircuitOpenError. Depois disso, uma chamada de teste decide se o circuito fecha;
+- um histograma de latência por endpoint (ver latency_histograms).
+"""
+
+from requests.exceptions import ConnectionError, ConnectTimeout, RequestException, Timeout
+from requests.adapters import HTTPAdapter
+from logging_setup import get_logger
+from urllib.parse import urlsplit
+from time import monotonic, sleep
+from dotenv import load_dotenv
+from requests import Session
+from threading import Lock
+from random import uniform
+from os import getenv
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(getenv("HTTP_READ_TIMEOUT", 30))
+HTTP_POOL_MAXSIZE = int(getenv("HTTP_POOL_MAXSIZE", 10))
+HTTP_MAX_TENTATIVAS = int(getenv("HTTP_MAX_TENTATIVAS", 3))
+HTTP_BACKOFF_BASE = float(getenv("HTTP_BACKOFF_BASE", 0.5))
+HTTP_BACKOFF_MAX = float(getenv("HTTP_BACKOFF_MAX", 10))
+HTTP_CIRCUIT_FALHAS = int(getenv("HTTP_CIRCUIT_FALHAS", 5))
+HTTP_CIRCUIT_RESET = float(getenv("HTTP_CIRCUIT_RESET", 30))
+
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+LATENCIA_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_sessions = {}
+_sessions_lock = Lock()
+_circuitos = {}
+_circuitos_lock = Lock()
+_latencias = {}
+_latencias_lock = Lock()
+
+
+class CircuitOpenError(RequestException):
+    """O circuito do host está aberto; a chamada não foi enviada."""
+
+
+def _host(url):
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+
+def get_session(url):
+    """Retorna a sessão keep-alive do host da URL, criando-a na primeira chamada."""
+    host = _host(url)
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _sessions[host] = session
+    return session
+
+
+def _circuito(host):
+    circuito = _circuitos.get(host)
+    if circuito is None:
+        circuito = _circuitos.setdefault(host, {
+            'estado': 'fechado',
+            'falhas': 0,
+            'aberto_em': None,
+            'teste_em_andamento': False,
+        })
+    return circuito
+
+
+def _liberar_chamada(host):
+    with _circuitos_lock:
+        circuito = _circuito(host)
+        if circuito['estado'] == 'fechado':
+            return
+        if circuito['estado'] == 'aberto' and monotonic() - circuito['aberto_em'] >= HTTP_CIRCUIT_RESET:
+            circuito['estado'] = 'meio_aberto'
+        if circuito['estado'] == 'meio_aberto' and not circuito['teste_em_andamento']:
+            circuito['teste_em_andamento'] = True
+            return
+    raise CircuitOpenError(f"Circuito aberto para {host}; chamada não enviada")
+
+
+def _registrar_resultado(host, sucesso):
+    with _circuitos_lock:
+        circuito = _circuito(host)
+        circuito['teste_em_andamento'] = False
+        if sucesso:
+            circuito.update(estado='fechado', falhas=0, aberto_em=None)
+            return
+        circuito['falhas'] += 1
+        if circuito['estado'] == 'meio_aberto' or circuito['falhas'] >= HTTP_CIRCUIT_FALHAS:
+            if circuito['estado'] != 'aberto':
+                logger.warning("Circuito aberto para %s após %s falhas seguidas", host, circuito['falhas'])
+            circuito.update(estado='aberto', aberto_em=monotonic())
+
+
+def _registrar_latencia(endpoint, segundos):
+    with _latencias_lock:
+        histograma = _latencias.get(endpoint)
+        if histograma is None:
+            histograma = _latencias[endpoint] = {
+                'buckets': [0] * len(LATENCIA_BUCKETS),
+                'count': 0,
+                'sum': 0.0,
+            }
+        for indice, limite in enumerate(LATENCIA_BUCKETS):
+            if segundos <= limite:
+                histograma['buckets'][indice] += 1
+        histograma['count'] += 1
+        histograma['sum'] += segundos
+
+
+def _espera(tentativa, response=None):
+    """Segundos até a próxima tentativa (Retry-After ou backoff exponencial com jitter)."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** tentativa))
+
+
+def request(method, url, endpoint=None, tentativas=None, **kwargs):
+    """
+    Executa uma requisição HTTP com sessão por host, timeouts, novas tentativas e circuit breaker.
+
+    Args:
+        method: Método HTTP ('GET', 'POST', ...)
+        url: URL completa
+        endpoint: Nome usado no histograma de latência (padrão: 'MÉTODO host/caminho')
+        tentativas: Máximo de tentativas (padrão: HTTP_MAX_TENTATIVAS)
+        **kwargs: Repassados para requests (headers, params, json, auth, stream, timeout, ...)
+
+    Returns:
+        requests.Response: Última resposta recebida (o status não é verificado)
+
+    Raises:
+        CircuitOpenError: Se o circuito do host estiver aberto
+        RequestException: Se todas as tentativas falharem por erro de rede ou a
+            requisição falhar por outro motivo (ex: TooManyRedirects, InvalidURL)
+    """
+    method = method.upper()
+    host = _host(url)
+    endpoint = endpoint or f"{method} {host}{urlsplit(url).path}"
+    tentativas = tentativas or HTTP_MAX_TENTATIVAS
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    idempotente = method in METODOS_IDEMPOTENTES
+    session = get_session(url)
+
+    for tentativa in range(tentativas):
+        _liberar_chamada(host)
+        inicio = monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except RequestException as e:
+            # Qualquer erro conta como falha do host (inclusive TooManyRedirects,
+            # SSL...), senão uma chamada de teste com erro deixaria o circuito
+            # preso em meio_aberto; só erros de rede são repetidos
+            _registrar_latencia(endpoint, monotonic() - inicio)
+            _registrar_resultado(host, False)
+            pode_repetir = isinstance(e, (ConnectionError, Timeout)) and (idempotente or isinstance(e, ConnectTimeout))
+            if not pode_repetir or tentativa + 1 >= tentativas:
+                raise
+            sleep(_espera(tentativa))
+            continue
+
+        _registrar_latencia(endpoint, monotonic() - inicio)
+        _registrar_resultado(host, response.status_code < 500)
+
+        if response.status_code not in STATUS_RETENTAVEIS or tentativa + 1 >= tentativas:
+            return response
+        if not idempotente and response.status_code != 429:
+            return response
+
+        espera = _espera(tentativa, response)
+        if espera > HTTP_BACKOFF_MAX:
+            return response
+        response.close()
+        sleep(espera)
+
+    return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def latency_histograms():
+    """
+    Retorna uma cópia dos histogramas de latência por endpoint.
+
+    Returns:
+        dict: endpoint -> {'buckets': [(limite em segundos, contagem acumulada), ...],
+        'count', 'sum'}
+    """
+    with _latencias_lock:
+        return {
+            endpoint: {
+                'buckets': list(zip(LATENCIA_BUCKETS, histograma['buckets'])),
+                'count': histograma['count'],
+                'sum': histograma['sum'],
+            }
+            for endpoint, histograma in _latencias.items()
+        }
+
+
+def circuit_states():
+    """Retorna o estado do circuito de cada host ({host: {'estado', 'falhas'}})."""
+    with _circuitos_lock:
+        return {
+            host: {'estado': circuito['estado'], 'falhas': circuito['falhas']}
+            for host, circuito in _circuitos.items()
+        }
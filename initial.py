@@ -1,13 +1,16 @@
 from requests.exceptions import RequestException
-from db import test_connection, execute_query
+from db import execute_query
 from json import JSONDecodeError
+from logging_setup import get_logger
 from dotenv import load_dotenv
-from requests import post
+from http_client import post
 from os import getenv
 
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 API_URL = getenv("CURSOR_API_URL", None)
 API_KEY = getenv("API_KEY_CURSOR", None)
 REPOSITORY = getenv("REPOSITORIO", None)
@@ -87,6 +90,29 @@ headers = {
     "Content-Type": "application/json"
 }
 
+_colunas_prontas = False
+
+
+def ensure_agent_columns():
+    """
+    Cria as colunas de controle do verificador de agentes, se ainda não existirem.
+
+    criado_em guarda o createdAt do agente no Cursor (usado para encerrar a
+    paginação da listagem) e tentativas, os ciclos em que o agente não pôde ser
+    resolvido (ver agent_poller).
+    """
+    global _colunas_prontas
+    if not _colunas_prontas:
+        execute_query(
+            """SELECT pg_advisory_xact_lock(hashtext('agentes_colunas'));
+            ALTER TABLE agentes
+                ADD COLUMN IF NOT EXISTS criado_em TIMESTAMPTZ,
+                ADD COLUMN IF NOT EXISTS tentativas INTEGER NOT NULL DEFAULT 0
+            """,
+            fetch=False
+        )
+        _colunas_prontas = True
+
 
 def send_request_to_cursor(prompt, api_url, api_key, repo, ref, model):
     """
@@ -125,8 +151,8 @@ def send_request_to_cursor(prompt, api_url, api_key, repo, ref, model):
         if model:
             payload["model"] = model
         
-        print(f"Enviando requisição para API do Cursor...")
-        response = post(api_url, json=payload, headers=headers, auth=auth, timeout=300)
+        logger.info("Enviando requisição para API do Cursor...")
+        response = post(api_url, endpoint="cursor.agents.create", json=payload, headers=headers, auth=auth)
         
         response.raise_for_status()
         
@@ -138,14 +164,13 @@ def send_request_to_cursor(prompt, api_url, api_key, repo, ref, model):
         return response_json
         
     except RequestException as e:
-        print(f"Erro na requisição: {e}")
+        logger.error("Erro na requisição: %s", e)
         if hasattr(e, 'response') and e.response is not None:
-            print(f"Status code: {e.response.status_code}")
-            print(f"Resposta: {e.response.text}")
+            logger.error("Status code: %s | Resposta: %s", e.response.status_code, e.response.text)
         raise
 
     except Exception as e:
-        print(f"Erro ao processar: {e}")
+        logger.exception("Erro ao processar: %s", e)
         raise
 
 
@@ -159,20 +184,21 @@ def start_agent(user_id, file_id):
         status = resultado.get("status", None)
         branch = resultado.get("target", {}).get("branchName", None)
         url_branch = resultado.get("target", {}).get("url", None)
-
-        if test_connection():
-            execute_query(
-                """INSERT INTO agentes (
-                    status, branch, url_branch, usuario_id, arquivo_id, id_agente
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (status, branch, url_branch, user_id, file_id, id_agente),
-                fetch=False
-            )
-            print("✓ Dados inseridos com sucesso!")
+        criado_em = resultado.get("createdAt", None)
+
+        ensure_agent_columns()
+        execute_query(
+            """INSERT INTO agentes (
+                status, branch, url_branch, usuario_id, arquivo_id, id_agente, criado_em
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (status, branch, url_branch, user_id, file_id, id_agente, criado_em),
+            fetch=False
+        )
+        logger.info("Agente %s registrado | user_id=%s | file_id=%s", id_agente, user_id, file_id)
 
     except Exception as e:
-        print(f"\n✗ Erro ao executar: {e}")
+        logger.exception("Erro ao iniciar agente: %s", e)
         return 1
     
     return 0
@@ -0,0 +1,237 @@
+"""
+Fila de jobs assíncronos persistida no PostgreSQL.
+
+Os jobs ficam na tabela `jobs` (criada sob demanda) e são consumidos por threads
+locais. A reserva usa FOR UPDATE SKIP LOCKED, então vários processos (ex: workers
+do gunicorn) podem consumir a mesma fila sem processar um job duas vezes. Jobs
+presos em 'running' por mais de JOBS_STALE_SECONDS (worker morto) voltam a ser
+reservados até JOBS_MAX_TENTATIVAS; depois disso são marcados como 'failed'.
+"""
+
+from db import execute_query, execute_update
+from threading import Event, Lock, Thread
+from psycopg2.extras import Json
+from logging_setup import get_logger
+from dotenv import load_dotenv
+from io import BytesIO
+from os import getenv
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+JOBS_WORKERS = int(getenv("JOBS_WORKERS", 2))
+JOBS_POLL_INTERVAL = float(getenv("JOBS_POLL_INTERVAL", 2))
+JOBS_STALE_SECONDS = int(getenv("JOBS_STALE_SECONDS", 1800))
+JOBS_MAX_TENTATIVAS = int(getenv("JOBS_MAX_TENTATIVAS", 3))
+
+PROGRESSO_ETAPAS = {
+    'parser': 10,
+    'cruzamento': 60,
+    'status': 90,
+}
+
+querys = {
+    "create_table": """
+        SELECT pg_advisory_xact_lock(hashtext('jobs_create_table'));
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            etapa TEXT,
+            progresso INTEGER NOT NULL DEFAULT 0,
+            payload JSONB NOT NULL DEFAULT '{}',
+            arquivo BYTEA,
+            resultado JSONB,
+            erro TEXT,
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+            iniciado_em TIMESTAMPTZ,
+            finalizado_em TIMESTAMPTZ
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, id);
+    """,
+    "enqueue": "INSERT INTO jobs (tipo, payload, arquivo) VALUES (%s, %s, %s) RETURNING id",
+    "claim": """
+        UPDATE jobs SET
+            status = 'running',
+            etapa = NULL,
+            progresso = 0,
+            iniciado_em = now(),
+            tentativas = tentativas + 1
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE tentativas < %s AND (
+                status = 'queued'
+                OR (status = 'running' AND iniciado_em < now() - make_interval(secs => %s))
+            )
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, tipo, payload, arquivo
+    """,
+    "fail_stale": """
+        UPDATE jobs SET
+            status = 'failed', etapa = NULL, arquivo = NULL, finalizado_em = now(),
+            erro = 'Job interrompido após ' || tentativas || ' tentativas (worker encerrado)'
+        WHERE status = 'running'
+          AND tentativas >= %s
+          AND iniciado_em < now() - make_interval(secs => %s)
+    """,
+    "progress": "UPDATE jobs SET etapa = %s, progresso = %s WHERE id = %s",
+    "finish": """
+        UPDATE jobs SET
+            status = %s, etapa = NULL, progresso = 100, resultado = %s, erro = %s,
+            arquivo = NULL, finalizado_em = now()
+        WHERE id = %s
+    """,
+    "get": """
+        SELECT id, tipo, status, etapa, progresso, payload, resultado, erro,
+               tentativas, criado_em, iniciado_em, finalizado_em
+        FROM jobs WHERE id = %s
+    """,
+}
+
+_handlers = {}
+_workers = []
+_workers_lock = Lock()
+_wakeup = Event()
+_table_ready = False
+
+
+def register_handler(tipo, handler):
+    """
+    Registra a função que executa os jobs de um tipo.
+
+    O handler recebe (payload, arquivo, progresso), onde arquivo é um BytesIO
+    (ou None) e progresso(etapa) atualiza a etapa do job; o retorno é gravado
+    como resultado.
+    """
+    _handlers[tipo] = handler
+
+
+def ensure_jobs_table():
+    """Cria a tabela de jobs se ela ainda não existir."""
+    global _table_ready
+    if not _table_ready:
+        execute_update(querys["create_table"])
+        _table_ready = True
+
+
+def enqueue(tipo, payload=None, arquivo=None):
+    """
+    Enfileira um job e acorda os workers locais.
+
+    Args:
+        tipo: Tipo do job (precisa de um handler registrado)
+        payload: Dicionário serializável em JSON com os parâmetros
+        arquivo: Conteúdo binário opcional (ex: bytes do PDF)
+
+    Returns:
+        int: ID do job
+    """
+    ensure_jobs_table()
+    rows = execute_query(
+        query=querys["enqueue"],
+        params=(tipo, Json(payload or {}), arquivo),
+    )
+    _wakeup.set()
+    return rows[0]['id']
+
+
+def get_job(job_id):
+    """Retorna o estado do job (sem o conteúdo binário) ou None se não existir."""
+    ensure_jobs_table()
+    rows = execute_query(query=querys["get"], params=(job_id,))
+    return dict(rows[0]) if rows else None
+
+
+def _fail_stale_jobs():
+    falhos = execute_update(
+        query=querys["fail_stale"],
+        params=(JOBS_MAX_TENTATIVAS, JOBS_STALE_SECONDS),
+    )
+    if falhos:
+        logger.warning("%s job(s) presos marcados como failed após %s tentativas", falhos, JOBS_MAX_TENTATIVAS)
+
+
+def _claim_job():
+    _fail_stale_jobs()
+    rows = execute_query(
+        query=querys["claim"],
+        params=(JOBS_MAX_TENTATIVAS, JOBS_STALE_SECONDS),
+    )
+    return rows[0] if rows else None
+
+
+def _run_job(job):
+    job_id = job['id']
+
+    def progresso(etapa):
+        execute_update(
+            query=querys["progress"],
+            params=(etapa, PROGRESSO_ETAPAS.get(etapa, 0), job_id),
+        )
+
+    handler = _handlers.get(job['tipo'])
+    try:
+        if handler is None:
+            raise ValueError(f"Tipo de job sem handler: {job['tipo']}")
+        arquivo = BytesIO(bytes(job['arquivo'])) if job['arquivo'] is not None else None
+        resultado = handler(job['payload'], arquivo, progresso)
+    except Exception as e:
+        logger.exception("Erro ao executar job %s: %s", job_id, e)
+        execute_update(query=querys["finish"], params=('failed', None, str(e), job_id))
+        return
+
+    execute_update(query=querys["finish"], params=('done', Json(resultado), None, job_id))
+
+
+def _worker_loop(stop_event):
+    while not stop_event.is_set():
+        try:
+            ensure_jobs_table()
+            job = _claim_job()
+        except Exception as e:
+            logger.error("Erro ao buscar job na fila: %s", e)
+            job = None
+
+        if job is None:
+            _wakeup.wait(JOBS_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        _run_job(job)
+
+
+def start_workers(quantidade=None, stop_event=None):
+    """
+    Inicia as threads que consomem a fila neste processo.
+
+    Args:
+        quantidade: Número de workers (padrão: JOBS_WORKERS)
+        stop_event: threading.Event que encerra os workers quando sinalizado
+
+    Returns:
+        list: Threads iniciadas
+    """
+    quantidade = JOBS_WORKERS if quantidade is None else quantidade
+    stop_event = stop_event or Event()
+
+    with _workers_lock:
+        if any(worker.is_alive() for worker in _workers):
+            return _workers
+
+        _workers.clear()
+        for numero in range(quantidade):
+            worker = Thread(
+                target=_worker_loop,
+                args=(stop_event,),
+                name=f"jobs-worker-{numero}",
+                daemon=True,
+            )
+            worker.start()
+            _workers.append(worker)
+    return _workers
@@ -0,0 +1,248 @@
+"""
+Leitura das últimas linhas dos logs sem carregar o arquivo inteiro.
+
+Os arquivos são lidos de trás para frente em blocos, começando em app.log e
+seguindo para os backups da rotação (app.log.1 ... app.log.N) quando o limite
+ultrapassa o arquivo atual. Linhas sem data (ex: traceback) pertencem ao registro
+anterior, então os filtros valem por registro. Linhas JSON (LOG_FORMAT=json) e no
+formato texto antigo podem conviver no mesmo arquivo.
+
+Para filtros de período, cada arquivo tem um índice pequeno em memória com a data
+do primeiro registro a cada LOG_INDEX_STEP bytes. Ele é identificado pelo inode,
+de modo que continua válido quando a rotação renomeia o arquivo, e o índice do
+arquivo atual é estendido só com o trecho novo.
+"""
+
+from bisect import bisect_left, bisect_right
+from logging import getLevelName
+from datetime import datetime
+from dotenv import load_dotenv
+from threading import Lock
+from json import loads
+from re import compile
+from os import getenv
+
+
+load_dotenv()
+
+BLOCK_SIZE = 64 * 1024
+LOG_INDEX_STEP = int(getenv("LOG_INDEX_STEP", 256 * 1024))
+PADRAO_DATA = compile(rb'(?:\{"timestamp": ")?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+PADRAO_PATH = compile(r"\bpath=([^\s|]+)")
+TAMANHO_DATA = 19
+PADRAO_HORA = compile(r"(\d{2}):?(\d{2})?:?(\d{2})?")
+
+# (st_dev, st_ino) -> {'tamanho': bytes indexados, 'datas': [...], 'offsets': [...]}
+_indices = {}
+_indices_lock = Lock()
+
+
+def arquivos_de_log(caminho):
+    """Retorna o arquivo atual e os backups da rotação existentes, do mais novo ao mais antigo."""
+    arquivos = [caminho] if caminho.exists() else []
+    numero = 1
+    while True:
+        backup = caminho.with_name(f"{caminho.name}.{numero}")
+        if not backup.exists():
+            return arquivos
+        arquivos.append(backup)
+        numero += 1
+
+
+def normalizar_data(valor):
+    """
+    Converte uma data ISO 8601 para o formato das linhas de log, mantendo a precisão informada.
+
+    Aceita as formas estendida e compacta (ex: '2026-10-16', '20261016',
+    '2026-10-16T10:30', '20261016T1030'); o resultado é o prefixo correspondente de
+    'AAAA-MM-DD HH:MM:SS' ('2026-10-16', '2026-10-16 10:30'), comparável com as
+    datas do log. Fuso horário e frações de segundo são ignorados.
+
+    Raises:
+        ValueError: Se o valor não for uma data ISO 8601 válida
+    """
+    valor = valor.strip()
+    data = datetime.fromisoformat(valor)
+    tamanho = 10
+    separador = next((caractere for caractere in "T " if caractere in valor), None)
+    if separador:
+        hora = PADRAO_HORA.match(valor.split(separador, 1)[1])
+        if hora:
+            tamanho = (13, 16, 19)[sum(1 for grupo in hora.groups() if grupo) - 1]
+    return data.isoformat(sep=" ")[:tamanho]
+
+
+def _data_registro(linha):
+    """Data 'AAAA-MM-DD HH:MM:SS' do início da linha, ou None se for continuação."""
+    encontrado = PADRAO_DATA.match(linha)
+    if encontrado:
+        return encontrado.group(1).decode("ascii")
+    return None
+
+
+def _indice(arquivo, tamanho, stat):
+    chave = (stat.st_dev, stat.st_ino)
+    with _indices_lock:
+        indice = _indices.get(chave)
+        if indice is None or indice['tamanho'] > tamanho:
+            indice = {'tamanho': 0, 'datas': [], 'offsets': []}
+
+        inicio = indice['tamanho']
+        if inicio < tamanho:
+            arquivo.seek(inicio)
+            offset = inicio
+            proximo = indice['offsets'][-1] + LOG_INDEX_STEP if indice['offsets'] else 0
+            for linha in arquivo:
+                if offset + len(linha) > tamanho:
+                    break
+                if offset >= proximo:
+                    data = _data_registro(linha)
+                    if data is not None:
+                        indice['datas'].append(data)
+                        indice['offsets'].append(offset)
+                        proximo = offset + LOG_INDEX_STEP
+                offset += len(linha)
+            indice['tamanho'] = offset
+
+        _indices[chave] = indice
+        return indice
+
+
+def _linhas_reverso(arquivo, fim):
+    """Gera as linhas (bytes, sem quebra) de trás para frente a partir do offset `fim`."""
+    posicao = fim
+    resto = b""
+    while posicao > 0:
+        tamanho = min(BLOCK_SIZE, posicao)
+        posicao -= tamanho
+        arquivo.seek(posicao)
+        bloco = arquivo.read(tamanho) + resto
+        linhas = bloco.split(b"\n")
+        resto = linhas.pop(0)
+        for linha in reversed(linhas):
+            yield linha
+    yield resto
+
+
+def _registros_reverso(arquivo, fim):
+    """Agrupa as linhas em registros (linha com data + continuações), do mais novo ao mais antigo."""
+    continuacao = []
+    for linha in _linhas_reverso(arquivo, fim):
+        if not linha and not continuacao:
+            continue
+        data = _data_registro(linha)
+        if data is None:
+            continuacao.append(linha)
+            continue
+        yield data, [linha] + continuacao[::-1]
+        continuacao = []
+    if continuacao:
+        yield None, continuacao[::-1]
+
+
+def _filtro(nivel, path):
+    nivel_minimo = getLevelName(nivel.upper()) if nivel else None
+    if nivel_minimo is not None and not isinstance(nivel_minimo, int):
+        raise ValueError(f"Nível de log inválido: {nivel}")
+
+    def aceita(texto):
+        registro = None
+        if texto.startswith("{"):
+            try:
+                registro = loads(texto)
+            except ValueError:
+                pass
+
+        if nivel_minimo is not None:
+            if registro is not None:
+                nivel_registro = getLevelName(registro.get("level"))
+            else:
+                campos = texto.split(" | ", 3)
+                nivel_registro = getLevelName(campos[1]) if len(campos) > 1 else None
+            if not isinstance(nivel_registro, int) or nivel_registro < nivel_minimo:
+                return False
+
+        if path is not None:
+            if registro is not None and "path" in registro:
+                path_registro = registro["path"]
+            else:
+                encontrado = PADRAO_PATH.search(texto)
+                path_registro = encontrado.group(1) if encontrado else None
+            if path_registro != path:
+                return False
+
+        return True
+
+    return aceita
+
+
+def tail_logs(caminho, limit, nivel=None, path=None, inicio=None, fim=None):
+    """
+    Retorna os últimos `limit` registros de log que atendem aos filtros.
+
+    Args:
+        caminho: Path do arquivo de log atual (ex: logs/app.log)
+        limit: Quantidade máxima de registros
+        nivel: Nível mínimo (ex: 'WARNING' retorna WARNING, ERROR e CRITICAL)
+        path: Rota exata registrada no log como 'path=/rota'
+        inicio: Data mínima 'AAAA-MM-DD HH:MM:SS' (ou prefixo, ex: '2025-11-03')
+        fim: Data máxima, no mesmo formato (prefixos valem até o fim do período)
+
+    Returns:
+        list: Linhas dos registros, do mais antigo ao mais novo (registros com
+        traceback ocupam várias linhas)
+
+    Raises:
+        ValueError: Se o nível não existir
+    """
+    aceita = _filtro(nivel, path)
+    fim = fim + "\uffff" if fim and len(fim) < TAMANHO_DATA else fim
+    registros = []
+
+    for caminho_arquivo in arquivos_de_log(caminho):
+        try:
+            arquivo = caminho_arquivo.open("rb")
+        except OSError:
+            continue
+
+        with arquivo:
+            stat = caminho_arquivo.stat()
+            tamanho = stat.st_size
+            limite_superior = tamanho
+            ultimo_arquivo = False
+
+            if inicio or fim:
+                indice = _indice(arquivo, tamanho, stat)
+                datas = indice['datas']
+                if datas and fim and datas[0] > fim:
+                    continue
+                if fim:
+                    # Registros a partir da primeira amostra depois de `fim` ficam de fora
+                    posicao = bisect_right(datas, fim)
+                    if posicao < len(datas):
+                        limite_superior = indice['offsets'][posicao]
+                if inicio:
+                    # Com uma amostra anterior a `inicio`, os backups mais antigos não interessam
+                    ultimo_arquivo = bisect_left(datas, inicio) > 0
+
+            for data, linhas in _registros_reverso(arquivo, limite_superior):
+                if data is not None:
+                    if fim and data > fim:
+                        continue
+                    if inicio and data < inicio:
+                        ultimo_arquivo = True
+                        break
+                texto = b"\n".join(linhas).decode("utf-8", errors="ignore")
+                if aceita(texto):
+                    registros.append(texto)
+                    if len(registros) >= limit:
+                        break
+
+        if len(registros) >= limit or ultimo_arquivo:
+            break
+
+    return [
+        linha
+        for texto in reversed(registros)
+        for linha in texto.split("\n")
+    ]
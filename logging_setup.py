@@ -0,0 +1,141 @@
+"""
+Configuração do logging do serviço.
+
+Os módulos registram em loggers filhos de 'lpc_service' (ver get_logger). O logger
+raiz do serviço tem apenas um QueueHandler: a requisição só enfileira o registro, e
+um QueueListener em uma thread própria formata e grava no arquivo (com a rotação do
+RotatingFileHandler), tirando o I/O de disco do caminho da requisição.
+
+Com LOG_FORMAT=json (padrão), cada registro vira uma linha JSON com timestamp,
+level, logger, message, os campos passados em `extra` (ex: path, status) e o
+traceback em exc_info. LOG_FORMAT=text mantém o formato antigo
+'data | nível | logger | mensagem'.
+"""
+
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from dotenv import load_dotenv
+from queue import SimpleQueue
+from threading import Lock
+from random import random
+from json import dumps
+from copy import copy
+from os import getenv
+import logging
+import atexit
+
+
+load_dotenv()
+
+LOGGER_RAIZ = 'lpc_service'
+LOG_FORMAT = getenv('LOG_FORMAT', 'json').lower()
+LOG_SAMPLE_PATHS = {
+    path.strip()
+    for path in getenv('LOG_SAMPLE_PATHS', '/cronjob').split(',')
+    if path.strip()
+}
+LOG_SAMPLE_RATE = float(getenv('LOG_SAMPLE_RATE', 0.1))
+
+# Atributos padrão do LogRecord; o que não está aqui veio de `extra`
+CAMPOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+_listener_lock = Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON."""
+
+    def format(self, record):
+        dados = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for campo, valor in vars(record).items():
+            if campo not in CAMPOS_PADRAO and not campo.startswith('_'):
+                dados[campo] = valor
+        if record.exc_info:
+            dados['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados['exc_info'] = record.exc_text
+        return dumps(dados, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    QueueHandler que preserva o traceback em exc_text.
+
+    O prepare padrão junta o traceback à mensagem; aqui a mensagem é resolvida
+    (os args podem mudar depois) e o traceback fica separado para o formatter.
+    """
+
+    def prepare(self, record):
+        record = copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def criar_formatter(formato=None):
+    """Retorna o formatter de LOG_FORMAT ('json' ou 'text')."""
+    if (formato or LOG_FORMAT) == 'text':
+        return logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    return JsonFormatter()
+
+
+def configure_logging(log_file, level='INFO', max_bytes=1_000_000, backup_count=3):
+    """
+    Liga o logger do serviço a um QueueHandler e inicia o QueueListener que grava no arquivo.
+
+    Chamadas repetidas reaproveitam o listener já iniciado.
+
+    Args:
+        log_file: Path do arquivo de log
+        level: Nível mínimo
+        max_bytes: Tamanho máximo do arquivo antes da rotação
+        backup_count: Quantidade de backups mantidos pela rotação
+
+    Returns:
+        logging.Logger: Logger raiz do serviço
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_RAIZ)
+
+    with _listener_lock:
+        if _listener is not None:
+            return logger
+
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(criar_formatter())
+        file_handler.setLevel(level)
+
+        fila = SimpleQueue()
+        _listener = QueueListener(fila, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logger.handlers = [_QueueHandler(fila)]
+        logger.setLevel(level)
+        logger.propagate = False
+
+    return logger
+
+
+def get_logger(nome):
+    """Retorna o logger do módulo, filho do logger do serviço."""
+    return logging.getLogger(f"{LOGGER_RAIZ}.{nome}")
+
+
+def amostrar(path):
+    """
+    Decide se a requisição para `path` deve ser registrada.
+
+    Rotas em LOG_SAMPLE_PATHS (ex: /cronjob, chamada em alta frequência) são
+    registradas em apenas LOG_SAMPLE_RATE das requisições; as demais sempre.
+    """
+    return path not in LOG_SAMPLE_PATHS or random() < LOG_SAMPLE_RATE
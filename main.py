@@ -2,56 +2,73 @@
 Microsserviço Flask para ...
 """
 
-from cronjob import cross_references, update_conta_arquivo_status
-from logging.handlers import RotatingFileHandler
-from upload_github import upload_file_to_github
+from pipeline import processar_balancete, processar_lote, ler_zip, rotear_balancete, resumir_lote, empacotar_lote, ParserSemDadosError, ROTEAMENTO_LOCAL
+from metrics import observe, render_prometheus, formatar_histograma, formatar_gauges, CONTENT_TYPE
+from agent_poller import verificar_agentes, start_agent_poller, POLLER_INTERVALO, API_URL
+from cronjob import invalidate_analytical_catalog, start_catalog_listener
+from logging_setup import configure_logging, amostrar
+from upload_github import upload_file_to_github, upload_files_to_github
 from get_periods import read_periods_from_pdf, periodos_speds
 from werkzeug.utils import secure_filename
-from flask import Flask, request, jsonify
-from parser import main as parser_main
+from flask import Flask, request, jsonify, g
+from jobs import enqueue, get_job, start_workers, JOBS_WORKERS
 from sentry import validar_requisicao
-from initial import start_agent
 from dotenv import load_dotenv
 from flasgger import Swagger
 from flask_cors import CORS
+from time import perf_counter
 from pathlib import Path
 from os import getenv
-from re import search
-import logging
+from re import findall
+from json import loads
 import os
 import tempfile
-from db import test_connection
+from db import test_connection, create_connection_pool, pool_stats
 from speds import processa_sped
+from sped_index import load_index, validate_totals
+from log_tail import tail_logs, normalizar_data
+from http_client import latency_histograms
+import parser_cache
 
 
 load_dotenv()
 
 LOG_LEVEL = getenv('LOG_LEVEL', 'INFO').upper()
 LOG_FILE_PATH = Path(getenv('LOG_FILE_PATH', 'logs/app.log')).expanduser()
-LOG_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-formatter = logging.Formatter(
-  '%(asctime)s | %(levelname)s | %(name)s | %(message)s'
-)
-
-handler = RotatingFileHandler(
+logger = configure_logging(
   LOG_FILE_PATH,
-  maxBytes=int(getenv('LOG_MAX_BYTES', 1_000_000)),
-  backupCount=int(getenv('LOG_BACKUP_COUNT', 3))
+  level=LOG_LEVEL,
+  max_bytes=int(getenv('LOG_MAX_BYTES', 1_000_000)),
+  backup_count=int(getenv('LOG_BACKUP_COUNT', 3))
 )
-handler.setFormatter(formatter)
-handler.setLevel(LOG_LEVEL)
-
-logger = logging.getLogger('lpc_service')
-logger.setLevel(LOG_LEVEL)
-logger.addHandler(handler)
-logger.propagate = False
 
 regex_data = r'\b\d{2}/\d{2}/\d{4}\b'
 
 API_KEY_CURSOR = getenv('API_KEY_CURSOR')
 app = Flask(__name__)
 
+# Os processos do pool do parser (spawn/forkserver) importam este módulo como
+# __mp_main__ quando o serviço roda com `python main.py`; as threads e o pool de
+# conexões só sobem no processo principal
+PROCESSO_PRINCIPAL = __name__ != '__mp_main__'
+
+if PROCESSO_PRINCIPAL and getenv('CATALOGO_LISTEN', 'False').lower() == 'true':
+  start_catalog_listener()
+
+if PROCESSO_PRINCIPAL and getenv('DB_POOL_ENABLED', 'True').lower() == 'true':
+  try:
+    create_connection_pool()
+  except Exception as err:
+    # O pool é recriado sob demanda na primeira conexão
+    logger.error("Erro ao criar pool de conexoes na inicializacao | erro=%s", err)
+
+if PROCESSO_PRINCIPAL and JOBS_WORKERS > 0:
+  start_workers()
+
+if PROCESSO_PRINCIPAL and POLLER_INTERVALO > 0 and API_URL:
+  start_agent_poller()
+
 app.logger.handlers = logger.handlers
 app.logger.setLevel(logger.level)
 
@@ -105,21 +122,36 @@ swagger = Swagger(
 
 @app.before_request
 def log_request():
-  app.logger.info(
-    "Requisicao recebida | metodo=%s | path=%s | ip=%s",
-    request.method,
-    request.path,
-    request.remote_addr
-  )
+  g.inicio_requisicao = perf_counter()
 
 
 @app.after_request
 def log_response(response):
+  duracao = perf_counter() - g.get('inicio_requisicao', perf_counter())
+  # A rota (regra do Flask, não o path) evita uma série por ID na URL
+  rota = request.url_rule.rule if request.url_rule else 'nao_encontrada'
+  observe("lpc_http_request_duration_seconds", duracao, request.method, rota, str(response.status_code))
+
+  # Um registro por requisição; rotas de alto volume (LOG_SAMPLE_PATHS) são
+  # amostradas, exceto respostas de erro
+  if response.status_code < 500 and not amostrar(request.path):
+    return response
+
+  duracao_ms = duracao * 1000
   app.logger.info(
-    "Resposta retornada | status=%s | metodo=%s | path=%s",
-    response.status_code,
+    "Requisicao atendida | metodo=%s | path=%s | status=%s | ip=%s | duracao_ms=%.1f",
     request.method,
-    request.path
+    request.path,
+    response.status_code,
+    request.remote_addr,
+    duracao_ms,
+    extra={
+      "method": request.method,
+      "path": request.path,
+      "status": response.status_code,
+      "ip": request.remote_addr,
+      "duration_ms": round(duracao_ms, 1),
+    }
   )
   return response
 
@@ -203,9 +235,9 @@ def get_periods():
         "message": str(err)
       }), 400
 
-  # Processamento padrão para balancete (PDF)
+  # Processamento padrão para balancete (PDF): apenas a primeira página é lida
   try:
-    text_extracted = read_periods_from_pdf(arquivo)
+    header = read_periods_from_pdf(arquivo)
   except ValueError as err:
     app.logger.warning(
       "Erro ao processar PDF para periodos | erro=%s",
@@ -216,20 +248,13 @@ def get_periods():
       "message": str(err)
     }), 400
 
-  soup = text_extracted.splitlines()
-  datas_encontradas = []
-
-  for linha in soup:
-    if "Período" in linha:
-      termos = linha.split()
-      datas_encontradas.extend([
-        item for item in termos if search(regex_data, item)
-      ])
+  datas_encontradas = findall(regex_data, header.get("period") or "")
 
   return jsonify({
     "status": "success",
     "message": "Periods retrieved successfully",
-    "periods": datas_encontradas
+    "periods": datas_encontradas,
+    "header": header
   }), 200
 
 
@@ -237,7 +262,8 @@ def get_periods():
 def upload_file():
   """
   Upload de Arquivo
-  Recebe um arquivo de balancete e envia para o repositório GitHub configurado
+  Recebe um arquivo de balancete e envia para o repositório GitHub configurado.
+  Com vários campos 'file', todos os arquivos vão em um único commit (API Git Data)
   ---
   tags:
     - Upload
@@ -248,7 +274,7 @@ def upload_file():
       name: file
       type: file
       required: true
-      description: Arquivo de balancete (PDF) a ser enviado para o GitHub
+      description: Arquivo de balancete (PDF) a ser enviado para o GitHub (repita o campo para enviar vários em um commit)
   responses:
     200:
       description: Arquivo enviado com sucesso
@@ -273,20 +299,28 @@ def upload_file():
             type: string
             example: Failed to upload file
   """
-  file = request.files['file']
-  up = upload_file_to_github(file)
+  files = request.files.getlist('file') or [request.files['file']]
+  if len(files) > 1:
+    up = upload_files_to_github(files)
+  else:
+    up = upload_file_to_github(files[0])
 
   status_code = up.get("status", 500) if isinstance(up, dict) else 500
 
   if status_code == 200 or status_code == 201:
     app.logger.info(
-      "Upload realizado com sucesso no GitHub | status=%s",
-      status_code
+      "Upload realizado com sucesso no GitHub | status=%s | arquivos=%s | alterado=%s",
+      status_code,
+      len(files),
+      up.get("alterado")
     )
+    detalhes = up.get("resultado")
+    if len(files) > 1:
+      detalhes = {**detalhes, "caminhos": up["caminhos"], "inalterados": up["inalterados"]}
     return jsonify({
       "status": status_code,
       "message": "File uploaded successfully",
-      "detalhes": up.get("resultado") if isinstance(up, dict) else None,
+      "detalhes": detalhes,
     }), 200
   else:
     app.logger.error(
@@ -459,11 +493,19 @@ def health_check():
           cursor_configured:
             type: boolean
             example: true
+          parser_cache:
+            type: object
+            description: Contadores do cache do parser (hits, misses, stores, evictions, hit_ratio)
+          parser_layout_cache:
+            type: object
+            description: Contadores do cache de layouts calibrados, no mesmo formato
   """
   return jsonify({
     "status": "healthy",
     "service": "Cursor Agent Processor",
-    "cursor_configured": bool(API_KEY_CURSOR)
+    "cursor_configured": bool(API_KEY_CURSOR),
+    "parser_cache": parser_cache.stats(),
+    "parser_layout_cache": parser_cache.stats("layout")
   }), 200
 
 
@@ -471,7 +513,11 @@ def health_check():
 def run_agent():
   """
   Executar Agente Cursor
-  Endpoint principal para acionar agentes do Cursor a partir de IDs existentes
+  Endpoint principal para acionar agentes do Cursor a partir de IDs existentes.
+  O balancete passa antes pelo parser local; se o resultado for confiável
+  (score >= ROTEAMENTO_LIMIAR), os dados são gravados direto e o agente não é criado.
+  Com PDF, o roteamento (parser, gravação ou agente) é enfileirado e a resposta
+  traz o ID do job; sem PDF, o agente é iniciado dentro da requisição.
   ---
   tags:
     - Cursor Agents
@@ -488,15 +534,79 @@ def run_agent():
       type: integer
       required: true
       description: Identificador numérico do arquivo vinculado ao agente
+    - in: formData
+      name: file
+      type: file
+      required: false
+      description: PDF do balancete enviado para este file_id; sem ele, o agente é iniciado direto (motivo pdf_indisponivel)
+    - in: formData
+      name: sincrono
+      type: boolean
+      required: false
+      default: false
+      description: Se true, roteia dentro da requisição (parser local e, se confiável, gravação) em vez de enfileirar
   responses:
-    200:
-      description: Execução do agente concluída com sucesso
+    202:
+      description: Roteamento enfileirado; a decisão (rota, motivo, confianca, resumo) fica no resultado de /jobs/{job_id}
       schema:
         type: object
         properties:
+          success:
+            type: boolean
+            example: true
           status:
             type: string
-            example: success
+            example: queued
+          job_id:
+            type: integer
+            example: 42
+          status_url:
+            type: string
+            example: /jobs/42
+    200:
+      description: Agente iniciado (sem PDF) ou roteamento síncrono concluído (sincrono=true)
+      schema:
+        type: object
+        properties:
+          success:
+            type: boolean
+            example: true
+          message:
+            type: string
+            example: Balancete processado localmente
+          rota:
+            type: string
+            enum: [local, agente]
+            example: local
+          motivo:
+            type: string
+            enum: [confianca_suficiente, confianca_baixa, parser_sem_dados, pdf_indisponivel, roteamento_local_desativado]
+            example: confianca_suficiente
+          confianca:
+            type: object
+            description: Score e critérios do parser local (null quando o parser não rodou)
+            properties:
+              score:
+                type: number
+                example: 1.0
+              contas:
+                type: integer
+                example: 692
+              linhas:
+                type: number
+                example: 0.983
+              conciliacao:
+                type: number
+                example: 1.0
+              rollup:
+                type: number
+                example: 1.0
+              cobertura_pais:
+                type: number
+                example: 1.0
+          resumo:
+            type: object
+            description: Resumo da gravação quando a rota é local
     400:
       description: Erro na requisição (parâmetro ausente ou inválido)
       schema:
@@ -522,15 +632,39 @@ def run_agent():
   """
   try:
     user_id, file_id = validar_requisicao(request)
-    start_agent(user_id, file_id)
-    app.logger.info(
-      "Agente iniciado com sucesso | user_id=%s | file_id=%s",
-      user_id,
-      file_id
-    )
+
+    pdf_file = request.files.get('file')
+    if pdf_file is not None and pdf_file.filename == '':
+      pdf_file = None
+    if pdf_file is not None and not pdf_file.filename.lower().endswith('.pdf'):
+      raise ValueError("Campo 'file' deve ser um arquivo PDF.")
+
+    sincrono = request.form.get('sincrono', 'false').lower() == 'true'
+    if pdf_file is not None and ROTEAMENTO_LOCAL and not sincrono:
+      job_id = enqueue(
+        'rotear',
+        {"user_id": user_id, "file_id": file_id, "filename": pdf_file.filename},
+        pdf_file.read()
+      )
+      app.logger.info(
+        "Roteamento enfileirado | job_id=%s | user_id=%s | file_id=%s",
+        job_id,
+        user_id,
+        file_id
+      )
+      return jsonify({
+        "success": True,
+        "status": "queued",
+        "message": "Roteamento enfileirado",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+      }), 202
+
+    decisao = rotear_balancete(pdf_file, user_id, file_id)
     return jsonify({
       "success": True,
-      "message": "Agente iniciado com sucesso"
+      "message": "Balancete processado localmente" if decisao['rota'] == 'local' else "Agente iniciado com sucesso",
+      **decisao
     }), 200
 
   except ValueError as e:
@@ -564,7 +698,10 @@ def run_agent():
 def cronjob():
   """
   Cronjob
-  Executa a rotina que verifica e sincroniza agentes do Cursor
+  Executa um ciclo do verificador de agentes do Cursor (o mesmo que roda em
+  segundo plano a cada AGENT_POLLER_INTERVALO segundos): consulta a listagem
+  paginada de agentes, atualiza os status em lote e grava o resultado dos
+  agentes finalizados
   ---
   tags:
     - Cronjob
@@ -584,7 +721,7 @@ def cronjob():
             type: array
             items:
               type: object
-            description: Detalhes retornados pelo verificador de agentes
+            description: Agentes com status alterado ou finalizados (id_agente, arquivo_id, status_anterior, status, resumo ou erro); após AGENT_POLLER_MAX_TENTATIVAS ciclos sem solução o status passa para ERROR (falha ao gravar o resultado) ou NOT_FOUND (agente ausente da listagem)
     500:
       description: Falha ao executar o cronjob
       schema:
@@ -603,33 +740,18 @@ def cronjob():
             description: Informações adicionais (se disponíveis)
   """
   try:
-    parser_response = parser_main()
-    
-    if parser_response is None:
-      app.logger.warning("Parser não retornou dados")
-      return jsonify({
-        "status": "error",
-        "message": "Nenhum dado foi obtido do parser",
-        "response": []
-      }), 400
-    
-    processed_data = cross_references('')
-    
-    if processed_data is not None:
-      app.logger.info("Cronjob executado com sucesso")
-      return jsonify({
-        "status": "success",
-        "message": "Cronjob executado com sucesso",
-        "response": processed_data
-      }), 200
-    else:
-      app.logger.warning("Cronjob executado mas nenhum dado foi processado")
-      return jsonify({
-        "status": "success", 
-        "message": "Cronjob executado mas nenhum dado foi processado",
-        "response": []
-      }), 200
-      
+    resultados = verificar_agentes()
+    if resultados:
+      app.logger.info(
+        "Cronjob executado com sucesso | agentes_atualizados=%s",
+        len(resultados)
+      )
+    return jsonify({
+      "status": "success",
+      "message": "Cronjob executado com sucesso" if resultados else "Cronjob executado mas nenhum agente mudou de status",
+      "response": resultados
+    }), 200
+
   except Exception as e:
     app.logger.error(f"Erro ao executar cronjob: {str(e)}")
     return jsonify({
@@ -643,7 +765,8 @@ def cronjob():
 def get_logs():
   """
   Logs do Serviço
-  Retorna as ultimas linhas do arquivo de logs do microsservico
+  Retorna os ultimos registros do log do microsservico, lendo o arquivo de tras
+  para frente (inclusive os backups da rotacao) e aplicando os filtros no servidor
   ---
   tags:
     - Logs
@@ -653,10 +776,32 @@ def get_logs():
       type: integer
       required: false
       default: 200
-      description: Quantidade de linhas mais recentes que devem ser retornadas (maximo 2000)
+      description: Quantidade de registros mais recentes que devem ser retornados (maximo 2000)
+    - in: query
+      name: level
+      type: string
+      required: false
+      description: Nivel minimo (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+    - in: query
+      name: path
+      type: string
+      required: false
+      description: Rota exata registrada no log (ex. /run-agent)
+    - in: query
+      name: inicio
+      type: string
+      required: false
+      description: Data minima (AAAA-MM-DD ou AAAA-MM-DD HH:MM:SS)
+    - in: query
+      name: fim
+      type: string
+      required: false
+      description: Data maxima (AAAA-MM-DD ou AAAA-MM-DD HH:MM:SS)
   responses:
     200:
       description: Logs retornados com sucesso
+    400:
+      description: Filtro invalido
     404:
       description: Arquivo de log nao encontrado
   """
@@ -677,20 +822,88 @@ def get_logs():
       "message": "Arquivo de log nao encontrado."
     }), 404
 
-  with LOG_FILE_PATH.open('r', encoding='utf-8', errors='ignore') as logfile:
-    linhas = logfile.readlines()
+  periodo = {}
+  for campo in ('inicio', 'fim'):
+    valor = request.args.get(campo)
+    if not valor:
+      continue
+    try:
+      periodo[campo] = normalizar_data(valor)
+    except ValueError:
+      return jsonify({
+        "status": "error",
+        "message": f"Parametro '{campo}' invalido. Use AAAA-MM-DD ou AAAA-MM-DD HH:MM:SS."
+      }), 400
+
+  try:
+    logs = tail_logs(
+      LOG_FILE_PATH,
+      limit,
+      nivel=request.args.get('level'),
+      path=request.args.get('path'),
+      **periodo
+    )
+  except ValueError as e:
+    return jsonify({
+      "status": "error",
+      "message": str(e)
+    }), 400
 
   return jsonify({
     "status": "success",
     "message": "Logs recuperados com sucesso",
     "limit": limit,
-    "logs": [linha.rstrip('\n') for linha in linhas[-limit:]]
+    "logs": logs
   }), 200
 
 
 @app.route('/processar', methods=['POST'])
 def processar():
-  """"""
+  """
+  Processar Balancete
+  Enfileira o processamento de um balancete (PDF) e retorna o ID do job
+  ---
+  tags:
+    - Processamento
+  consumes:
+    - multipart/form-data
+  parameters:
+    - in: formData
+      name: file
+      type: file
+      required: true
+      description: Arquivo de balancete (PDF)
+    - in: formData
+      name: arquivo_id
+      type: integer
+      required: true
+      description: Identificador do arquivo em conta_arquivos
+    - in: formData
+      name: sincrono
+      type: boolean
+      required: false
+      default: false
+      description: Se true, processa dentro da requisição em vez de enfileirar
+  responses:
+    202:
+      description: Processamento enfileirado; acompanhe em /jobs/{job_id}
+      schema:
+        type: object
+        properties:
+          status:
+            type: string
+            example: queued
+          job_id:
+            type: integer
+            example: 42
+          status_url:
+            type: string
+            example: /jobs/42
+    200:
+      description: Processamento síncrono concluído
+    400:
+      description: Arquivo ausente ou inválido
+  """
   try:
     if 'file' not in request.files:
       app.logger.warning("Nenhum arquivo fornecido na requisição")
@@ -715,22 +928,31 @@ def processar():
         "message": "Only PDF files are allowed"
       }), 400
 
-    try:
-      arquivo_id = request.form.get('arquivo_id')
-      parser_response = parser_main(file)
+    arquivo_id = request.form.get('arquivo_id')
+    sincrono = request.form.get('sincrono', 'false').lower() == 'true'
 
-      if parser_response is None:
-        app.logger.warning("Parser não retornou dados")
-        return jsonify({
-          "status": "error",
-          "message": "Nenhum dado foi obtido do parser",
-          "response": []
-        }), 400
+    if not sincrono:
+      job_id = enqueue(
+        'processar',
+        {"arquivo_id": arquivo_id, "filename": file.filename},
+        file.read()
+      )
+      app.logger.info(
+        "Processamento enfileirado | job_id=%s | arquivo_id=%s",
+        job_id,
+        arquivo_id
+      )
+      return jsonify({
+        "status": "queued",
+        "message": "Processamento enfileirado",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+      }), 202
 
-      processed_data = cross_references(parser_response, arquivo_id)
+    try:
+      resultado = processar_balancete(file, arquivo_id)
 
-      if processed_data:
-        update_conta_arquivo_status(arquivo_id)
+      if resultado:
         app.logger.info("Cronjob executado com sucesso")
         return jsonify({
           "status": "success",
@@ -743,6 +965,14 @@ def processar():
           "message": "Cronjob executado mas nenhum dado foi processado",
           "response": []
         }), 200
+
+    except ParserSemDadosError as e:
+      app.logger.warning("Parser não retornou dados")
+      return jsonify({
+        "status": "error",
+        "message": str(e),
+        "response": []
+      }), 400
         
     except Exception as e:
       app.logger.error(f"Erro ao executar cronjob: {str(e)}")
@@ -761,6 +991,316 @@ def processar():
     }), 500
 
 
+@app.route('/processar-lote', methods=['POST'])
+def processar_lote_route():
+  """
+  Processar Lote de Balancetes
+  Enfileira o processamento de vários balancetes (PDFs ou um zip com PDFs) e retorna o ID do job; o resultado de cada arquivo fica em /jobs/{job_id}
+  ---
+  tags:
+    - Processamento
+  consumes:
+    - multipart/form-data
+  parameters:
+    - in: formData
+      name: files
+      type: file
+      required: true
+      description: PDFs do lote (campo repetido) ou um único arquivo .zip
+    - in: formData
+      name: arquivo_id
+      type: integer
+      required: false
+      description: IDs em conta_arquivos, um por PDF e na mesma ordem dos arquivos
+    - in: formData
+      name: mapa
+      type: string
+      required: false
+      description: 'JSON nome do arquivo -> arquivo_id (ex: {"jan.pdf": 10}); obrigatório para zip, a menos que os PDFs se chamem <arquivo_id>.pdf'
+    - in: formData
+      name: sincrono
+      type: boolean
+      required: false
+      default: false
+      description: Se true, processa dentro da requisição em vez de enfileirar
+  responses:
+    202:
+      description: Lote enfileirado; acompanhe em /jobs/{job_id} (o resultado segue o formato da resposta 200)
+      schema:
+        type: object
+        properties:
+          status:
+            type: string
+            example: queued
+          job_id:
+            type: integer
+            example: 43
+          status_url:
+            type: string
+            example: /jobs/43
+    200:
+      description: Lote processado (sincrono=true); o status de cada arquivo vem em "resultados"
+      schema:
+        type: object
+        properties:
+          status:
+            type: string
+            example: partial
+          processados:
+            type: integer
+            example: 11
+          falhas:
+            type: integer
+            example: 1
+          resultados:
+            type: array
+            items:
+              type: object
+              properties:
+                arquivo:
+                  type: string
+                  example: jan.pdf
+                arquivo_id:
+                  type: integer
+                  example: 10
+                status:
+                  type: string
+                  example: success
+    400:
+      description: Nenhum arquivo, extensão inválida, zip inválido ou mapa inválido
+  """
+  try:
+    uploads = [file for file in request.files.getlist('files') if file.filename]
+
+    if not uploads:
+      app.logger.warning("Nenhum arquivo fornecido na requisição do lote")
+      return jsonify({
+        "status": "error",
+        "message": "No file provided"
+      }), 400
+
+    try:
+      mapa = {
+        nome: str(arquivo_id)
+        for nome, arquivo_id in loads(request.form.get('mapa') or '{}').items()
+      }
+    except (ValueError, AttributeError):
+      return jsonify({
+        "status": "error",
+        "message": "Invalid 'mapa': expected a JSON object"
+      }), 400
+
+    if len(uploads) == 1 and uploads[0].filename.lower().endswith('.zip'):
+      try:
+        pdfs = ler_zip(uploads[0].read())
+      except ValueError as e:
+        return jsonify({
+          "status": "error",
+          "message": str(e)
+        }), 400
+      ids = []
+    else:
+      invalidos = [file.filename for file in uploads if not file.filename.lower().endswith('.pdf')]
+      if invalidos:
+        app.logger.warning("Arquivos com extensão inválida no lote: %s", invalidos)
+        return jsonify({
+          "status": "error",
+          "message": "Only PDF files are allowed",
+          "details": invalidos
+        }), 400
+      pdfs = [(file.filename, file.read()) for file in uploads]
+      ids = request.form.getlist('arquivo_id')
+
+    if not pdfs:
+      return jsonify({
+        "status": "error",
+        "message": "No PDF files found"
+      }), 400
+
+    arquivos = []
+    for posicao, (nome, conteudo) in enumerate(pdfs):
+      arquivo_id = mapa.get(nome) or (ids[posicao] if posicao < len(ids) else None)
+      if arquivo_id is None and Path(nome).stem.isdigit():
+        arquivo_id = Path(nome).stem
+      arquivos.append({"nome": nome, "arquivo_id": arquivo_id, "conteudo": conteudo})
+
+    if request.form.get('sincrono', 'false').lower() != 'true':
+      payload, conteudo = empacotar_lote(arquivos)
+      job_id = enqueue('processar_lote', payload, conteudo)
+      app.logger.info(
+        "Lote enfileirado | job_id=%s | arquivos=%s",
+        job_id,
+        len(arquivos)
+      )
+      return jsonify({
+        "status": "queued",
+        "message": "Lote enfileirado",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+      }), 202
+
+    app.logger.info("Processando lote | arquivos=%s", len(arquivos))
+    resumo = resumir_lote(processar_lote(arquivos))
+
+    app.logger.info(
+      "Lote processado | arquivos=%s | falhas=%s",
+      len(resumo['resultados']),
+      resumo['falhas']
+    )
+    return jsonify(resumo), 200
+
+  except Exception as e:
+    app.logger.error("Erro ao processar lote | error=%s", str(e))
+    return jsonify({
+      "status": "error",
+      "message": "Failed to process batch",
+      "details": str(e)
+    }), 500
+
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+  """
+  Status do Job
+  Retorna o andamento e o resultado de um job de processamento
+  ---
+  tags:
+    - Processamento
+  parameters:
+    - in: path
+      name: job_id
+      type: integer
+      required: true
+      description: ID retornado por /processar
+  responses:
+    200:
+      description: Estado do job
+      schema:
+        type: object
+        properties:
+          status:
+            type: string
+            example: running
+          etapa:
+            type: string
+            example: cruzamento
+          progresso:
+            type: integer
+            example: 60
+    404:
+      description: Job não encontrado
+  """
+  job = get_job(job_id)
+
+  if job is None:
+    return jsonify({
+      "status": "error",
+      "message": "Job não encontrado"
+    }), 404
+
+  for campo in ('criado_em', 'iniciado_em', 'finalizado_em'):
+    if job[campo] is not None:
+      job[campo] = job[campo].isoformat()
+
+  return jsonify(job), 200
+
+
+@app.route('/catalogo/invalidar', methods=['POST'])
+def invalidar_catalogo():
+  """
+  Invalidar Catálogo
+  Descarta o catálogo de contas analíticas em memória; a próxima requisição recarrega do banco
+  ---
+  tags:
+    - Catálogo
+  responses:
+    200:
+      description: Catálogo invalidado
+      schema:
+        type: object
+        properties:
+          status:
+            type: string
+            example: success
+          message:
+            type: string
+            example: Catálogo invalidado
+  """
+  invalidate_analytical_catalog()
+  app.logger.info("Catalogo de contas analiticas invalidado")
+  return jsonify({
+    "status": "success",
+    "message": "Catálogo invalidado"
+  }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+  """
+  Métricas no formato Prometheus
+  Retorna, no formato texto do Prometheus, os histogramas de duração das etapas do
+  processamento (stage), da latência por rota da API, das chamadas HTTP ao Cursor e
+  ao GitHub (endpoint) e os números do pool de conexões deste processo
+  ---
+  tags:
+    - Health
+  produces:
+    - text/plain
+  responses:
+    200:
+      description: Métricas no formato texto do Prometheus (version 0.0.4)
+      schema:
+        type: string
+        example: |
+          # TYPE lpc_stage_duration_seconds histogram
+          lpc_stage_duration_seconds_bucket{stage="parse_page",le="0.1"} 42
+          lpc_stage_duration_seconds_sum{stage="parse_page"} 1.92
+          lpc_stage_duration_seconds_count{stage="parse_page"} 45
+  """
+  linhas = render_prometheus()
+  linhas.extend(formatar_histograma(
+    "lpc_http_client_duration_seconds",
+    "Latência das chamadas HTTP ao Cursor e ao GitHub, por endpoint",
+    "endpoint",
+    latency_histograms()
+  ))
+  linhas.extend(formatar_gauges("lpc_db_pool", "Pool de conexões com o banco", pool_stats()))
+  return "\n".join(linhas) + "\n", 200, {"Content-Type": CONTENT_TYPE}
+
+
+@app.route('/metrics/pool', methods=['GET'])
+def metrics_pool():
+  """
+  Métricas do Pool de Conexões
+  Retorna o uso do pool de conexões com o banco de dados neste processo
+  ---
+  tags:
+    - Health
+  responses:
+    200:
+      description: Métricas do pool
+      schema:
+        type: object
+        properties:
+          in_use:
+            type: integer
+            example: 2
+          idle:
+            type: integer
+            example: 3
+          waiting:
+            type: integer
+            example: 0
+          checkouts_per_second:
+            type: number
+            example: 4.5
+          wait_avg_ms:
+            type: number
+            example: 0.02
+  """
+  return jsonify(pool_stats()), 200
+
+
 @app.route('/processar-sped', methods=['POST'])
 def processar_sped():
   """
@@ -851,8 +1391,24 @@ def processar_sped():
       arquivo_sped.save(temp_path)
     
     try:
+      # Indexar o arquivo e conferir as contagens com os totais do bloco 9
+      indice = load_index(temp_path)
+      divergencias = validate_totals(indice)
+
+      if divergencias:
+        app.logger.warning(
+          "Arquivo SPED incompleto ou inconsistente | filename=%s | divergencias=%s",
+          arquivo_sped.filename,
+          divergencias[:10]
+        )
+        return jsonify({
+          "status": "error",
+          "message": "Arquivo SPED incompleto: contagens divergentes dos totais do bloco 9.",
+          "divergencias": divergencias
+        }), 400
+
       # Processar o arquivo SPED
-      resultado = processa_sped(temp_path)
+      resultado = processa_sped(temp_path, indice)
       
       app.logger.info(
         "Arquivo SPED processado com sucesso | filename=%s",
@@ -912,7 +1468,7 @@ def index():
               type: string
             example:
               GET /health: Verifica o status do serviço e a configuração Cursor
-              POST /run-agent: Executa um agente Cursor para um arquivo vinculado
+              POST /run-agent: Enfileira o roteamento do balancete (parser local ou agente Cursor)
               POST /cronjob: Sincroniza agentes Cursor agendados
               GET /api-docs: Interface Swagger com documentação interativa
           swagger_ui:
@@ -925,7 +1481,7 @@ def index():
     "version": "1.0.0",
     "endpoints": {
       "GET /health": "Verifica o status do serviço e a configuração Cursor.",
-      "POST /run-agent": "Executa um agente Cursor vinculado a um arquivo.",
+      "POST /run-agent": "Processa o balancete com o parser local ou, se o resultado não for confiável, executa um agente Cursor.",
       "POST /cronjob": "Sincroniza agentes Cursor agendados.",
       "GET /api-docs": "Interface Swagger para explorar a API."
     },
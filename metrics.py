@@ -0,0 +1,204 @@
+"""
+Métricas de tempo por etapa no formato texto do Prometheus.
+
+As etapas do processamento (leitura de página, cabeçalho, catálogo, cruzamento,
+gravação em lote...) são medidas com `timer` / `timed` e acumuladas em
+histogramas em memória, por processo. O /metrics junta esses histogramas com os
+do cliente HTTP e os números do pool de conexões (ver render_prometheus e
+formatar_histograma).
+
+Medições feitas em processos filhos (ex: extração paralela do parser) ficam no
+processo filho e não aparecem aqui.
+"""
+
+from contextlib import contextmanager
+from time import perf_counter
+from functools import wraps
+from threading import Lock
+
+
+DURACAO_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# nome -> {'ajuda', 'rotulos', 'buckets', 'series': {valores dos rótulos: {'buckets', 'count', 'sum'}}}
+_histogramas = {}
+_histogramas_lock = Lock()
+
+
+def registrar_histograma(nome, ajuda, rotulos, buckets=DURACAO_BUCKETS):
+    """
+    Declara um histograma (chamadas repetidas com o mesmo nome são ignoradas).
+
+    Args:
+        nome: Nome da métrica (ex: 'lpc_stage_duration_seconds')
+        ajuda: Texto do # HELP
+        rotulos: Nomes dos rótulos, na ordem em que os valores são passados a observe
+        buckets: Limites superiores dos buckets, em ordem crescente
+    """
+    with _histogramas_lock:
+        _histogramas.setdefault(nome, {
+            'ajuda': ajuda,
+            'rotulos': tuple(rotulos),
+            'buckets': tuple(buckets),
+            'series': {},
+        })
+
+
+registrar_histograma(
+    "lpc_stage_duration_seconds",
+    "Duração das etapas do processamento de balancetes",
+    ("stage",),
+)
+registrar_histograma(
+    "lpc_http_request_duration_seconds",
+    "Latência das requisições atendidas pela API, por rota",
+    ("method", "route", "status"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+def observe(nome, segundos, *valores):
+    """
+    Registra uma observação no histograma `nome`.
+
+    Args:
+        nome: Histograma declarado com registrar_histograma
+        segundos: Valor observado
+        *valores: Valores dos rótulos, na ordem da declaração
+
+    Raises:
+        KeyError: Se o histograma não tiver sido declarado
+    """
+    with _histogramas_lock:
+        histograma = _histogramas[nome]
+        serie = histograma['series'].get(valores)
+        if serie is None:
+            serie = histograma['series'][valores] = {
+                'buckets': [0] * len(histograma['buckets']),
+                'count': 0,
+                'sum': 0.0,
+            }
+        for indice, limite in enumerate(histograma['buckets']):
+            if segundos <= limite:
+                serie['buckets'][indice] += 1
+        serie['count'] += 1
+        serie['sum'] += segundos
+
+
+@contextmanager
+def timer(stage):
+    """Mede o bloco como uma observação da etapa `stage` (inclusive quando ele falha)."""
+    inicio = perf_counter()
+    try:
+        yield
+    finally:
+        observe("lpc_stage_duration_seconds", perf_counter() - inicio, stage)
+
+
+def timed(stage):
+    """Decorator equivalente a `with timer(stage)` em volta da função."""
+    def decorator(funcao):
+        @wraps(funcao)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return funcao(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _linhas_histograma(nome, ajuda, series):
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} histogram"]
+    for pares, buckets, count, soma in series:
+        for limite, contagem in buckets:
+            linhas.append(f"{nome}_bucket{_rotulos(pares + [('le', _numero(limite))])} {contagem}")
+        linhas.append(f"{nome}_bucket{_rotulos(pares + [('le', '+Inf')])} {count}")
+        linhas.append(f"{nome}_sum{_rotulos(pares)} {_numero(soma)}")
+        linhas.append(f"{nome}_count{_rotulos(pares)} {count}")
+    return linhas
+
+
+def formatar_histograma(nome, ajuda, rotulo, series):
+    """
+    Formata histogramas com buckets já acumulados (ex: http_client.latency_histograms).
+
+    Args:
+        nome: Nome da métrica
+        ajuda: Texto do # HELP
+        rotulo: Nome do rótulo que identifica cada série
+        series: dict valor do rótulo -> {'buckets': [(limite, contagem acumulada), ...],
+            'count', 'sum'}
+
+    Returns:
+        list: Linhas no formato texto do Prometheus
+    """
+    return _linhas_histograma(nome, ajuda, [
+        ([(rotulo, valor)], serie['buckets'], serie['count'], serie['sum'])
+        for valor, serie in sorted(series.items())
+    ])
+
+
+def formatar_gauges(prefixo, ajuda, valores):
+    """
+    Formata um dicionário de números como gauges '<prefixo>_<chave>'.
+
+    Valores booleanos viram 0/1; os que não são números (ex: None) são ignorados.
+
+    Returns:
+        list: Linhas no formato texto do Prometheus
+    """
+    linhas = []
+    for chave, valor in valores.items():
+        if isinstance(valor, bool):
+            valor = int(valor)
+        if not isinstance(valor, (int, float)):
+            continue
+        nome = f"{prefixo}_{chave}"
+        linhas.extend([
+            f"# HELP {nome} {ajuda} ({chave})",
+            f"# TYPE {nome} gauge",
+            f"{nome} {_numero(valor)}",
+        ])
+    return linhas
+
+
+def render_prometheus():
+    """
+    Formata os histogramas registrados neste processo.
+
+    Returns:
+        list: Linhas no formato texto do Prometheus
+    """
+    with _histogramas_lock:
+        histogramas = [
+            (nome, histograma['ajuda'], [
+                (
+                    list(zip(histograma['rotulos'], valores)),
+                    list(zip(histograma['buckets'], serie['buckets'])),
+                    serie['count'],
+                    serie['sum'],
+                )
+                for valores, serie in sorted(histograma['series'].items())
+            ])
+            for nome, histograma in _histogramas.items()
+        ]
+
+    linhas = []
+    for nome, ajuda, series in histogramas:
+        linhas.extend(_linhas_histograma(nome, ajuda, series))
+    return linhas
@@ -1,15 +1,38 @@
 #!/usr/bin/env python3
 """Extrai o balancete em JSON estruturado a partir do PDF original."""
 
+from multiprocessing import get_all_start_methods, get_context
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import ProcessPoolExecutor
 from re import compile as re_compile
 from re import escape as re_escape
+from os import cpu_count, getenv
 from pathlib import Path
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LTChar, LTContainer
+from pdfplumber.utils import chars_to_textmap
+from unicodedata import normalize, combining
+from pdfminer.pdfpage import PDFPage
+from threading import Lock
+from hashlib import sha256
+from metrics import timed
+from io import BytesIO
+import parser_cache
 import pdfplumber
 
+PARSER_VERSION = "3"
+LAYOUT_CACHE_NAMESPACE = "layout"
 PDF_PATH = Path("parser-pdf/balancete.pdf")
 OUTPUT_PATH = Path("balancete.json")
 MIN_TOP = 70.0
 ROW_TOLERANCE = 1.5
+PARSER_WORKERS = int(getenv("PARSER_WORKERS", cpu_count() or 1))
+PARALLEL_MIN_PAGES = int(getenv("PARSER_PARALLEL_MIN_PAGES", 20))
+PARSER_MP_CONTEXT = getenv(
+    "PARSER_MP_CONTEXT",
+    "forkserver" if "forkserver" in get_all_start_methods() else "spawn",
+)
 
 CODE_PATTERN = re_compile(r"^\d{1,6}$")
 CLASS_PATTERN = re_compile(r"^\d+(?:\.\d+)*$")
@@ -26,6 +49,37 @@ COLUMN_NAMES = [
     "credit",
     "current_balance",
 ]
+NUMERIC_COLUMNS = ["previous_balance", "debit", "credit"]
+
+# Limites (em pontos) do layout original do sistema emissor; usados quando a
+# calibração pela primeira página não é possível
+DEFAULT_LAYOUT = {
+    "code_max_x1": 30,
+    "classification_max_center": 120,
+    "account_min_x0": 95,
+    "account_max_center": 320,
+    "numeric_bounds": [410, 460, 520],
+}
+HEADER_LABELS = {
+    "codigo": "code",
+    "classificacao": "classification",
+    "descricao da conta": "account",
+    "descricao": "account",
+    "saldo anterior": "previous_balance",
+    "debito": "debit",
+    "debitos": "debit",
+    "credito": "credit",
+    "creditos": "credit",
+    "saldo atual": "current_balance",
+}
+LAYOUT_BIN_WIDTH = 2.0
+LAYOUT_SNAP = 15.0
+FONT_SUBSET_PATTERN = re_compile(r"^[A-Z]{6}\+")
+
+_pool = None
+_pool_lock = Lock()
+
+_layouts = {}
 
 
 def clean_text(value):
@@ -36,8 +90,12 @@ def clean_text(value):
     return value or None
 
 
+@timed("header_parse")
 def parse_header(page):
-    text = page.extract_text(layout=True)
+    return parse_header_text(page.extract_text(layout=True))
+
+
+def parse_header_text(text):
     lines = [line.strip() for line in text.splitlines() if line.strip()]
 
     separator = re_compile(r"\s{2,}")
@@ -78,26 +136,226 @@ def parse_header(page):
     }
 
 
-def detect_column(word, text):
+def iter_layout_chars(layout):
+    for obj in layout:
+        if isinstance(obj, LTChar):
+            yield obj
+        elif isinstance(obj, LTContainer):
+            yield from iter_layout_chars(obj)
+
+
+def read_header(pdf_file):
+    """Lê somente a primeira página do PDF e retorna o cabeçalho estruturado.
+
+    Apenas a xref e os objetos da página 1 são resolvidos, e só os caracteres
+    acima de MIN_TOP (a faixa do cabeçalho) são convertidos para o texto em layout.
+
+    Args:
+        pdf_file: Caminho para o arquivo PDF (Path ou str) ou objeto de arquivo (file-like object).
+    """
+    with pdfplumber.open(pdf_file) as pdf:
+        page_obj = next(PDFPage.create_pages(pdf.doc), None)
+        if page_obj is None:
+            raise ValueError("PDF não contém páginas.")
+        resources = PDFResourceManager()
+        device = PDFPageAggregator(resources, laparams=None)
+        PDFPageInterpreter(resources, device).process_page(page_obj)
+        layout = device.get_result()
+
+    x0, y0, x1, y1 = layout.bbox
+    width, height = x1 - x0, y1 - y0
+    chars = []
+    for char in iter_layout_chars(layout):
+        top = y1 - char.y1
+        if top >= MIN_TOP:
+            continue
+        chars.append({
+            "text": char.get_text(),
+            "x0": char.x0 - x0,
+            "x1": char.x1 - x0,
+            "top": top,
+            "bottom": y1 - char.y0,
+            "doctop": top,
+            "upright": char.upright,
+            "fontname": char.fontname,
+            "size": char.size,
+            "matrix": char.matrix,
+        })
+    textmap = chars_to_textmap(
+        chars,
+        layout=True,
+        layout_bbox=(0, 0, width, height),
+        layout_width=width,
+        layout_height=height,
+    )
+    return parse_header_text(textmap.as_string)
+
+
+def detect_column(word, text, layout=DEFAULT_LAYOUT):
     center = (word["x0"] + word["x1"]) / 2
-    if word["x1"] <= 30 and CODE_PATTERN.fullmatch(text):
+    if word["x1"] <= layout["code_max_x1"] and CODE_PATTERN.fullmatch(text):
         return "code"
-    if center <= 120 and CLASS_PATTERN.fullmatch(text):
+    if center <= layout["classification_max_center"] and CLASS_PATTERN.fullmatch(text):
         return "classification"
-    if center <= 320 and word["x0"] >= 95:
+    if center <= layout["account_max_center"] and word["x0"] >= layout["account_min_x0"]:
         return "account"
     if NUMERIC_PATTERN.fullmatch(text):
-        if center <= 410:
-            return "previous_balance"
-        if center <= 460:
-            return "debit"
-        if center <= 520:
-            return "credit"
-        if center > 320:
+        for column, bound in zip(NUMERIC_COLUMNS, layout["numeric_bounds"]):
+            if center <= bound:
+                return column
+        if center > layout["account_max_center"]:
             return "current_balance"
     return None
 
 
+def normalize_label(text):
+    """Remove acentos, caixa e espaços extras para comparar rótulos do cabeçalho."""
+    text = normalize("NFKD", clean_text(text) or "")
+    return "".join(char for char in text if not combining(char)).lower()
+
+
+def find_header_row(words):
+    """Localiza a linha de títulos das colunas e retorna {coluna: palavra}."""
+    best = {}
+    for row in group_rows(sorted(words, key=lambda item: (item["top"], item["x0"]))):
+        found = {}
+        for word in row:
+            column = HEADER_LABELS.get(normalize_label(word["text"]))
+            if column and column not in found:
+                found[column] = word
+        if len(found) > len(best):
+            best = found
+    return best
+
+
+def numeric_clusters(words, min_x0):
+    """Agrupa as bordas direitas dos valores monetários em colunas (histograma em x).
+
+    Valores são alinhados à direita, então cada coluna numérica aparece como um pico
+    estreito no histograma de x1. Retorna [(borda direita, menor x0, quantidade)],
+    do mais frequente para o menos frequente.
+    """
+    bins = {}
+    for word in words:
+        text = word["text"].strip()
+        if word["x0"] < min_x0 or "," not in text or not NUMERIC_PATTERN.fullmatch(text):
+            continue
+        bins.setdefault(int(word["x1"] // LAYOUT_BIN_WIDTH), []).append(word)
+
+    clusters = []
+    current = []
+    last_bin = None
+    for bin_index in sorted(bins):
+        if current and bin_index - last_bin > 1:
+            clusters.append(current)
+            current = []
+        current.extend(bins[bin_index])
+        last_bin = bin_index
+    if current:
+        clusters.append(current)
+
+    summary = [
+        (max(word["x1"] for word in cluster), min(word["x0"] for word in cluster), len(cluster))
+        for cluster in clusters
+    ]
+    return sorted(summary, key=lambda item: -item[2])
+
+
+def calibrate_layout(page):
+    """Calcula os limites das colunas a partir da primeira página.
+
+    Usa a linha de títulos das colunas (Código, Classificação, Descrição da conta,
+    Saldo Anterior, Débito, Crédito, Saldo Atual) e o histograma das bordas direitas
+    dos valores. Retorna None se não houver evidência suficiente para as quatro
+    colunas numéricas.
+    """
+    words = page.extract_words(use_text_flow=True, keep_blank_chars=True)
+    header = find_header_row(words)
+    header_top = min((word["top"] for word in header.values()), default=0)
+    first_numeric = header.get("previous_balance")
+    min_x0 = header["account"]["x1"] if "account" in header else 0
+    clusters = numeric_clusters(
+        [word for word in words if word["top"] > header_top],
+        min_x0,
+    )
+
+    balance_columns = NUMERIC_COLUMNS + ["current_balance"]
+    if all(column in header for column in balance_columns):
+        edges = []
+        for column in balance_columns:
+            edge = header[column]["x1"]
+            nearby = [cluster[0] for cluster in clusters if abs(cluster[0] - edge) <= LAYOUT_SNAP]
+            edges.append(max(nearby) if nearby else edge)
+    elif len(clusters) >= 4:
+        edges = sorted(cluster[0] for cluster in clusters[:4])
+    else:
+        return None
+
+    if edges != sorted(edges):
+        return None
+
+    layout = dict(DEFAULT_LAYOUT)
+    # O centro de um valor fica à esquerda da borda da sua coluna e, para valores
+    # mais estreitos que o espaçamento, à direita do ponto médio até a anterior
+    layout["numeric_bounds"] = [
+        (edge + next_edge) / 2 for edge, next_edge in zip(edges, edges[1:])
+    ]
+    if first_numeric:
+        layout["account_max_center"] = first_numeric["x0"]
+    else:
+        first_edge = edges[0]
+        layout["account_max_center"] = min(
+            cluster[1] for cluster in clusters if cluster[0] == first_edge
+        )
+    if "classification" in header:
+        layout["code_max_x1"] = header["classification"]["x0"]
+        if "account" in header:
+            layout["account_min_x0"] = (header["classification"]["x1"] + header["account"]["x0"]) / 2
+            layout["classification_max_center"] = header["account"]["x0"]
+    return layout
+
+
+def layout_fingerprint(pdf, report_type):
+    """Identifica o sistema emissor: metadados, tamanho da página, fontes e tipo de relatório."""
+    page = pdf.pages[0]
+    fonts = sorted({FONT_SUBSET_PATTERN.sub("", char["fontname"]) for char in page.chars})
+    metadata = pdf.metadata or {}
+    parts = [
+        metadata.get("Producer"),
+        metadata.get("Creator"),
+        metadata.get("Title"),
+        round(page.width),
+        round(page.height),
+        *fonts,
+        report_type,
+    ]
+    return sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def page_layout(pdf, header):
+    """Retorna o layout das colunas do documento, calibrado uma vez por sistema emissor.
+
+    O resultado fica em memória e no namespace "layout" do parser_cache, indexado
+    pela impressão digital do emissor (layout_fingerprint). Sem calibração possível,
+    usa DEFAULT_LAYOUT.
+    """
+    fingerprint = layout_fingerprint(pdf, header.get("report_type"))
+    layout = _layouts.get(fingerprint)
+    if layout is not None:
+        return layout
+
+    key = f"{fingerprint}-{PARSER_VERSION}"
+    layout = parser_cache.get(key, namespace=LAYOUT_CACHE_NAMESPACE)
+    if layout is None:
+        layout = calibrate_layout(pdf.pages[0])
+        if layout is None:
+            return DEFAULT_LAYOUT
+        parser_cache.put(key, layout, namespace=LAYOUT_CACHE_NAMESPACE)
+
+    _layouts[fingerprint] = layout
+    return layout
+
+
 def group_rows(words):
     rows = []
     current = []
@@ -114,14 +372,14 @@ def group_rows(words):
     return rows
 
 
-def parse_row(row_words):
+def parse_row(row_words, layout=DEFAULT_LAYOUT):
     buckets = {name: [] for name in COLUMN_NAMES}
     fallback = []
     for word in sorted(row_words, key=lambda item: item["x0"]):
         text = word["text"].strip()
         if not text:
             continue
-        column = detect_column(word, text)
+        column = detect_column(word, text, layout)
         if column:
             buckets[column].append(text)
         elif not CODE_PATTERN.fullmatch(text) and not CLASS_PATTERN.fullmatch(text):
@@ -142,7 +400,8 @@ def parse_row(row_words):
     return cleaned
 
 
-def extract_rows(page):
+@timed("parse_page")
+def extract_rows(page, layout=DEFAULT_LAYOUT):
     words = [
         word
         for word in page.extract_words(use_text_flow=True, keep_blank_chars=True)
@@ -152,67 +411,348 @@ def extract_rows(page):
     rows = group_rows(words)
     parsed_rows = []
     for row_words in rows:
-        parsed = parse_row(row_words)
+        parsed = parse_row(row_words, layout)
         if parsed:
             parsed_rows.append(parsed)
     return parsed_rows
 
 
-def classification_variants(classification):
-    parts = classification.split(".")
-    if not parts:
-        return []
-    variants = {".".join(parts)}
-    last = parts[-1]
-    trimmed = last
-    while len(trimmed) > 1 and trimmed.endswith("0"):
-        trimmed = trimmed[:-1]
-        variants.add(".".join([*parts[:-1], trimmed]))
-    if trimmed != last and trimmed.lstrip("0"):
-        variants.add(".".join([*parts[:-1], trimmed.lstrip("0")]))
-    if last.lstrip("0") and last.lstrip("0") != last:
-        variants.add(".".join([*parts[:-1], last.lstrip("0")]))
+def classification_segment(segment):
+    """Converte um segmento da classificação na chave usada na árvore.
+
+    Segmentos numéricos viram int, como em converter_classification_para_tupla
+    ("01" e "1" são o mesmo nível, "10" e "1" não). Segmentos não numéricos são
+    mantidos como texto.
+    """
+    if segment.isdigit():
+        return int(segment)
+    return segment
+
+
+def segment_variants(segment):
+    """Chaves equivalentes de um segmento, tirando zeros à direita ("010" -> {10, 1}).
+
+    Os zeros à direita às vezes são só preenchimento de nível (como em "1.1.01.01" e
+    "1.1.01.010.002"), então um ancestral sem conta registrada pode ser resolvido
+    por um irmão com uma dessas variantes.
+    """
+    if not segment.isdigit():
+        return {segment}
+    variants = {int(segment)}
+    while len(segment) > 1 and segment.endswith("0"):
+        segment = segment[:-1]
+        variants.add(int(segment))
     return variants
 
 
-def attach_parents(rows):
-    lookup = {}
-    for row in rows:
+class ClassificationNode:
+    __slots__ = ("parent", "children", "segment", "account", "classification", "rows")
+
+    def __init__(self, parent=None, segment=None):
+        self.parent = parent
+        self.children = {}
+        self.segment = segment
+        self.account = None
+        self.classification = None
+        self.rows = []
+
+    def alias(self):
+        """Nó cuja conta este nó repassa aos descendentes.
+
+        É o próprio nó, se tiver conta, ou o primeiro irmão com conta cujo segmento
+        tenha uma variante em comum (ver segment_variants); None se não houver.
+        """
+        if self.account is not None:
+            return self
+        if self.parent is None or self.segment is None:
+            return None
+        variants = segment_variants(self.segment)
+        for sibling in self.parent.children.values():
+            if sibling.account is not None and segment_variants(sibling.segment) & variants:
+                return sibling
+        return None
+
+    def parent_account(self):
+        """Conta que este nó repassa aos descendentes (ver alias)."""
+        alias = self.alias()
+        return alias.account if alias is not None else None
+
+    def synthetic(self):
+        """Se o nó tem subcontas: filhos próprios ou de irmãos sem conta equivalentes."""
+        if self.children:
+            return True
+        if self.account is None or self.parent is None:
+            return False
+        return any(
+            sibling.account is None and sibling.children and sibling.alias() is self
+            for sibling in self.parent.children.values()
+        )
+
+
+class ClassificationTrie:
+    """Árvore de classificações indexada por segmentos numéricos.
+
+    Cada nó guarda a primeira conta registrada com aquela classificação e as linhas
+    do balancete que caem nele. A conta pai de uma linha é o ancestral mais próximo
+    com conta (ver ClassificationNode.parent_account). Os nós também ficam indexados
+    pela classificação original, então cada linha nova converte só o último segmento.
+    """
+
+    def __init__(self):
+        self.root = ClassificationNode()
+        self.index = {}
+
+    def node(self, classification):
+        """Retorna o nó da classificação, criando o caminho se necessário."""
+        node = self.index.get(classification)
+        if node is None:
+            prefix, _, segment = classification.rpartition(".")
+            parent = self.node(prefix) if prefix else self.root
+            key = classification_segment(segment)
+            node = parent.children.get(key)
+            if node is None:
+                node = parent.children[key] = ClassificationNode(parent, segment)
+            self.index[classification] = node
+        return node
+
+    def add(self, row):
+        """Registra a linha e, se for a primeira com essa classificação, a sua conta."""
         cls = row.get("classification")
+        if not cls:
+            return
+        node = self.node(cls)
+        node.rows.append(row)
         account = row.get("account")
-        if not cls or not account:
-            continue
-        for variant in classification_variants(cls):
-            lookup.setdefault(variant, account)
+        if account and node.account is None:
+            node.account = account
+            node.classification = cls
+
+    def find_parent(self, cls):
+        """Retorna a conta do ancestral mais próximo com conta registrada."""
+        if not cls:
+            return None
+        node = self.node(cls).parent
+        while node is not None:
+            account = node.parent_account()
+            if account is not None:
+                return account
+            node = node.parent
+        return None
+
+    def resolve_parents(self):
+        """Atribui parent_category a todas as linhas em uma única travessia da árvore."""
+        stack = [(self.root, None)]
+        while stack:
+            node, parent = stack.pop()
+            for row in node.rows:
+                row["parent_category"] = parent
+            account = node.parent_account()
+            if account is not None:
+                parent = account
+            for child in node.children.values():
+                stack.append((child, parent))
+
+    def subtree_totals(self, value):
+        """Soma os valores das linhas analíticas (nós sem filhos) de cada subárvore.
+
+        Permite conferir se o saldo de cada conta sintética bate com a soma das suas
+        analíticas.
+
+        Args:
+            value: Função que recebe uma linha e retorna o valor numérico a somar
+
+        Returns:
+            Dict classificação -> total, para cada nó com conta registrada
+        """
+        totals = {}
+        sums = {}
+        stack = [(self.root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+                continue
+            if not node.children:
+                sums[id(node)] = sum(value(row) for row in node.rows)
+            else:
+                # Filhos sem conta (ex: "1.1.01.010") pertencem ao irmão equivalente
+                # ("1.1.01.01"); se esse irmão for folha, a linha dele é a sintética
+                # e não entra na soma do pai
+                agrupados = {}
+                for child in node.children.values():
+                    alias = child.alias() if child.account is None else None
+                    if alias is not None:
+                        agrupados.setdefault(id(alias), [alias, 0])[1] += sums[id(child)]
+                sums[id(node)] = sum(
+                    sums[id(child)] for child in node.children.values()
+                    if child.children or id(child) not in agrupados
+                )
+                for alias, soma in agrupados.values():
+                    totals[alias.classification] = soma + (sums[id(alias)] if alias.children else 0)
+            if node.classification is not None:
+                totals[node.classification] = sums[id(node)]
+        return totals
+
+
+def build_classification_trie(rows):
+    """Monta a árvore de classificações em uma única passada pelas linhas."""
+    trie = ClassificationTrie()
     for row in rows:
-        cls = row.get("classification")
-        parent = None
-        if cls:
-            parts = cls.split(".")
-            while len(parts) > 1 and not parent:
-                parts = parts[:-1]
-                for variant in classification_variants(".".join(parts)):
-                    if variant in lookup:
-                        parent = lookup[variant]
-                        break
-        row["parent_category"] = parent
-
-
-def extract_data(pdf_file):
+        trie.add(row)
+    return trie
+
+
+def attach_parents(rows):
+    trie = build_classification_trie(rows)
+    for row in rows:
+        if not row.get("classification"):
+            row["parent_category"] = None
+    trie.resolve_parents()
+    return trie
+
+
+def read_pdf_bytes(pdf_file):
+    """Lê o conteúdo bruto do PDF a partir de um caminho ou objeto de arquivo."""
+    if isinstance(pdf_file, (str, Path)):
+        return Path(pdf_file).read_bytes()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def extract_page_range(pdf_bytes, start, end, layout=DEFAULT_LAYOUT):
+    """Abre o PDF no processo worker e extrai as linhas das páginas [start, end)."""
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        rows = []
+        for page in pdf.pages[start:end]:
+            rows.extend(extract_rows(page, layout))
+            page.close()
+    return rows
+
+
+def _init_pool_worker():
+    # O processo já é um worker do pool; um parse feito dentro dele (ex: arquivo
+    # de um lote) segue o caminho serial em vez de abrir outro pool
+    global PARSER_WORKERS
+    PARSER_WORKERS = 1
+
+
+def process_pool(discard=None):
+    """Retorna o pool de processos do parser, compartilhado por todo o processo.
+
+    O pool é criado uma vez, com PARSER_WORKERS processos, e atende tanto as
+    faixas de páginas de extract_rows_parallel quanto os arquivos dos lotes do
+    pipeline; chamadas simultâneas entram na mesma fila em vez de abrirem um
+    pool cada. Os processos usam PARSER_MP_CONTEXT (forkserver ou spawn) em vez
+    de fork: o processo da API tem threads (workers da fila, verificador de
+    agentes, listener do log) e um fork copiaria locks que elas podem estar
+    segurando.
+
+    Args:
+        discard: Pool quebrado (BrokenProcessPool) a ser substituído
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is discard:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, PARSER_WORKERS),
+                mp_context=get_context(PARSER_MP_CONTEXT),
+                initializer=_init_pool_worker,
+            )
+        return _pool
+
+
+def submit(function, *args):
+    """Envia uma tarefa ao pool compartilhado, recriando-o se algum processo tiver morrido."""
+    pool = process_pool()
+    try:
+        return pool.submit(function, *args)
+    except BrokenProcessPool:
+        return process_pool(discard=pool).submit(function, *args)
+
+
+def extract_rows_parallel(pdf_bytes, total_pages, workers, layout=DEFAULT_LAYOUT):
+    """Distribui faixas de páginas pelo pool compartilhado e junta o resultado na ordem das páginas."""
+    chunk_size = -(-total_pages // workers)
+    starts = range(0, total_pages, chunk_size)
+    ends = [min(start + chunk_size, total_pages) for start in starts]
+    futures = [submit(extract_page_range, pdf_bytes, start, end, layout) for start, end in zip(starts, ends)]
+    data_rows = []
+    for future in futures:
+        data_rows.extend(future.result())
+    return data_rows
+
+
+@timed("extract")
+def extract_data(pdf_file, workers=None):
     """Extrai dados do PDF e retorna como dicionário.
+
+    Documentos com pelo menos PARALLEL_MIN_PAGES páginas são divididos em faixas
+    processadas em paralelo no pool compartilhado (process_pool); documentos
+    menores seguem o caminho serial.
     
     Args:
         pdf_file: Caminho para o arquivo PDF (Path ou str) ou objeto de arquivo (file-like object).
+        workers: Quantidade de faixas de páginas (padrão: PARSER_WORKERS).
     """
+    workers = PARSER_WORKERS if workers is None else workers
     with pdfplumber.open(pdf_file) as pdf:
         header = parse_header(pdf.pages[0])
+        layout = page_layout(pdf, header)
+        total_pages = len(pdf.pages)
+        parallel = workers > 1 and total_pages >= PARALLEL_MIN_PAGES
         data_rows = []
-        for page in pdf.pages:
-            data_rows.extend(extract_rows(page))
+        if not parallel:
+            for page in pdf.pages:
+                data_rows.extend(extract_rows(page, layout))
+                page.close()
+    if parallel:
+        data_rows = extract_rows_parallel(read_pdf_bytes(pdf_file), total_pages, workers, layout)
     attach_parents(data_rows)
     return {"header": header, "data": data_rows}
 
 
+def iter_rows(pdf_file):
+    """Gera as linhas do balancete página a página, sem materializar a lista completa.
+
+    O cache de layout de cada página é descartado assim que suas linhas são lidas e
+    o parent_category é atribuído de forma incremental, consultando apenas as contas
+    já vistas (no balancete a conta sintética precede as suas analíticas).
+
+    Args:
+        pdf_file: Caminho para o arquivo PDF (Path ou str) ou objeto de arquivo (file-like object).
+    """
+    trie = ClassificationTrie()
+    with pdfplumber.open(pdf_file) as pdf:
+        layout = page_layout(pdf, parse_header(pdf.pages[0]))
+        for page in pdf.pages:
+            rows = extract_rows(page, layout)
+            page.close()
+            for row in rows:
+                row["parent_category"] = trie.find_parent(row.get("classification"))
+                trie.add(row)
+                yield row
+
+
+def cached_extract_data(pdf_file):
+    """Extrai os dados do PDF reaproveitando o cache indexado pelo hash do conteúdo.
+
+    Args:
+        pdf_file: Caminho para o arquivo PDF (Path ou str) ou objeto de arquivo (file-like object).
+    """
+    pdf_bytes = read_pdf_bytes(pdf_file)
+    key = parser_cache.make_key(pdf_bytes, PARSER_VERSION)
+    payload = parser_cache.get(key)
+    if payload is None:
+        payload = extract_data(BytesIO(pdf_bytes))
+        if payload.get("data"):
+            parser_cache.put(key, payload)
+    return payload
+
+
 def parse_pdf_to_json(pdf_file):
     """
     Função principal que processa o PDF e retorna JSON com os dados ou erro.
@@ -239,7 +779,7 @@ def parse_pdf_to_json(pdf_file):
         #             "error": f"Arquivo deve ser um PDF: {file_path}"
         #         }
         
-        payload = extract_data(pdf_file)
+        payload = cached_extract_data(pdf_file)
         
         if not payload.get("data"):
             return {
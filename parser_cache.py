@@ -0,0 +1,185 @@
+"""
+Cache persistente em disco para o resultado do parser de balancetes.
+
+As entradas são indexadas pelo SHA-256 do conteúdo do PDF combinado com a
+versão do parser e armazenam o payload {"header", "data"}. O tamanho total do
+diretório é limitado e as entradas menos usadas recentemente são removidas
+primeiro (o mtime do arquivo registra o último acesso).
+
+Outros dados do parser (ex: layouts calibrados) usam um namespace próprio: um
+subdiretório de CACHE_DIR com contadores separados, para não afetar a taxa de
+acerto do cache de resultados.
+"""
+
+from json import dump, load, JSONDecodeError
+from tempfile import NamedTemporaryFile
+from logging_setup import get_logger
+from dotenv import load_dotenv
+from threading import Lock
+from hashlib import sha256
+from pathlib import Path
+from os import getenv
+import os
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+CACHE_DIR = Path(getenv("PARSER_CACHE_DIR", "cache/parser")).expanduser()
+CACHE_MAX_BYTES = int(getenv("PARSER_CACHE_MAX_BYTES", 100_000_000))
+CACHE_ENABLED = getenv("PARSER_CACHE_ENABLED", "True").lower() == "true"
+
+NAMESPACE_PADRAO = "parser"
+CONTADORES = ("hits", "misses", "stores", "evictions")
+
+_lock = Lock()
+# namespace -> contadores
+_stats = {}
+
+
+def make_key(pdf_bytes, version):
+    """
+    Gera a chave do cache para o conteúdo do PDF.
+
+    Args:
+        pdf_bytes: Conteúdo bruto do PDF
+        version: Versão do parser que produziu o resultado
+
+    Returns:
+        str: Chave no formato "<sha256>-<versão>"
+    """
+    return f"{sha256(pdf_bytes).hexdigest()}-{version}"
+
+
+def _dir(namespace):
+    return CACHE_DIR if namespace == NAMESPACE_PADRAO else CACHE_DIR / namespace
+
+
+def _entry_path(key, namespace=NAMESPACE_PADRAO):
+    return _dir(namespace) / f"{key}.json"
+
+
+def _count(stat, namespace=NAMESPACE_PADRAO):
+    with _lock:
+        contadores = _stats.setdefault(namespace, dict.fromkeys(CONTADORES, 0))
+        contadores[stat] += 1
+
+
+def get(key, namespace=NAMESPACE_PADRAO):
+    """
+    Busca um payload no cache e marca a entrada como usada recentemente.
+
+    Args:
+        key: Chave da entrada
+        namespace: Namespace do cache (padrão: resultados do parser)
+
+    Returns:
+        dict | None: Payload armazenado ou None se não houver entrada válida
+    """
+    if not CACHE_ENABLED:
+        return None
+
+    path = _entry_path(key, namespace)
+    try:
+        with path.open("r", encoding="utf-8") as arquivo:
+            payload = load(arquivo)
+        os.utime(path)
+    except (OSError, JSONDecodeError):
+        _count("misses", namespace)
+        return None
+
+    _count("hits", namespace)
+    return payload
+
+
+def put(key, payload, namespace=NAMESPACE_PADRAO):
+    """
+    Grava o payload no cache de forma atômica e aplica o limite de tamanho.
+    """
+    if not CACHE_ENABLED:
+        return
+
+    diretorio = _dir(namespace)
+    try:
+        diretorio.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(
+            "w", encoding="utf-8", dir=diretorio, suffix=".tmp", delete=False
+        ) as temp_file:
+            dump(payload, temp_file, ensure_ascii=False)
+        os.replace(temp_file.name, _entry_path(key, namespace))
+    except OSError as e:
+        logger.error("Erro ao gravar cache do parser: %s", e)
+        return
+
+    _count("stores", namespace)
+    evict(namespace=namespace)
+
+
+def evict(max_bytes=None, namespace=NAMESPACE_PADRAO):
+    """
+    Remove as entradas menos usadas recentemente até o cache caber em max_bytes.
+
+    Args:
+        max_bytes: Tamanho máximo do namespace em bytes (padrão: CACHE_MAX_BYTES)
+        namespace: Namespace do cache (padrão: resultados do parser)
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    for _ in range(evict_dir(_dir(namespace), max_bytes)):
+        _count("evictions", namespace)
+
+
+def evict_dir(diretorio, max_bytes):
+    """
+    Remove os *.json menos usados recentemente (menor mtime) até o diretório caber em max_bytes.
+
+    Args:
+        diretorio: Diretório com as entradas
+        max_bytes: Tamanho máximo em bytes
+
+    Returns:
+        int: Quantidade de arquivos removidos
+    """
+    entries = []
+    for path in diretorio.glob("*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removidos = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removidos += 1
+    return removidos
+
+
+def clear(namespace=NAMESPACE_PADRAO):
+    """Remove todas as entradas do namespace."""
+    for path in _dir(namespace).glob("*.json"):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def stats(namespace=NAMESPACE_PADRAO):
+    """
+    Retorna os contadores do namespace neste processo.
+
+    Returns:
+        dict: hits, misses, stores, evictions e a taxa de acerto
+    """
+    with _lock:
+        snapshot = dict(_stats.get(namespace) or dict.fromkeys(CONTADORES, 0))
+    consultas = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_ratio"] = snapshot["hits"] / consultas if consultas else 0.0
+    return snapshot
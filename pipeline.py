@@ -0,0 +1,400 @@
+"""
+Pipeline de processamento de balancetes: parser, cruzamento com o catálogo e
+atualização do status do arquivo.
+"""
+
+from cronjob import cross_references, update_conta_arquivo_status, get_analytical_catalog
+from parser import main as parser_main, build_classification_trie
+from zipfile import ZipFile, BadZipFile, ZIP_STORED
+from cronjob import valores_para_centavos
+from logging_setup import get_logger
+from jobs import register_handler
+from initial import start_agent
+from db import pinned_connection, transaction
+from os import getenv, cpu_count
+from dotenv import load_dotenv
+from threading import Thread
+from queue import Queue, Empty
+from pathlib import PurePath
+from io import BytesIO
+import parser
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+LOTE_WORKERS = int(getenv("LOTE_WORKERS", min(4, cpu_count() or 1)))
+ROTEAMENTO_LOCAL = getenv("ROTEAMENTO_LOCAL", "True").lower() == "true"
+ROTEAMENTO_LIMIAR = float(getenv("ROTEAMENTO_LIMIAR", 0.9))
+ROTEAMENTO_MIN_LINHAS = int(getenv("ROTEAMENTO_MIN_LINHAS", 10))
+
+PESOS_CONFIANCA = {
+    'linhas': 0.2,
+    'conciliacao': 0.3,
+    'rollup': 0.3,
+    'cobertura_pais': 0.2,
+}
+
+class ParserSemDadosError(ValueError):
+    """O parser não extraiu dados do PDF."""
+
+
+def gravar_balancete(parser_response, arquivo_id, progresso=None, catalogo=None):
+    """
+    Cruza os dados do parser com o catálogo, grava as contas e atualiza o status do arquivo.
+
+    Args:
+        parser_response: Retorno do parser ({"header": {...}, "data": [...]})
+        arquivo_id: ID do registro em conta_arquivos
+        progresso: Função opcional chamada com o nome de cada etapa
+        catalogo: Catálogo de contas analíticas já carregado (padrão: cache do processo)
+
+    Returns:
+        dict | None: Resumo do processamento ou None se nenhum dado foi processado
+    """
+    progresso = progresso or (lambda etapa: None)
+
+    progresso('cruzamento')
+    # As contas e o status entram juntos: se o status falhar, a gravação é desfeita
+    # e um novo processamento (ex: próximo ciclo do agent_poller) não duplica as contas
+    with transaction():
+        processed_data = cross_references(parser_response, arquivo_id, catalogo)
+        if not processed_data:
+            return None
+
+        progresso('status')
+        update_conta_arquivo_status(arquivo_id)
+
+    return {
+        'arquivo_id': arquivo_id,
+        'contas_aprovadas': len(processed_data['accounts_approved']),
+        'contas_rejeitadas': len(processed_data['accounts_rejected']),
+    }
+
+
+def processar_balancete(pdf_file, arquivo_id, progresso=None, catalogo=None):
+    """
+    Executa o processamento completo de um balancete.
+
+    Args:
+        pdf_file: Caminho ou objeto de arquivo do PDF
+        arquivo_id: ID do registro em conta_arquivos
+        progresso: Função opcional chamada com o nome de cada etapa
+        catalogo: Catálogo de contas analíticas já carregado (padrão: cache do processo)
+
+    Returns:
+        dict | None: Resumo do processamento ou None se nenhum dado foi processado
+
+    Raises:
+        ParserSemDadosError: Se o parser não extrair dados do PDF
+    """
+    progresso = progresso or (lambda etapa: None)
+
+    progresso('parser')
+    parser_response = parser_main(pdf_file)
+    if parser_response is None:
+        raise ParserSemDadosError("Nenhum dado foi obtido do parser")
+
+    return gravar_balancete(parser_response, arquivo_id, progresso, catalogo)
+
+
+def avaliar_confianca(parser_response):
+    """
+    Mede o quanto o resultado do parser local é confiável.
+
+    Critérios (cada um entre 0 e 1):
+        linhas: fração das linhas com classificação e descrição
+        conciliacao: fração das contas em que saldo anterior, débito e crédito
+            fecham o saldo atual (em módulo, já que o sinal depende da natureza)
+        rollup: fração das contas sintéticas cujos débitos e créditos batem com a
+            soma das analíticas abaixo delas
+        cobertura_pais: fração das contas de nível 2 ou mais com conta pai encontrada
+
+    Critérios sem dados para avaliar (ex: plano sem contas sintéticas) ficam de fora
+    da média ponderada. Com menos de ROTEAMENTO_MIN_LINHAS contas o score é 0.
+
+    Args:
+        parser_response: Retorno do parser ({"header": {...}, "data": [...]})
+
+    Returns:
+        dict: 'score' (média ponderada) e o valor de cada critério
+    """
+    linhas = parser_response.get('data') or []
+    contas = [linha for linha in linhas if linha.get('classification') and linha.get('account')]
+    criterios = {'linhas': len(contas) / len(linhas) if linhas else 0.0}
+
+    if contas:
+        centavos = {
+            coluna: valores_para_centavos([conta.get(coluna) for conta in contas])[0]
+            for coluna in ('previous_balance', 'debit', 'credit', 'current_balance')
+        }
+        anterior, debito, credito, atual = centavos.values()
+        fecha = (abs(anterior + debito - credito) == abs(atual)) | (abs(anterior - debito + credito) == abs(atual))
+        criterios['conciliacao'] = float(fecha.mean())
+
+        trie = build_classification_trie(contas)
+        # O índice guarda cada grafia da classificação (ex: 3.3.01.06 e
+        # 3.3.01.006), então os nós são deduplicados pela classificação registrada
+        sinteticas = {
+            node.classification: node for node in trie.index.values()
+            if node.rows and node.synthetic()
+        }
+        if sinteticas:
+            batem = set(sinteticas)
+            for coluna in ('debit', 'credit'):
+                valores = dict(zip(map(id, contas), centavos[coluna].tolist()))
+                totais = trie.subtree_totals(lambda conta: valores[id(conta)])
+                batem = {
+                    classificacao for classificacao in batem
+                    if totais[classificacao] == valores[id(sinteticas[classificacao].rows[0])]
+                }
+            criterios['rollup'] = len(batem) / len(sinteticas)
+
+        filhas = [conta for conta in contas if '.' in conta['classification']]
+        if filhas:
+            criterios['cobertura_pais'] = sum(1 for conta in filhas if conta.get('parent_category')) / len(filhas)
+
+    if len(contas) < ROTEAMENTO_MIN_LINHAS:
+        score = 0.0
+    else:
+        peso_total = sum(PESOS_CONFIANCA[criterio] for criterio in criterios)
+        score = sum(PESOS_CONFIANCA[criterio] * valor for criterio, valor in criterios.items()) / peso_total
+
+    return {'score': round(score, 4), 'contas': len(contas), **{criterio: round(valor, 4) for criterio, valor in criterios.items()}}
+
+
+def rotear_balancete(pdf_file, user_id, file_id, progresso=None):
+    """
+    Processa o balancete com o parser local e só aciona o agente do Cursor quando o
+    resultado não é confiável.
+
+    O parser local leva segundos e o agente, minutos. Se o score de
+    avaliar_confianca atingir ROTEAMENTO_LIMIAR, os dados locais são gravados
+    direto (gravar_balancete) e nenhum agente é criado.
+
+    Args:
+        pdf_file: PDF enviado para este file_id (caminho ou objeto de arquivo); se
+            None, o balancete vai direto para o agente
+        user_id: ID do usuário dono do agente
+        file_id: ID do registro em conta_arquivos
+        progresso: Função opcional chamada com o nome de cada etapa
+
+    Returns:
+        dict: {'rota': 'local' ou 'agente', 'motivo', 'confianca', 'resumo'}
+    """
+    progresso = progresso or (lambda etapa: None)
+    decisao = {'rota': 'agente', 'motivo': None, 'confianca': None, 'resumo': None}
+
+    if not ROTEAMENTO_LOCAL:
+        decisao['motivo'] = 'roteamento_local_desativado'
+    elif pdf_file is None:
+        decisao['motivo'] = 'pdf_indisponivel'
+    else:
+        progresso('parser')
+        parser_response = parser_main(pdf_file)
+        if parser_response is None:
+            decisao['motivo'] = 'parser_sem_dados'
+        else:
+            decisao['confianca'] = avaliar_confianca(parser_response)
+            if decisao['confianca']['score'] >= ROTEAMENTO_LIMIAR:
+                decisao['resumo'] = gravar_balancete(parser_response, file_id, progresso)
+                decisao.update(rota='local', motivo='confianca_suficiente')
+            else:
+                decisao['motivo'] = 'confianca_baixa'
+
+    confianca = decisao['confianca'] or {}
+    logger.info(
+        "Roteamento do balancete | rota=%s | motivo=%s | score=%s | criterios=%s | user_id=%s | file_id=%s",
+        decisao['rota'],
+        decisao['motivo'],
+        confianca.get('score'),
+        {criterio: valor for criterio, valor in confianca.items() if criterio != 'score'},
+        user_id,
+        file_id,
+    )
+    if decisao['rota'] == 'agente':
+        start_agent(user_id, file_id)
+    return decisao
+
+
+def job_processar(payload, arquivo, progresso):
+    """Handler da fila para jobs do tipo 'processar'."""
+    return processar_balancete(arquivo, payload.get('arquivo_id'), progresso)
+
+
+def job_rotear(payload, arquivo, progresso):
+    """Handler da fila para jobs do tipo 'rotear' (ver /run-agent)."""
+    return rotear_balancete(arquivo, payload.get('user_id'), payload.get('file_id'), progresso)
+
+
+register_handler('processar', job_processar)
+register_handler('rotear', job_rotear)
+
+
+def ler_zip(conteudo):
+    """
+    Lista os PDFs de um arquivo zip.
+
+    Args:
+        conteudo: Bytes do arquivo zip
+
+    Returns:
+        list: Tuplas (nome, bytes) de cada PDF, ignorando diretórios e outros arquivos
+
+    Raises:
+        ValueError: Se o conteúdo não for um zip válido
+    """
+    try:
+        with ZipFile(BytesIO(conteudo)) as arquivo_zip:
+            return [
+                (PurePath(info.filename).name, arquivo_zip.read(info))
+                for info in arquivo_zip.infolist()
+                if not info.is_dir() and info.filename.lower().endswith('.pdf')
+            ]
+    except BadZipFile as e:
+        raise ValueError(f"Arquivo zip inválido: {e}")
+
+
+def _parse_conteudo(conteudo):
+    return parser_main(BytesIO(conteudo))
+
+
+def _submeter_parses(arquivos):
+    return [
+        parser.submit(_parse_conteudo, arquivo['conteudo']) if arquivo['arquivo_id'] else None
+        for arquivo in arquivos
+    ]
+
+
+def _processar_item(arquivo, parse_future, catalogo):
+    resultado = {'arquivo': arquivo['nome'], 'arquivo_id': arquivo['arquivo_id']}
+    try:
+        if not arquivo['arquivo_id']:
+            raise ValueError("arquivo_id não informado")
+
+        parser_response = parse_future.result()
+        if parser_response is None:
+            raise ParserSemDadosError("Nenhum dado foi obtido do parser")
+
+        resumo = gravar_balancete(parser_response, arquivo['arquivo_id'], catalogo=catalogo)
+    except Exception as e:
+        logger.exception("Erro ao processar %s do lote: %s", arquivo['nome'], e)
+        resultado.update({'status': 'error', 'erro': str(e)})
+        return resultado
+
+    if resumo is None:
+        resultado['status'] = 'empty'
+    else:
+        resultado.update(resumo, status='success')
+    return resultado
+
+
+def processar_lote(arquivos, workers=None):
+    """
+    Processa vários balancetes em paralelo.
+
+    O parser roda no pool de processos compartilhado (ver parser.process_pool), já
+    que é limitado por CPU. O cruzamento e a gravação rodam em `workers` threads, cada
+    uma com uma única conexão do pool fixada durante todo o lote, e todas usam o
+    mesmo catálogo, carregado uma vez.
+
+    Args:
+        arquivos: Lista de dicts {'nome', 'arquivo_id', 'conteudo'} (conteúdo em bytes)
+        workers: Número de threads de gravação (padrão: LOTE_WORKERS)
+
+    Returns:
+        list: Resultado de cada arquivo, na ordem de entrada, com 'status'
+        ('success', 'empty' ou 'error') e o resumo ou a mensagem de erro
+    """
+    if not arquivos:
+        return []
+
+    workers = max(1, min(workers or LOTE_WORKERS, len(arquivos)))
+    catalogo = get_analytical_catalog()
+    resultados = [None] * len(arquivos)
+
+    fila = Queue()
+    for indice in range(len(arquivos)):
+        fila.put(indice)
+
+    # Todos os PDFs entram no pool de uma vez, assim o parse dos próximos
+    # arquivos avança enquanto as threads gravam os anteriores
+    futures = _submeter_parses(arquivos)
+
+    def worker():
+        try:
+            with pinned_connection():
+                while True:
+                    try:
+                        indice = fila.get_nowait()
+                    except Empty:
+                        return
+                    resultados[indice] = _processar_item(arquivos[indice], futures[indice], catalogo)
+        except Exception as e:
+            logger.exception("Erro no worker do lote: %s", e)
+
+    threads = [Thread(target=worker, name=f"lote-worker-{numero}") for numero in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for indice, arquivo in enumerate(arquivos):
+        if resultados[indice] is None:
+            if futures[indice] is not None:
+                futures[indice].cancel()
+            resultados[indice] = {
+                'arquivo': arquivo['nome'],
+                'arquivo_id': arquivo['arquivo_id'],
+                'status': 'error',
+                'erro': 'Arquivo não processado (sem conexão com o banco)',
+            }
+    return resultados
+
+
+def resumir_lote(resultados):
+    """Totaliza o resultado de processar_lote no formato devolvido pelo /processar-lote."""
+    falhas = sum(1 for resultado in resultados if resultado['status'] == 'error')
+    return {
+        "status": "success" if not falhas else ("error" if falhas == len(resultados) else "partial"),
+        "processados": len(resultados) - falhas,
+        "falhas": falhas,
+        "resultados": resultados,
+    }
+
+
+def empacotar_lote(arquivos):
+    """
+    Prepara um lote para a fila de jobs: o payload com nomes e IDs e um zip com os PDFs.
+
+    Os PDFs entram no zip pela posição no lote, já que os nomes podem se repetir.
+
+    Returns:
+        tuple: (payload, bytes do zip)
+    """
+    buffer = BytesIO()
+    with ZipFile(buffer, 'w', compression=ZIP_STORED) as arquivo_zip:
+        for indice, arquivo in enumerate(arquivos):
+            arquivo_zip.writestr(f"{indice:05d}.pdf", arquivo['conteudo'])
+    payload = {
+        'arquivos': [
+            {'nome': arquivo['nome'], 'arquivo_id': arquivo['arquivo_id']}
+            for arquivo in arquivos
+        ]
+    }
+    return payload, buffer.getvalue()
+
+
+def job_processar_lote(payload, arquivo, progresso):
+    """Handler da fila para jobs do tipo 'processar_lote' (ver empacotar_lote)."""
+    progresso('parser')
+    conteudos = dict(ler_zip(arquivo.read()))
+    arquivos = [
+        dict(item, conteudo=conteudos[f"{indice:05d}.pdf"])
+        for indice, item in enumerate(payload.get('arquivos') or [])
+    ]
+    return resumir_lote(processar_lote(arquivos))
+
+
+register_handler('processar_lote', job_processar_lote)
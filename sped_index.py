@@ -0,0 +1,205 @@
+"""
+Índice de offsets por registro para arquivos SPED.
+
+Uma única leitura do arquivo registra o offset em bytes de cada linha, agrupado
+por registro (0000, 0150, C100, C170, M210, 9900, ...), junto com os totais
+declarados nos registros 9900 e 9999. O índice é gravado em um arquivo auxiliar
+nomeado pelo SHA-256 do conteúdo, de modo que consultas posteriores ao mesmo
+arquivo viram leituras diretas nos offsets em vez de varreduras completas.
+
+O diretório dos índices é limitado a SPED_INDEX_MAX_BYTES; os índices menos usados
+recentemente (mtime) são removidos primeiro, como no parser_cache.
+"""
+
+from speds import open_sped, iter_registros, campos_registro, campos_no_offset
+from bisect import bisect_left, bisect_right
+from json import dump, load, JSONDecodeError
+from tempfile import NamedTemporaryFile
+from logging_setup import get_logger
+from parser_cache import evict_dir
+from dotenv import load_dotenv
+from hashlib import sha256
+from pathlib import Path
+from os import getenv
+import os
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+INDEX_VERSION = 1
+INDEX_DIR = Path(getenv("SPED_INDEX_DIR", "cache/sped")).expanduser()
+INDEX_MAX_BYTES = int(getenv("SPED_INDEX_MAX_BYTES", 50_000_000))
+
+
+def build_index(dados, sha=None):
+    """
+    Monta o índice a partir do conteúdo mapeado do SPED.
+
+    Args:
+        dados: Conteúdo do arquivo (mmap ou bytes)
+        sha: SHA-256 do conteúdo, se já calculado (evita ler o arquivo de novo)
+
+    Returns:
+        dict: Índice com offsets por registro e totais declarados em 9900/9999
+    """
+    offsets = {}
+    totais_9900 = {}
+    total_9999 = None
+    linhas = 0
+
+    for offset, registro, linha in iter_registros(dados):
+        offsets.setdefault(registro, []).append(offset)
+        linhas += 1
+
+        if registro == '9900':
+            campos = campos_registro(linha)
+            totais_9900[campos[0]] = int(campos[1])
+        elif registro == '9999':
+            total_9999 = int(campos_registro(linha)[0])
+
+    return {
+        'versao': INDEX_VERSION,
+        'sha256': sha or sha256(dados).hexdigest(),
+        'linhas': linhas,
+        'contagens': {registro: len(lista) for registro, lista in offsets.items()},
+        'offsets': offsets,
+        'totais_9900': totais_9900,
+        'total_9999': total_9999,
+    }
+
+
+def _index_path(sha):
+    return INDEX_DIR / f"{sha}.json"
+
+
+def _save_index(indice):
+    try:
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(
+            "w", encoding="utf-8", dir=INDEX_DIR, suffix=".tmp", delete=False
+        ) as temp_file:
+            dump(indice, temp_file)
+        os.replace(temp_file.name, _index_path(indice['sha256']))
+    except OSError as e:
+        logger.error("Erro ao gravar índice do SPED: %s", e)
+        return
+
+    evict_dir(INDEX_DIR, INDEX_MAX_BYTES)
+
+
+def load_index(sped_file):
+    """
+    Retorna o índice do arquivo SPED, reaproveitando o arquivo auxiliar se existir.
+
+    Args:
+        sped_file: Caminho para o arquivo SPED
+
+    Returns:
+        dict: Índice do arquivo (ver build_index)
+    """
+    with open_sped(sped_file) as dados:
+        sha = sha256(dados).hexdigest()
+        path = _index_path(sha)
+        try:
+            with path.open("r", encoding="utf-8") as arquivo:
+                indice = load(arquivo)
+            if indice.get('versao') == INDEX_VERSION:
+                os.utime(path)
+                return indice
+        except (OSError, JSONDecodeError):
+            pass
+
+        indice = build_index(dados, sha)
+
+    _save_index(indice)
+    return indice
+
+
+def read_records(sped_file, indice, registro, offsets=None):
+    """
+    Lê as linhas de um registro a partir dos offsets do índice.
+
+    Args:
+        sped_file: Caminho para o arquivo SPED
+        indice: Índice retornado por load_index
+        registro: Registro desejado (ex: 'M210')
+        offsets: Subconjunto de offsets a ler (padrão: todas as ocorrências)
+
+    Yields:
+        Tupla (offset, campos) para cada ocorrência do registro
+    """
+    if offsets is None:
+        offsets = indice['offsets'].get(registro, [])
+
+    with open_sped(sped_file) as dados:
+        for offset in offsets:
+            yield offset, campos_no_offset(dados, offset)
+
+
+def child_offsets(indice, registro_pai, offset_pai, registro_filho):
+    """
+    Retorna os offsets dos registros filhos de uma ocorrência do registro pai.
+
+    Os filhos de um registro (ex: C170 de um C100) ficam entre ele e a próxima
+    ocorrência do mesmo registro pai.
+
+    Args:
+        indice: Índice retornado por load_index
+        registro_pai: Registro pai (ex: 'C100')
+        offset_pai: Offset da ocorrência do registro pai
+        registro_filho: Registro filho (ex: 'C170')
+
+    Returns:
+        list: Offsets dos filhos, em ordem de arquivo
+    """
+    pais = indice['offsets'].get(registro_pai, [])
+    filhos = indice['offsets'].get(registro_filho, [])
+
+    proximo = bisect_right(pais, offset_pai)
+    inicio = bisect_right(filhos, offset_pai)
+    fim = bisect_left(filhos, pais[proximo]) if proximo < len(pais) else len(filhos)
+    return filhos[inicio:fim]
+
+
+def read_children(sped_file, indice, registro_pai, offset_pai, registro_filho):
+    """Lê os registros filhos de uma ocorrência do registro pai (ex: C170 de um C100)."""
+    offsets = child_offsets(indice, registro_pai, offset_pai, registro_filho)
+    return read_records(sped_file, indice, registro_filho, offsets)
+
+
+def validate_totals(indice):
+    """
+    Compara as contagens do índice com os totais declarados nos registros 9900 e 9999.
+
+    Um arquivo truncado perde o bloco 9 ou parte dos registros, o que aparece aqui
+    como divergência.
+
+    Returns:
+        list: Divergências no formato {'registro', 'esperado', 'encontrado'}
+    """
+    divergencias = []
+    contagens = indice['contagens']
+
+    if indice['total_9999'] is None:
+        return [{'registro': '9999', 'esperado': 1, 'encontrado': 0}]
+
+    if indice['total_9999'] != indice['linhas']:
+        divergencias.append({
+            'registro': '9999',
+            'esperado': indice['total_9999'],
+            'encontrado': indice['linhas'],
+        })
+
+    for registro in sorted(set(indice['totais_9900']) | set(contagens)):
+        esperado = indice['totais_9900'].get(registro, 0)
+        encontrado = contagens.get(registro, 0)
+        if esperado != encontrado:
+            divergencias.append({
+                'registro': registro,
+                'esperado': esperado,
+                'encontrado': encontrado,
+            })
+
+    return divergencias
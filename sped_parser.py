@@ -0,0 +1,274 @@
+"""
+Parser hierárquico da EFD-Contribuições com saída colunar.
+
+Cada registro suportado vira uma tabela de colunas NumPy tipadas: valores
+monetários em centavos (int64), alíquotas e quantidades em float64, datas em
+datetime64[D] e os demais campos como texto. Registros filhos guardam, na coluna
+`pai`, o índice da linha do registro pai (C100→C170, D200→D201/D205, A100→A170,
+M200→M210, M600→M610), o que permite agregações vetorizadas por documento.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from speds import scan_sped
+import numpy as np
+
+
+TEXTO = 'texto'
+VALOR = 'valor'
+DECIMAL = 'decimal'
+DATA = 'data'
+INTEIRO = 'inteiro'
+
+LEIAUTES = {
+    '0000': (
+        ('COD_VER', TEXTO), ('TIPO_ESCRIT', TEXTO), ('IND_SIT_ESP', TEXTO),
+        ('NUM_REC_ANTERIOR', TEXTO), ('DT_INI', DATA), ('DT_FIN', DATA),
+        ('NOME', TEXTO), ('CNPJ', TEXTO), ('UF', TEXTO), ('COD_MUN', TEXTO),
+        ('SUFRAMA', TEXTO), ('IND_NAT_PJ', TEXTO), ('IND_ATIV', TEXTO),
+    ),
+    'A100': (
+        ('IND_OPER', TEXTO), ('IND_EMIT', TEXTO), ('COD_PART', TEXTO),
+        ('COD_SIT', TEXTO), ('SER', TEXTO), ('SUB', TEXTO), ('NUM_DOC', TEXTO),
+        ('CHV_NFSE', TEXTO), ('DT_DOC', DATA), ('DT_EXE_SERV', DATA),
+        ('VL_DOC', VALOR), ('IND_PGTO', TEXTO), ('VL_DESC', VALOR),
+        ('VL_BC_PIS', VALOR), ('VL_PIS', VALOR), ('VL_BC_COFINS', VALOR),
+        ('VL_COFINS', VALOR), ('VL_PIS_RET', VALOR), ('VL_COFINS_RET', VALOR),
+        ('VL_ISS', VALOR),
+    ),
+    'A170': (
+        ('NUM_ITEM', INTEIRO), ('COD_ITEM', TEXTO), ('DESCR_COMPL', TEXTO),
+        ('VL_ITEM', VALOR), ('VL_DESC', VALOR), ('NAT_BC_CRED', TEXTO),
+        ('IND_ORIG_CRED', TEXTO), ('CST_PIS', TEXTO), ('VL_BC_PIS', VALOR),
+        ('ALIQ_PIS', DECIMAL), ('VL_PIS', VALOR), ('CST_COFINS', TEXTO),
+        ('VL_BC_COFINS', VALOR), ('ALIQ_COFINS', DECIMAL), ('VL_COFINS', VALOR),
+        ('COD_CTA', TEXTO), ('COD_CCUS', TEXTO),
+    ),
+    'C100': (
+        ('IND_OPER', TEXTO), ('IND_EMIT', TEXTO), ('COD_PART', TEXTO),
+        ('COD_MOD', TEXTO), ('COD_SIT', TEXTO), ('SER', TEXTO), ('NUM_DOC', TEXTO),
+        ('CHV_NFE', TEXTO), ('DT_DOC', DATA), ('DT_E_S', DATA), ('VL_DOC', VALOR),
+        ('IND_PGTO', TEXTO), ('VL_DESC', VALOR), ('VL_ABAT_NT', VALOR),
+        ('VL_MERC', VALOR), ('IND_FRT', TEXTO), ('VL_FRT', VALOR), ('VL_SEG', VALOR),
+        ('VL_OUT_DA', VALOR), ('VL_BC_ICMS', VALOR), ('VL_ICMS', VALOR),
+        ('VL_BC_ICMS_ST', VALOR), ('VL_ICMS_ST', VALOR), ('VL_IPI', VALOR),
+        ('VL_PIS', VALOR), ('VL_COFINS', VALOR), ('VL_PIS_ST', VALOR),
+        ('VL_COFINS_ST', VALOR),
+    ),
+    'C170': (
+        ('NUM_ITEM', INTEIRO), ('COD_ITEM', TEXTO), ('DESCR_COMPL', TEXTO),
+        ('QTD', DECIMAL), ('UNID', TEXTO), ('VL_ITEM', VALOR), ('VL_DESC', VALOR),
+        ('IND_MOV', TEXTO), ('CST_ICMS', TEXTO), ('CFOP', TEXTO), ('COD_NAT', TEXTO),
+        ('VL_BC_ICMS', VALOR), ('ALIQ_ICMS', DECIMAL), ('VL_ICMS', VALOR),
+        ('VL_BC_ICMS_ST', VALOR), ('ALIQ_ST', DECIMAL), ('VL_ICMS_ST', VALOR),
+        ('IND_APUR', TEXTO), ('CST_IPI', TEXTO), ('COD_ENQ', TEXTO),
+        ('VL_BC_IPI', VALOR), ('ALIQ_IPI', DECIMAL), ('VL_IPI', VALOR),
+        ('CST_PIS', TEXTO), ('VL_BC_PIS', VALOR), ('ALIQ_PIS', DECIMAL),
+        ('QUANT_BC_PIS', DECIMAL), ('ALIQ_PIS_QUANT', DECIMAL), ('VL_PIS', VALOR),
+        ('CST_COFINS', TEXTO), ('VL_BC_COFINS', VALOR), ('ALIQ_COFINS', DECIMAL),
+        ('QUANT_BC_COFINS', DECIMAL), ('ALIQ_COFINS_QUANT', DECIMAL),
+        ('VL_COFINS', VALOR), ('COD_CTA', TEXTO),
+    ),
+    'D200': (
+        ('COD_MOD', TEXTO), ('COD_SIT', TEXTO), ('SER', TEXTO), ('SUB', TEXTO),
+        ('NUM_DOC_INI', TEXTO), ('NUM_DOC_FIN', TEXTO), ('CFOP', TEXTO),
+        ('DT_REF', DATA), ('VL_DOC', VALOR), ('VL_DESC', VALOR),
+    ),
+    'D201': (
+        ('CST_PIS', TEXTO), ('VL_ITEM', VALOR), ('VL_BC_PIS', VALOR),
+        ('ALIQ_PIS', DECIMAL), ('VL_PIS', VALOR), ('COD_CTA', TEXTO),
+    ),
+    'D205': (
+        ('CST_COFINS', TEXTO), ('VL_ITEM', VALOR), ('VL_BC_COFINS', VALOR),
+        ('ALIQ_COFINS', DECIMAL), ('VL_COFINS', VALOR), ('COD_CTA', TEXTO),
+    ),
+    'M200': (
+        ('VL_TOT_CONT_NC_PER', VALOR), ('VL_TOT_CRED_DESC', VALOR),
+        ('VL_TOT_CRED_DESC_ANT', VALOR), ('VL_TOT_CONT_NC_DEV', VALOR),
+        ('VL_RET_NC', VALOR), ('VL_OUT_DED_NC', VALOR), ('VL_CONT_NC_REC', VALOR),
+        ('VL_TOT_CONT_CUM_PER', VALOR), ('VL_RET_CUM', VALOR),
+        ('VL_OUT_DED_CUM', VALOR), ('VL_CONT_CUM_REC', VALOR),
+        ('VL_TOT_CONT_REC', VALOR),
+    ),
+    'M210': (
+        ('COD_CONT', TEXTO), ('VL_REC_BRT', VALOR), ('VL_BC_CONT', VALOR),
+        ('VL_AJUS_ACRES_BC_PIS', VALOR), ('VL_AJUS_REDUC_BC_PIS', VALOR),
+        ('VL_BC_CONT_AJUS', VALOR), ('ALIQ_PIS', DECIMAL), ('QUANT_BC_PIS', DECIMAL),
+        ('ALIQ_PIS_QUANT', DECIMAL), ('VL_CONT_APUR', VALOR), ('VL_AJUS_ACRES', VALOR),
+        ('VL_AJUS_REDUC', VALOR), ('VL_CONT_DIFER', VALOR),
+        ('VL_CONT_DIFER_ANT', VALOR), ('VL_CONT_PER', VALOR),
+    ),
+    'M600': (
+        ('VL_TOT_CONT_NC_PER', VALOR), ('VL_TOT_CRED_DESC', VALOR),
+        ('VL_TOT_CRED_DESC_ANT', VALOR), ('VL_TOT_CONT_NC_DEV', VALOR),
+        ('VL_RET_NC', VALOR), ('VL_OUT_DED_NC', VALOR), ('VL_CONT_NC_REC', VALOR),
+        ('VL_TOT_CONT_CUM_PER', VALOR), ('VL_RET_CUM', VALOR),
+        ('VL_OUT_DED_CUM', VALOR), ('VL_CONT_CUM_REC', VALOR),
+        ('VL_TOT_CONT_REC', VALOR),
+    ),
+    'M610': (
+        ('COD_CONT', TEXTO), ('VL_REC_BRT', VALOR), ('VL_BC_CONT', VALOR),
+        ('VL_AJUS_ACRES_BC_COFINS', VALOR), ('VL_AJUS_REDUC_BC_COFINS', VALOR),
+        ('VL_BC_CONT_AJUS', VALOR), ('ALIQ_COFINS', DECIMAL),
+        ('QUANT_BC_COFINS', DECIMAL), ('ALIQ_COFINS_QUANT', DECIMAL),
+        ('VL_CONT_APUR', VALOR), ('VL_AJUS_ACRES', VALOR), ('VL_AJUS_REDUC', VALOR),
+        ('VL_CONT_DIFER', VALOR), ('VL_CONT_DIFER_ANT', VALOR), ('VL_CONT_PER', VALOR),
+    ),
+}
+
+HIERARQUIA = {
+    'A170': 'A100',
+    'C170': 'C100',
+    'D201': 'D200',
+    'D205': 'D200',
+    'M210': 'M200',
+    'M610': 'M600',
+}
+
+
+def valor_para_centavos(valor):
+    """
+    Converte um valor no formato decimal brasileiro para centavos, sem passar por float.
+
+    Exemplos:
+        "3628821,71" -> 362882171
+        "3216589,4" -> 321658940
+        "19520" -> 1952000
+        "" -> 0
+    """
+    if not valor:
+        return 0
+
+    inteiro, _, fracao = valor.partition(',')
+    if len(fracao) <= 2:
+        negativo = inteiro.startswith('-')
+        centavos = int(inteiro.lstrip('-') or 0) * 100 + int(fracao.ljust(2, '0'))
+        return -centavos if negativo else centavos
+
+    try:
+        decimal = Decimal(f"{inteiro}.{fracao}").quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"Valor inválido no SPED: {valor!r}")
+    return int(decimal * 100)
+
+
+def _decimal(valor):
+    return float(valor.replace(',', '.')) if valor else np.nan
+
+
+def _data(valor):
+    if len(valor) != 8:
+        return 'NaT'
+    return f"{valor[4:8]}-{valor[2:4]}-{valor[0:2]}"
+
+
+def _inteiro(valor):
+    return int(valor) if valor else 0
+
+
+def _coluna(tipo, valores):
+    if tipo == VALOR:
+        return np.fromiter((valor_para_centavos(v) for v in valores), dtype=np.int64, count=len(valores))
+    if tipo == DECIMAL:
+        return np.fromiter((_decimal(v) for v in valores), dtype=np.float64, count=len(valores))
+    if tipo == INTEIRO:
+        return np.fromiter((_inteiro(v) for v in valores), dtype=np.int64, count=len(valores))
+    if tipo == DATA:
+        return np.array([_data(v) for v in valores], dtype='datetime64[D]')
+    return np.array(valores, dtype=object)
+
+
+def parse_sped(sped_file, registros=None):
+    """
+    Lê o SPED e monta uma tabela colunar para cada registro suportado.
+
+    Args:
+        sped_file: Caminho para o arquivo SPED
+        registros: Registros desejados (padrão: todos de LEIAUTES); os pais dos
+            registros filhos pedidos são incluídos automaticamente
+
+    Returns:
+        dict: registro -> {
+            'registro': código do registro,
+            'pai': registro pai ou None,
+            'linhas': quantidade de linhas,
+            'colunas': {campo: ndarray},
+            'indice_pai': ndarray int64 com a linha do pai (-1 se ausente), apenas em filhos
+        }
+    """
+    registros = set(registros or LEIAUTES)
+    registros |= {HIERARQUIA[r] for r in registros if r in HIERARQUIA}
+    desconhecidos = registros - set(LEIAUTES)
+    if desconhecidos:
+        raise ValueError(f"Registros sem leiaute definido: {sorted(desconhecidos)}")
+
+    brutos = {registro: [[] for _ in LEIAUTES[registro]] for registro in registros}
+    indices_pai = {registro: [] for registro in registros if registro in HIERARQUIA}
+    linhas = dict.fromkeys(registros, 0)
+    ultima_linha = {}
+
+    for registro, campos in scan_sped(sped_file, registros):
+        colunas = brutos[registro]
+        total_campos = len(campos)
+        for posicao, coluna in enumerate(colunas):
+            # Leiautes antigos têm menos campos; os ausentes ficam vazios
+            coluna.append(campos[posicao] if posicao < total_campos else '')
+
+        pai = HIERARQUIA.get(registro)
+        if pai:
+            indices_pai[registro].append(ultima_linha.get(pai, -1))
+
+        ultima_linha[registro] = linhas[registro]
+        linhas[registro] += 1
+
+    tabelas = {}
+    for registro in sorted(registros):
+        tabela = {
+            'registro': registro,
+            'pai': HIERARQUIA.get(registro),
+            'linhas': linhas[registro],
+            'colunas': {
+                nome: _coluna(tipo, valores)
+                for (nome, tipo), valores in zip(LEIAUTES[registro], brutos[registro])
+            },
+        }
+        if registro in indices_pai:
+            tabela['indice_pai'] = np.array(indices_pai[registro], dtype=np.int64)
+        tabelas[registro] = tabela
+
+    return tabelas
+
+
+def filhos_de(tabelas, registro_filho, linha_pai):
+    """
+    Retorna as linhas do registro filho que pertencem a uma linha do pai.
+
+    Args:
+        tabelas: Resultado de parse_sped
+        registro_filho: Registro filho (ex: 'C170')
+        linha_pai: Índice da linha no registro pai (ex: posição do C100)
+
+    Returns:
+        ndarray: Índices das linhas do registro filho
+    """
+    return np.flatnonzero(tabelas[registro_filho]['indice_pai'] == linha_pai)
+
+
+def somar_por_pai(tabelas, registro_filho, coluna):
+    """
+    Soma uma coluna do registro filho agrupando pela linha do pai.
+
+    Exemplo: somar_por_pai(tabelas, 'C170', 'VL_ITEM') devolve, para cada C100,
+    o total em centavos dos seus itens.
+
+    Returns:
+        ndarray: Um total por linha do registro pai
+    """
+    filho = tabelas[registro_filho]
+    pai = tabelas[filho['pai']]
+    valores = filho['colunas'][coluna]
+    indices = filho['indice_pai']
+    validos = indices >= 0
+
+    totais = np.zeros(pai['linhas'], dtype=valores.dtype)
+    np.add.at(totais, indices[validos], valores[validos])
+    return totais
@@ -1,32 +1,149 @@
-def processa_sped(sped_file):
+from contextlib import contextmanager
+from mmap import mmap, ACCESS_READ
+
+
+SPED_ENCODING = 'latin-1'
+REGISTRO_ENCERRAMENTO = '9999'
+
+
+def iter_registros(dados, inicio=0):
+    """
+    Gera tuplas (offset, registro, linha) a partir do conteúdo mapeado do SPED.
+
+    Linhas que não começam com '|' são ignoradas e a leitura termina no registro
+    9999, antes do bloco de assinatura digital que vem em seguida.
+
+    Args:
+        dados: Conteúdo do arquivo (mmap ou bytes)
+        inicio: Offset em bytes a partir do qual a leitura começa
+    """
+    tamanho = len(dados)
+    while inicio < tamanho:
+        fim = dados.find(b'\n', inicio)
+        if fim == -1:
+            fim = tamanho
+        offset = inicio
+        linha = dados[inicio:fim].rstrip(b'\r')
+        inicio = fim + 1
+
+        if not linha.startswith(b'|'):
+            continue
+
+        fim_registro = linha.find(b'|', 1)
+        if fim_registro <= 1:
+            continue
+        registro = linha[1:fim_registro].decode(SPED_ENCODING)
+
+        yield offset, registro, linha
+
+        if registro == REGISTRO_ENCERRAMENTO:
+            return
+
+
+def campos_registro(linha):
+    """Decodifica a linha do SPED e retorna os campos sem o registro."""
+    return linha.decode(SPED_ENCODING).split('|')[2:-1]
+
+
+def campos_no_offset(dados, offset):
+    """Lê a linha que começa em `offset` e retorna seus campos sem o registro."""
+    fim = dados.find(b'\n', offset)
+    if fim == -1:
+        fim = len(dados)
+    return campos_registro(dados[offset:fim].rstrip(b'\r'))
+
+
+def scan_sped(sped_file, registros=None):
+    """
+    Percorre o arquivo SPED mapeado em memória e gera tuplas (registro, campos).
+
+    As linhas são lidas diretamente do mmap, sem carregar o arquivo inteiro, e
+    decodificadas em latin-1 (codificação do leiaute da EFD). A leitura termina no
+    registro 9999, ignorando o bloco de assinatura digital que vem em seguida.
+
+    Quando `registros` é informado, apenas esses registros são gerados e a leitura
+    para assim que todos foram encontrados e o arquivo passa para outro bloco
+    (os blocos são contíguos, então não há mais ocorrências depois disso).
+
+    Args:
+        sped_file: Caminho para o arquivo SPED
+        registros: Conjunto de registros desejados (ex: {'0000', 'M210'}) ou None para todos
+
+    Yields:
+        Tupla (registro, campos) com os campos da linha sem o registro
+    """
+    pendentes = set(registros) if registros else None
+    bloco_final = None
+
+    with open_sped(sped_file) as dados:
+        for _, registro, linha in iter_registros(dados):
+            if bloco_final is not None and registro[0] != bloco_final:
+                return
+
+            if pendentes is None or registro in registros:
+                yield registro, campos_registro(linha)
+
+                if pendentes is not None:
+                    pendentes.discard(registro)
+                    if not pendentes:
+                        bloco_final = registro[0]
+
+
+@contextmanager
+def open_sped(sped_file):
+    """Abre o arquivo SPED como mmap somente leitura (bytes vazios se o arquivo estiver vazio)."""
     with open(sped_file, 'rb') as file:
-        speds = file.readlines()
-
-    for sped in speds:
-        if b'|M210|' in sped:
-            m210 = sped.decode('utf-8')
-            if m210.startswith('|M210|'):
-                m210_limpo = m210.strip()
-                m210_campos = m210_limpo.split('|')
-        
-        if b'|M610|' in sped:
-            m610 = sped.decode('utf-8')
-            if m610.startswith('|M610|'):
-                m610_limpo = m610.strip()
-                m610_campos = m610_limpo.split('|')
-        
-        if b'|0000|' in sped:
-            periodo = sped.decode('utf-8')
-            if periodo.startswith('|0000|'):
-                periodo_limpo = periodo.strip()
-                periodo_campos = periodo_limpo.split('|')
-                periodo_inicio = periodo_campos[6]
-                periodo_fim = periodo_campos[7]
-                periodo_inicio_formatado = f"{periodo_inicio[0:2]}/{periodo_inicio[2:4]}/{periodo_inicio[4:8]}"
-                periodo_fim_formatado = f"{periodo_fim[0:2]}/{periodo_fim[2:4]}/{periodo_fim[4:8]}"
-    
+        try:
+            dados = mmap(file.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            # Arquivo vazio não pode ser mapeado
+            yield b''
+            return
+
+        with dados:
+            yield dados
+
+
+def formatar_data_sped(valor):
+    """Converte uma data DDMMAAAA do SPED para DD/MM/AAAA."""
+    return f"{valor[0:2]}/{valor[2:4]}/{valor[4:8]}"
+
+
+def periodo_sped(campos_0000):
+    """Retorna [inicio, fim] formatados a partir dos campos do registro 0000."""
+    return [formatar_data_sped(campos_0000[4]), formatar_data_sped(campos_0000[5])]
+
+
+def processa_sped(sped_file, indice=None):
+    """
+    Extrai o período e os registros M210 e M610 (última ocorrência) do SPED.
+
+    Args:
+        sped_file: Caminho para o arquivo SPED
+        indice: Índice de offsets do arquivo (sped_index.load_index); quando
+            informado, as linhas são lidas direto nos offsets, sem varredura
+    """
+    registros = ('0000', 'M210', 'M610')
+    encontrados = {}
+
+    if indice is not None:
+        with open_sped(sped_file) as dados:
+            for registro in registros:
+                ocorrencias = indice['offsets'].get(registro)
+                if ocorrencias:
+                    campos = campos_no_offset(dados, ocorrencias[-1])
+                    encontrados[registro] = [registro, *campos, '']
+    else:
+        for registro, campos in scan_sped(sped_file, set(registros)):
+            # Mantém a última ocorrência e o formato da resposta: [registro, *campos, '']
+            encontrados[registro] = [registro, *campos, '']
+
+    for registro in registros:
+        if registro not in encontrados:
+            raise ValueError(f"Registro {registro} não encontrado no arquivo SPED.")
+
     return {
-        'periodo': [periodo_inicio_formatado, periodo_fim_formatado],
-        'm210': m210_campos[1:],
-        'm610': m610_campos[1:]
+        'periodo': periodo_sped(encontrados['0000'][1:-1]),
+        'm210': encontrados['M210'],
+        'm610': encontrados['M610']
     }
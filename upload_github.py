@@ -1,9 +1,13 @@
-from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from base64 import b64encode, b64decode
+from threading import Lock
+from hashlib import sha1
+from time import monotonic
 from os import getenv
 
 
+from http_client import get, put, post, patch
 from dotenv import load_dotenv
-from requests import get, put
 
 try:
     from werkzeug.datastructures import FileStorage
@@ -17,6 +21,44 @@ OWNER = getenv("OWNER")
 REPO = getenv("REPO")
 TOKEN = getenv("TOKEN_GITHUB")
 BRANCH = getenv("BRANCH")
+GITHUB_API_URL = getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+SHA_CACHE_TTL = float(getenv("GITHUB_SHA_CACHE_TTL", 600))
+BLOB_WORKERS = int(getenv("GITHUB_BLOB_WORKERS", 4))
+
+# (owner, repo, branch, caminho) -> (sha do blob no GitHub, expira_em)
+_shas = {}
+_shas_lock = Lock()
+
+
+def git_blob_sha(conteudo_bytes):
+    """Calcula o SHA do blob como o git (sha1 de 'blob <tamanho>\\0' + conteúdo)."""
+    return sha1(b"blob %d\0" % len(conteudo_bytes) + conteudo_bytes).hexdigest()
+
+
+def _sha_em_cache(chave):
+    with _shas_lock:
+        item = _shas.get(chave)
+        if item is None:
+            return None
+        if item[1] <= monotonic():
+            del _shas[chave]
+            return None
+        return item[0]
+
+
+def _guardar_sha(chave, sha):
+    with _shas_lock:
+        if sha:
+            _shas[chave] = (sha, monotonic() + SHA_CACHE_TTL)
+        else:
+            _shas.pop(chave, None)
+
+
+def _buscar_sha_remoto(check_url, auth_headers):
+    check_response = get(check_url, endpoint="github.contents.get", headers=auth_headers)
+    if check_response.status_code == 200:
+        return check_response.json().get("sha")
+    return None
 
 
 def _extrair_dados_de_filestorage(file):
@@ -36,8 +78,7 @@ def _extrair_dados_de_filestorage(file):
         except (OSError, ValueError):
             pass
 
-    base64_content = b64encode(conteudo_bytes).decode("utf-8")
-    return nome_arquivo, tipo_arquivo, base64_content
+    return nome_arquivo, tipo_arquivo, conteudo_bytes
 
 
 def _extrair_dados_de_dict(file):
@@ -52,11 +93,9 @@ def _extrair_dados_de_dict(file):
         raise ValueError("Conteúdo do arquivo não informado.")
 
     if isinstance(conteudo, str):
-        base64_content = "".join(conteudo.splitlines())
-    else:
-        base64_content = b64encode(conteudo).decode("utf-8")
+        conteudo = b64decode("".join(conteudo.splitlines()))
 
-    return nome_arquivo, tipo_arquivo, base64_content
+    return nome_arquivo, tipo_arquivo, conteudo
 
 
 def _extrair_informacoes(file):
@@ -74,57 +113,102 @@ def _extrair_informacoes(file):
     )
 
 
-def upload_file_to_github(file):
-    if not file:
-        raise ValueError("Arquivo não fornecido.")
+def _sem_alteracao(nome_arquivo, file_path, sha):
+    return {
+        "status": 200,
+        "resultado": {"content": {"name": nome_arquivo, "path": file_path, "sha": sha}, "commit": None},
+        "caminho": file_path,
+        "repositorio": f"{OWNER}/{REPO}",
+        "alterado": False,
+    }
 
-    nome_arquivo, tipo_arquivo, base64_content = _extrair_informacoes(file)
 
+def _validar_tipo(tipo_arquivo):
     if tipo_arquivo and "pdf" not in tipo_arquivo.lower() and tipo_arquivo != "Balancete":
         raise ValueError(
             'Tipo do arquivo não suportado. Apenas arquivos PDF ou do tipo "Balancete" podem ser processados.'
         )
 
+
+def _auth_headers():
+    return {
+        "Authorization": f"token {TOKEN}",
+        "Accept": "application/vnd.github+json",
+    }
+
+
+def upload_file_to_github(file):
+    """
+    Envia o arquivo para o repositório do GitHub pela API de conteúdos.
+
+    O SHA do blob é calculado localmente e comparado com o do arquivo remoto; se
+    forem iguais o upload é ignorado. O SHA remoto de cada caminho fica em cache por
+    GITHUB_SHA_CACHE_TTL segundos, evitando o GET antes do PUT. Se o cache estiver
+    desatualizado (409/422 no PUT), o SHA é consultado de novo e o PUT repetido uma vez.
+
+    Returns:
+        dict: 'status', 'resultado', 'caminho', 'repositorio' e 'alterado'
+        (False quando o conteúdo remoto já era igual)
+    """
+    if not file:
+        raise ValueError("Arquivo não fornecido.")
+
+    nome_arquivo, tipo_arquivo, conteudo_bytes = _extrair_informacoes(file)
+    _validar_tipo(tipo_arquivo)
+
     file_path = f"{nome_arquivo}"
-    github_url = f"https://api.github.com/repos/{OWNER}/{REPO}/contents/{file_path}"
+    github_url = f"{GITHUB_API_URL}/repos/{OWNER}/{REPO}/contents/{file_path}"
     check_url = (
         f"{github_url}?ref={BRANCH}" if BRANCH else github_url
     )
 
-    auth_headers = {
-        "Authorization": f"token {TOKEN}",
-        "Accept": "application/vnd.github+json",
-    }
+    auth_headers = _auth_headers()
 
-    check_response = get(check_url, headers=auth_headers, timeout=30)
+    chave = (OWNER, REPO, BRANCH or "", file_path)
+    blob_sha = git_blob_sha(conteudo_bytes)
 
-    sha = None
-    if check_response.status_code == 200:
-        check_data = check_response.json()
-        sha = check_data.get("sha")
+    sha = _sha_em_cache(chave)
+    sha_do_cache = sha is not None
+    if not sha_do_cache:
+        sha = _buscar_sha_remoto(check_url, auth_headers)
+        _guardar_sha(chave, sha)
+
+    if sha == blob_sha:
+        return _sem_alteracao(nome_arquivo, file_path, sha)
 
     upload_data = {
         "message": f"Adiciona arquivo {nome_arquivo}",
-        "content": base64_content,
+        "content": b64encode(conteudo_bytes).decode("utf-8"),
     }
 
     if BRANCH:
         upload_data["branch"] = BRANCH
 
-    if sha:
-        upload_data["sha"] = sha
-
     upload_headers = {
         **auth_headers,
         "Content-Type": "application/json",
     }
 
-    upload_response = put(
-        github_url,
-        headers=upload_headers,
-        json=upload_data,
-        timeout=30,
-    )
+    def enviar(sha):
+        if sha:
+            upload_data["sha"] = sha
+        else:
+            upload_data.pop("sha", None)
+        return put(
+            github_url,
+            endpoint="github.contents.put",
+            headers=upload_headers,
+            json=upload_data,
+        )
+
+    upload_response = enviar(sha)
+
+    if upload_response.status_code in (409, 422) and sha_do_cache:
+        sha = _buscar_sha_remoto(check_url, auth_headers)
+        _guardar_sha(chave, sha)
+        if sha == blob_sha:
+            return _sem_alteracao(nome_arquivo, file_path, sha)
+        upload_response = enviar(sha)
 
     if not upload_response.ok:
         try:
@@ -134,9 +218,182 @@ def upload_file_to_github(file):
         raise RuntimeError(f"Erro ao fazer upload para o GitHub: {error_message}")
 
     upload_result = upload_response.json()
+    _guardar_sha(chave, (upload_result.get("content") or {}).get("sha") or blob_sha)
     return {
         "status": upload_response.status_code,
         "resultado": upload_result,
         "caminho": file_path,
         "repositorio": f"{OWNER}/{REPO}",
+        "alterado": True,
     }
+
+
+def _resposta_github(response, acao):
+    if not response.ok:
+        try:
+            error_message = response.json().get("message", "")
+        except ValueError:
+            error_message = response.text
+        raise RuntimeError(f"Erro ao {acao} no GitHub: {error_message}")
+    return response.json()
+
+
+def _criar_blob(repo_url, headers, conteudo_bytes):
+    response = post(
+        f"{repo_url}/git/blobs",
+        endpoint="github.git.blobs",
+        headers=headers,
+        json={"content": b64encode(conteudo_bytes).decode("utf-8"), "encoding": "base64"},
+    )
+    return _resposta_github(response, "criar blob")["sha"]
+
+
+class _ConflitoRef(Exception):
+    """A ref da branch mudou entre a leitura e a atualização (422 no PATCH)."""
+
+
+def _commit_arvore(repo_url, headers, branch, entradas, mensagem):
+    """
+    Cria uma árvore sobre a do último commit da branch, o commit e avança a ref.
+
+    Returns:
+        tuple: (sha do commit, sha da árvore) ou (None, sha da árvore) se a
+        árvore resultante for igual à atual
+
+    Raises:
+        _ConflitoRef: Se a branch andou entre a leitura e a atualização da ref
+        RuntimeError: Se alguma outra chamada falhar
+    """
+    ref = _resposta_github(
+        get(f"{repo_url}/git/ref/heads/{branch}", endpoint="github.git.ref", headers=headers),
+        "ler a branch",
+    )
+    head = ref["object"]["sha"]
+    base_tree = _resposta_github(
+        get(f"{repo_url}/git/commits/{head}", endpoint="github.git.commits.get", headers=headers),
+        "ler o commit",
+    )["tree"]["sha"]
+
+    tree = _resposta_github(
+        post(
+            f"{repo_url}/git/trees",
+            endpoint="github.git.trees",
+            headers=headers,
+            json={"base_tree": base_tree, "tree": entradas},
+        ),
+        "criar a árvore",
+    )["sha"]
+    if tree == base_tree:
+        return None, tree
+
+    commit = _resposta_github(
+        post(
+            f"{repo_url}/git/commits",
+            endpoint="github.git.commits.create",
+            headers=headers,
+            json={"message": mensagem, "tree": tree, "parents": [head]},
+        ),
+        "criar o commit",
+    )["sha"]
+
+    response = patch(
+        f"{repo_url}/git/refs/heads/{branch}",
+        endpoint="github.git.refs.update",
+        headers=headers,
+        json={"sha": commit, "force": False},
+    )
+    if response.status_code == 422:
+        raise _ConflitoRef()
+    _resposta_github(response, "atualizar a branch")
+    return commit, tree
+
+
+def upload_files_to_github(files, mensagem=None, workers=None):
+    """
+    Envia vários arquivos em um único commit pela API Git Data do GitHub.
+
+    Em vez de um GET + PUT (e um commit) por arquivo na API de conteúdos, cria os
+    blobs em paralelo (no máximo `workers` por vez, cada um com a sua cópia em
+    base64 só enquanto é enviado), uma árvore sobre a do último commit, um commit
+    e atualiza a ref da branch. Arquivos cujo SHA local bate com o cache de SHAs
+    remotos não são enviados. Se a branch andar entre a leitura e a atualização da
+    ref, o commit é refeito uma vez sobre o novo topo (os blobs são reaproveitados).
+
+    Args:
+        files: Lista de FileStorage ou dicts {'nome', 'tipo', 'conteudo'}
+        mensagem: Mensagem do commit (padrão: 'Adiciona N arquivos')
+        workers: Máximo de blobs criados ao mesmo tempo (padrão: GITHUB_BLOB_WORKERS)
+
+    Returns:
+        dict: 'status', 'resultado' ({'commit', 'tree', 'branch'}), 'caminhos'
+        enviados, 'inalterados', 'repositorio' e 'alterado'
+    """
+    if not files:
+        raise ValueError("Arquivo não fornecido.")
+
+    arquivos = {}
+    for file in files:
+        nome_arquivo, tipo_arquivo, conteudo_bytes = _extrair_informacoes(file)
+        _validar_tipo(tipo_arquivo)
+        arquivos[nome_arquivo] = conteudo_bytes
+
+    pendentes = []
+    inalterados = []
+    for file_path, conteudo_bytes in arquivos.items():
+        blob_sha = git_blob_sha(conteudo_bytes)
+        if _sha_em_cache((OWNER, REPO, BRANCH or "", file_path)) == blob_sha:
+            inalterados.append(file_path)
+        else:
+            pendentes.append((file_path, conteudo_bytes, blob_sha))
+
+    resposta = {
+        "status": 200,
+        "resultado": {"commit": None, "tree": None, "branch": BRANCH},
+        "caminhos": [file_path for file_path, _, _ in pendentes],
+        "inalterados": inalterados,
+        "repositorio": f"{OWNER}/{REPO}",
+        "alterado": False,
+    }
+    if not pendentes:
+        return resposta
+
+    repo_url = f"{GITHUB_API_URL}/repos/{OWNER}/{REPO}"
+    headers = _auth_headers()
+    branch = BRANCH or _resposta_github(
+        get(repo_url, endpoint="github.repos.get", headers=headers),
+        "ler o repositório",
+    )["default_branch"]
+    resposta["resultado"]["branch"] = branch
+
+    workers = max(1, min(workers or BLOB_WORKERS, len(pendentes)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        shas = list(executor.map(
+            lambda pendente: _criar_blob(repo_url, headers, pendente[1]),
+            pendentes,
+        ))
+
+    entradas = [
+        {"path": file_path, "mode": "100644", "type": "blob", "sha": sha}
+        for (file_path, _, _), sha in zip(pendentes, shas)
+    ]
+    mensagem = mensagem or f"Adiciona {len(pendentes)} arquivos"
+
+    try:
+        commit, tree = _commit_arvore(repo_url, headers, branch, entradas, mensagem)
+    except _ConflitoRef:
+        try:
+            commit, tree = _commit_arvore(repo_url, headers, branch, entradas, mensagem)
+        except _ConflitoRef:
+            raise RuntimeError(f"Erro ao atualizar a branch no GitHub: {branch} mudou durante o upload")
+
+    for (file_path, _, _), sha in zip(pendentes, shas):
+        _guardar_sha((OWNER, REPO, BRANCH or "", file_path), sha)
+
+    resposta["resultado"].update(commit=commit, tree=tree)
+    if commit:
+        resposta.update(status=201, alterado=True)
+    else:
+        # Cache frio, mas a árvore não mudou: o conteúdo remoto já era igual
+        resposta["inalterados"] += resposta["caminhos"]
+        resposta["caminhos"] = []
+    return resposta